@@ -1,34 +1,122 @@
+import os
+from typing import TYPE_CHECKING, Optional
+
 from agents.bian_core import CoreBianState
-from agents.modular_agent_framework import ModularAgentFramework
 
-# Assume these new modules are created in agents/modules/
-from agents.modules.framework_detector import FrameworkDetectorModule
-from agents.modules.requirement_generator import RequirementGeneratorModule
-from agents.modules.project_structure import ProjectStructureModule
+# Modules are resolved through the registry and imported on first use
+from agents.module_registry import BUILTIN_MODULES, ModuleRegistry, get_module_registry
 
 # You would also need your client and reader setups
-from llm.anthropic_llm_client import AnthropicLLMClient
+# The framework (LangGraph), checkpoints (LangGraph) and rate limiter (Anthropic SDK) are
+# imported in setup_agent_framework, so importing this module stays cheap
+from llm.response_cache import LLMResponseCache
+from llm.token_budget import BudgetPlanner, TokenCounter
 from internal.file_system_reader import FileSystemReader
+from internal.run_manifest import RunManifest
+from internal.metrics import MetricsRecorder
+from internal.streaming_output import StreamingOutput
+from internal.template_registry import TemplateRegistry
+
+if TYPE_CHECKING:
+    from agents.modular_agent_framework import ModularAgentFramework
+
+def setup_agent_framework(state: Optional[CoreBianState], api_key: str, use_async: bool = False,
+                          llm_client=None, durable_runs: bool = True,
+                          module_registry: Optional[ModuleRegistry] = None,
+                          pipelined: Optional[bool] = None) -> "ModularAgentFramework":
+    """
+    Build the agent framework with its LLM client, file reader and modules.
+    The returned framework keeps no per-run state: build it once and reuse it for every
+    message so the HTTP connection pool, file reader and compiled graph are shared.
+    Pass `llm_client` to use another client (e.g. the batch client); durable_runs=False
+    disables the run manifest and checkpoints for runs whose results are not final.
+    Modules come from `module_registry` (default: built-ins, entry point plugins and AGENT_MODULES);
+    plugin modules are built with the file reader and LLM client as keyword arguments.
+    pipelined=True (default: PIPELINE_STREAMING, off) lets modules start on their predecessors'
+    token streams instead of waiting for their nodes.
+    """
+    from agents.modular_agent_framework import ModularAgentFramework
+    from internal.checkpoints import create_checkpointer_from_env
 
-def setup_agent_framework(state: CoreBianState, api_key: str) -> ModularAgentFramework:
     # Setup LLM client and file reader
-    llm_client = AnthropicLLMClient(api_key=api_key)
+    # Response cache is configured through LLM_CACHE_* environment variables
+    # use_async=True wires the asyncio client; run the framework with astart_analysis then
+    if llm_client is None and use_async:
+        from llm.async_anthropic_llm_client import AsyncAnthropicLLMClient as client_class
+    elif llm_client is None:
+        from llm.anthropic_llm_client import AnthropicLLMClient as client_class
+    if llm_client is None:
+        from llm.rate_limiter import get_shared_rate_limiter
+    # Anthropic prompt caching of static prefixes can be turned off with LLM_PROMPT_CACHING=false
+    # Calls share a process-wide budget once the account tier's limits are set in
+    # LLM_REQUESTS_PER_MINUTE / LLM_INPUT_TOKENS_PER_MINUTE / LLM_OUTPUT_TOKENS_PER_MINUTE
+    llm_client = llm_client or client_class(
+        api_key=api_key,
+        cache=LLMResponseCache.from_env(),
+        prompt_caching=os.getenv("LLM_PROMPT_CACHING", "true").lower() not in ("0", "false", "no"),
+        rate_limiter=get_shared_rate_limiter()
+    )
     file_reader = FileSystemReader()
+    # Prompt slices and max_tokens are sized to the model's context window; token counts are local
+    # estimates unless LLM_TOKEN_COUNT_API=true asks the count_tokens endpoint
+    budget_planner = BudgetPlanner.for_client(
+        llm_client, counter=TokenCounter.from_env(api_key, getattr(llm_client, "model", None) or "claude-sonnet-4-20250514")
+    )
+    # OUTPUT_STREAMING=true streams documents to the run's output_dir as they are generated,
+    # OUTPUT_STREAM_QUEUE additionally publishes their sections to a RabbitMQ stream queue
+    streaming_output = StreamingOutput.from_env()
     # Create the framework instance
-    framework = ModularAgentFramework()
+    # Incremental runs (skip modules with unchanged inputs) are configured through RUN_MANIFEST_*
+    # resumable runs (SQLite checkpoints per run id) through PIPELINE_CHECKPOINTS_*
+    # and the metrics trace / Prometheus exports through METRICS_*
+    if pipelined is None:
+        pipelined = os.getenv("PIPELINE_STREAMING", "false").lower() in ("1", "true", "yes")
+    framework = ModularAgentFramework(
+        manifest=RunManifest.from_env() if durable_runs else None,
+        checkpointer=create_checkpointer_from_env() if durable_runs else None,
+        metrics=MetricsRecorder.from_env(),
+        pipelined=pipelined
+    )
 
     # --- Module Instantiation ---
     # Note: Pass clients/tools to modules that need them
-    # Initialize modules
-    framework_detector = FrameworkDetectorModule(file_reader=file_reader, llm_client=llm_client)
-    requirement_generator = RequirementGeneratorModule(file_reader=file_reader, llm_client=llm_client)
-    project_structure = ProjectStructureModule(file_reader=file_reader, llm_client=llm_client)
+    # Settings of the built-in modules, built only for the modules that are enabled
+    # FRAMEWORK_HEURISTIC_THRESHOLD sets the confidence at which the rule-based detector skips
+    # the LLM call; "off" always asks the LLM
+    heuristic_threshold = os.getenv("FRAMEWORK_HEURISTIC_THRESHOLD", "0.8")
+    builtin_settings = {
+        "framework_detector": lambda: dict(
+            heuristic_threshold=None if heuristic_threshold.lower() in ("off", "none", "") else float(heuristic_threshold),
+            budget_planner=budget_planner
+        ),
+        # REQUIREMENTS_MAP_REDUCE=true summarizes endpoint files separately to keep prompts bounded
+        "requirement_generator": lambda: dict(
+            map_reduce=os.getenv("REQUIREMENTS_MAP_REDUCE", "false").lower() in ("1", "true", "yes"),
+            max_parallel_summaries=int(os.getenv("REQUIREMENTS_MAP_PARALLELISM", "4")),
+            # Tokens of the contract included with the summaries in the final map-reduce call
+            max_spec_tokens=int(os.getenv("REQUIREMENTS_MAX_SPEC_TOKENS", "40000")),
+            streaming_output=streaming_output,
+            # Contracts (OpenAPI files in the bian directory) generated at the same time
+            max_parallel_contracts=int(os.getenv("REQUIREMENTS_CONTRACT_PARALLELISM", "4")),
+            budget_planner=budget_planner
+        ),
+        # Architecture templates are read from ARCHITECTURES_DIR (default: tmp/architectures in the repo)
+        "project_structure": lambda: dict(
+            streaming_output=streaming_output,
+            template_registry=TemplateRegistry.from_env(),
+            budget_planner=budget_planner
+        ),
+    }
 
     # --- Module Registration ---
-    # The framework's topological sort will handle the execution order
-    # based on dependencies
-    framework.register_module(framework_detector)
-    framework.register_module(requirement_generator)
-    framework.register_module(project_structure)
+    # Modules are imported here, on first use; the framework's topological sort
+    # will handle the execution order based on dependencies
+    module_registry = module_registry or get_module_registry()
+    for name in module_registry.names():
+        is_builtin = module_registry.spec(name).target == BUILTIN_MODULES.get(name)
+        settings = builtin_settings[name]() if is_builtin else {}
+        framework.register_module(
+            module_registry.create(name, file_reader=file_reader, llm_client=llm_client, **settings)
+        )
 
-    return framework
\ No newline at end of file
+    return framework
@@ -1,4 +1,20 @@
-from typing import List, Dict, TypedDict, Any, Optional
+import operator
+from typing import Annotated, List, Dict, TypedDict, Any, Optional
+
+
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reducer merging dict updates from modules that run in the same graph step.
+    Nested dicts under the same key (e.g. a module's results) are merged one level deep.
+    """
+    merged = dict(left or {})
+    for key, value in (right or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
 
 class CoreBianState(TypedDict):
     """
@@ -11,6 +27,8 @@ class CoreBianState(TypedDict):
     project_structure_path: Optional[str] # Optional folder tree input
     bian_dir: Optional[str] 
     endpoints_dir: Optional[str] 
+    output_dir: Optional[str] # Where streamed documents are written (default: output)
+    run_id: Optional[str] # Tags streamed progress messages
 
     # --- Module Outputs & Intermediate Data ---
     # Raw content loaded by the first module
@@ -27,9 +45,11 @@ class CoreBianState(TypedDict):
     proposed_project_structure: Dict[str, Any] # e.g., {'structure_tree': '...', 'file_details': {...}}
 
     # --- Final Output ---
-    generated_requirements: str # Tentative final requirements
+    generated_requirements: str # Tentative final requirements (merged index when there are several contracts)
+    contract_requirements: Dict[str, str] # Requirements per OpenAPI contract, keyed by spec file stem
     updated_requirements: str # The final synthesized markdown
 
     # --- System State ---
-    errors: List[str]
-    module_results: Dict[str, Any]
\ No newline at end of file
+    # Reducers let independent modules running in parallel report into the same fields
+    errors: Annotated[List[str], operator.add]
+    module_results: Annotated[Dict[str, Any], merge_dicts]
\ No newline at end of file
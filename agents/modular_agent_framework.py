@@ -3,20 +3,42 @@ Modular LangGraph Migration Framework
 Core framework that accepts pluggable subgraph modules for different migration tasks
 """
 
-from langgraph.graph import StateGraph, END
-from typing import Dict, List
+import threading
+import time
+import uuid
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import StateGraph, START, END
+from typing import Dict, List, Optional, Set, Tuple
 
 # Core state that all subgraphs share
 from agents.bian_core import CoreBianState
 from agents.modules.agent_module import AgentModule
+from internal.metrics import MetricsRecorder
+from internal.run_manifest import RunManifest
+from internal.token_streams import TokenStreamHub, bind_hub, current_hub
 
 
 class ModularAgentFramework:
     """Core framework that orchestrates migration modules"""
 
-    def __init__(self):
+    def __init__(self, manifest: Optional[RunManifest] = None, checkpointer: Optional[BaseCheckpointSaver] = None,
+                 metrics: Optional[MetricsRecorder] = None, pipelined: bool = False):
         self.modules: Dict[str, AgentModule] = {}
+        # When set, modules whose input fingerprints are unchanged are skipped
+        self.manifest = manifest
+        # When set, runs started with a run_id are checkpointed after every node and can resume
+        self.checkpointer = checkpointer
+        # When set, every finished run is exported to a JSONL trace / Prometheus text file
+        self.metrics = metrics
+        # When set, modules subscribed to a predecessor's token stream start on its prefix
+        # instead of waiting for the predecessor's node to finish
+        self.pipelined = pipelined
+        self._module_entry_nodes: Dict[str, str] = {}
         self.execution_order: List[str] = []
+        self.execution_layers: List[List[str]] = []
+        # Compiled graph reused across runs; rebuilt lazily after modules change
+        self._compiled_graph = None
+        self._graph_lock = threading.Lock()
 
     def register_module(self, module: AgentModule):
         """Register a migration module"""
@@ -25,32 +47,63 @@ class ModularAgentFramework:
 
         self.modules[module.module_name] = module
         self._update_execution_order()
+        self.invalidate_graph()
+
+    def invalidate_graph(self):
+        """Drop the cached compiled graph so the next run rebuilds it (call after changing a module)"""
+        with self._graph_lock:
+            self._compiled_graph = None
+
+    def get_compiled_graph(self):
+        """Return the compiled graph, building it once per framework instance"""
+        with self._graph_lock:
+            if self._compiled_graph is None:
+                self._compiled_graph = self.create_main_graph()
+            return self._compiled_graph
 
     def _update_execution_order(self):
-        """Update execution order based on dependencies"""
-        # Simple topological sort
-        ordered = []
-        remaining = set(self.modules.keys())
+        """Update execution order and parallel layers based on dependencies (Kahn's algorithm, O(V+E))"""
+        in_degree: Dict[str, int] = {}
+        dependents: Dict[str, List[str]] = {name: [] for name in self.modules}
+
+        for module_name, module in self.modules.items():
+            missing = [dep for dep in module.dependencies if dep not in self.modules]
+            if missing:
+                raise ValueError(f"Module '{module_name}' depends on unregistered module(s): {missing}")
+
+            in_degree[module_name] = len(module.dependencies)
+            for dep in module.dependencies:
+                dependents[dep].append(module_name)
 
-        while remaining:
-            ready = []
-            for module_name in remaining:
-                module = self.modules[module_name]
-                if all(dep in ordered for dep in module.dependencies):
-                    ready.append(module_name)
+        # Each layer holds the modules whose dependencies are all satisfied by earlier layers
+        layers = []
+        current = [name for name, degree in in_degree.items() if degree == 0]
+        visited = 0
 
-            if not ready:
-                raise ValueError("Circular dependency detected in modules")
+        while current:
+            layers.append(current)
+            visited += len(current)
 
-            # Add ready modules to order
-            for module_name in ready:
-                ordered.append(module_name)
-                remaining.remove(module_name)
+            next_layer = []
+            for module_name in current:
+                for dependent in dependents[module_name]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        next_layer.append(dependent)
+            current = next_layer
 
-        self.execution_order = ordered
+        if visited != len(self.modules):
+            raise ValueError("Circular dependency detected in modules")
+
+        self.execution_layers = layers
+        self.execution_order = [module_name for layer in layers for module_name in layer]
 
     def create_main_graph(self) -> StateGraph:
-        """Create a single, flat migration graph with all module nodes."""
+        """
+        Create the migration graph with all module nodes.
+        Modules in the same dependency layer fan out from the previous layer and run
+        concurrently; the next layer fans in and waits until all of them have finished.
+        """
         main_graph = StateGraph(CoreBianState)
 
         module_endpoints = {}
@@ -59,37 +112,227 @@ class ModularAgentFramework:
         for module_name in self.execution_order:
             module = self.modules[module_name]
             entry_node, exit_node = module.add_nodes_to_graph(main_graph)
+            if self.manifest is not None:
+                entry_node, exit_node = self._add_incremental_nodes(main_graph, module, entry_node, exit_node)
             module_endpoints[module_name] = {"entry": entry_node, "exit": exit_node}
+        self._module_entry_nodes = {name: endpoints["entry"] for name, endpoints in module_endpoints.items()}
+
+        # 2. Connect the layers using the modules' entry/exit nodes
+        if self.execution_layers:
+            # Fan out from START to every module of the first layer
+            for module_name in self.execution_layers[0]:
+                main_graph.add_edge(START, module_endpoints[module_name]["entry"])
+
+            # Fan in the exits of each layer into every entry of the next one
+            for current_layer, next_layer in zip(self.execution_layers, self.execution_layers[1:]):
+                exits_of_current = [module_endpoints[name]["exit"] for name in current_layer]
+                source = exits_of_current[0] if len(exits_of_current) == 1 else exits_of_current
+                for module_name in next_layer:
+                    main_graph.add_edge(source, module_endpoints[module_name]["entry"])
+
+            # Connect the last layer's exit nodes to the graph's END
+            for module_name in self.execution_layers[-1]:
+                main_graph.add_edge(module_endpoints[module_name]["exit"], END)
+
+        return main_graph.compile(checkpointer=self.checkpointer)
+
+    def _add_incremental_nodes(self, graph: StateGraph, module: AgentModule,
+                               entry_node: str, exit_node: str) -> Tuple[str, str]:
+        """
+        Wrap a module with a check node that replays stored outputs when its input
+        fingerprints are unchanged, and a record node that stores fresh outputs.
+
+        Returns:
+            Tuple[str, str]: The new (entry_node_name, exit_node_name) for the module.
+        """
+        module_name = module.module_name
+        check_node = f"{module_name}_check_inputs"
+        record_node = f"{module_name}_record_outputs"
+
+        def check_inputs(state: CoreBianState) -> Dict:
+            try:
+                inputs = module.input_fingerprint(state)
+            except Exception as e:
+                # Let the module run and report the underlying problem itself
+                print(f"[{module_name}] Could not fingerprint inputs: {e}")
+                inputs = None
+
+            if inputs is None:
+                return {"module_results": {module_name: {"incremental": "disabled"}}}
+
+            fingerprint = RunManifest.combine(inputs)
+            result = {"input_fingerprint": fingerprint, "inputs": inputs}
+            outputs = self.manifest.lookup(module_name, fingerprint)
+            if outputs is None:
+                return {"module_results": {module_name: {**result, "incremental": "miss"}}}
+
+            print(f"[{module_name}] Inputs unchanged, reusing stored outputs")
+            # Work the module started ahead from a token stream is not needed any more
+            hub = current_hub()
+            pending = hub.take_result(module_name) if hub is not None else None
+            if pending is not None and pending.cancel():
+                print(f"[{module_name}] Cancelled the call started ahead of the node")
+            return {**outputs, "module_results": {module_name: {**result, "incremental": "hit"}}}
+
+        def route(state: CoreBianState) -> str:
+            result = state.get("module_results", {}).get(module_name, {})
+            return "hit" if result.get("incremental") == "hit" else "run"
+
+        def record_outputs(state: CoreBianState) -> Dict:
+            result = state.get("module_results", {}).get(module_name, {})
+            if result.get("incremental") != "miss":
+                return {}
+            # Never persist the outputs of a failed run
+            if any(error.startswith(f"{module_name}:") for error in state.get("errors", [])):
+                return {}
+
+            outputs = {key: state[key] for key in module.output_keys if key in state}
+            if outputs:
+                self.manifest.record(module_name, result["input_fingerprint"], result["inputs"], outputs)
+            return {}
+
+        graph.add_node(check_node, check_inputs)
+        graph.add_node(record_node, record_outputs)
+        graph.add_conditional_edges(check_node, route, {"hit": record_node, "run": entry_node})
+        graph.add_edge(exit_node, record_node)
+
+        return check_node, record_node
+
+    def _token_stream_hub(self) -> Optional[TokenStreamHub]:
+        """A fresh hub for one run, with every pipelined module subscribed to it"""
+        if not self.pipelined:
+            return None
+        hub = TokenStreamHub()
+        for module in self.modules.values():
+            subscribe = getattr(module, "subscribe_streams", None)
+            if subscribe is not None:
+                subscribe(hub)
+        return hub
+
+    def _run_config(self, run_id: Optional[str]) -> Dict:
+        config = {"recursion_limit": 400}
+        if self.checkpointer is not None:
+            config["configurable"] = {"thread_id": run_id}
+        return config
+
+    def _failed_entry_nodes(self, values: Dict) -> Set[str]:
+        """Entry nodes of the modules that reported an error (errors are prefixed with the module name)"""
+        errors = values.get("errors", [])
+        return {
+            entry for module_name, entry in self._module_entry_nodes.items()
+            if any(error.startswith(f"{module_name}:") for error in errors)
+        }
+
+    def _plan_resume(self, run_id: str, snapshot, history) -> Tuple[Optional[Dict], bool]:
+        """
+        Decide where a checkpointed run continues from.
+
+        Returns:
+            Tuple[Optional[Dict], bool]: (config to resume from, or None to start fresh;
+                                          whether the stale thread must be cleared first)
+        """
+        if not snapshot.values:
+            return None, False
+
+        if snapshot.next:
+            # Interrupted mid-run (crash, killed worker): continue after the last completed node
+            print(f"Resuming run {run_id} at: {list(snapshot.next)}")
+            return snapshot.config, False
+
+        failed_entries = self._failed_entry_nodes(snapshot.values)
+        if failed_entries:
+            # Completed with module errors: rewind to just before the first failed module
+            # so every module that succeeded keeps its already-paid-for output
+            resume_from = None
+            for past in history:  # newest first
+                if failed_entries & set(past.next):
+                    resume_from = past
+            if resume_from is not None:
+                print(f"Retrying run {run_id} from: {list(resume_from.next)}")
+                return resume_from.config, False
+
+        # Completed cleanly but never cleared: run again from scratch
+        return None, True
+
+    def clear_checkpoint(self, run_id: str):
+        """Delete all checkpoints stored for a run"""
+        if self.checkpointer is not None:
+            self.checkpointer.delete_thread(run_id)
+
+    def start_analysis(self, state: CoreBianState, run_id: Optional[str] = None) -> Dict:
+        """
+        Run the complete migration with all registered modules.
 
-        # 2. Chain the modules together using their entry/exit nodes
-        if self.execution_order:
-            # Set the main graph's entry point to the first module's entry node
-            first_module_name = self.execution_order[0]
-            main_graph.set_entry_point(module_endpoints[first_module_name]["entry"])
+        Args:
+            state (CoreBianState): Initial state for a fresh run.
+            run_id (Optional[str]): Stable id for this run (e.g. the message id). With a
+                                    checkpointer, a run with the same id resumes from its
+                                    last completed node instead of starting over.
+        """
+        print(f"Starting migration with modules: {self.execution_order}")
 
-            # Add edges between modules
-            for i in range(len(self.execution_order) - 1):
-                current_module_name = self.execution_order[i]
-                next_module_name = self.execution_order[i + 1]
+        started_at = time.perf_counter()
+        main_graph = self.get_compiled_graph()
+        # A checkpointed graph always needs a thread id; anonymous runs get a throwaway one
+        ephemeral = run_id is None
+        run_id = run_id or uuid.uuid4().hex
+        config = self._run_config(run_id)
 
-                # Connect the exit node of the current module to the entry node of the next one
-                exit_of_current = module_endpoints[current_module_name]["exit"]
-                entry_of_next = module_endpoints[next_module_name]["entry"]
-                main_graph.add_edge(exit_of_current, entry_of_next)
+        graph_input = state
+        if "configurable" in config and not ephemeral:
+            snapshot = main_graph.get_state(config)
+            resume_config, stale = self._plan_resume(run_id, snapshot, main_graph.get_state_history(config))
+            if resume_config is not None:
+                graph_input, config = None, {**config, "configurable": resume_config["configurable"]}
+            elif stale:
+                self.clear_checkpoint(run_id)
 
-            # Connect the last module's exit node to the graph's END
-            last_module_name = self.execution_order[-1]
-            main_graph.add_edge(module_endpoints[last_module_name]["exit"], END)
+        # Nodes inherit the hub through the context LangGraph runs them in
+        with bind_hub(self._token_stream_hub()):
+            final_state = main_graph.invoke(graph_input, config)
 
-        return main_graph.compile()
+        # Successful (and anonymous) runs do not need their checkpoints anymore
+        if "configurable" in config and (ephemeral or not final_state.get("errors")):
+            self.clear_checkpoint(run_id)
 
-    def start_analysis(self, state: CoreBianState) -> Dict:
-        """Run the complete migration with all registered modules"""
+        if self.metrics is not None:
+            self.metrics.observe_run(run_id, final_state, time.perf_counter() - started_at)
+
+        final_state["migration_complete"] = True
+        return final_state
+
+    async def astart_analysis(self, state: CoreBianState, run_id: Optional[str] = None) -> Dict:
+        """
+        Async variant of start_analysis using LangGraph's ainvoke.
+        Module nodes run their async implementations, so many runs can share one event loop.
+        """
         print(f"Starting migration with modules: {self.execution_order}")
 
-        main_graph = self.create_main_graph()
+        started_at = time.perf_counter()
+        main_graph = self.get_compiled_graph()
+        # A checkpointed graph always needs a thread id; anonymous runs get a throwaway one
+        ephemeral = run_id is None
+        run_id = run_id or uuid.uuid4().hex
+        config = self._run_config(run_id)
+
+        graph_input = state
+        if "configurable" in config and not ephemeral:
+            snapshot = await main_graph.aget_state(config)
+            history = [past async for past in main_graph.aget_state_history(config)]
+            resume_config, stale = self._plan_resume(run_id, snapshot, history)
+            if resume_config is not None:
+                graph_input, config = None, {**config, "configurable": resume_config["configurable"]}
+            elif stale:
+                await self.checkpointer.adelete_thread(run_id)
+
+        with bind_hub(self._token_stream_hub()):
+            final_state = await main_graph.ainvoke(graph_input, config)
+
+        if "configurable" in config and (ephemeral or not final_state.get("errors")):
+            await self.checkpointer.adelete_thread(run_id)
 
-        final_state = main_graph.invoke(state, {"recursion_limit": 400})
+        if self.metrics is not None:
+            self.metrics.observe_run(run_id, final_state, time.perf_counter() - started_at)
 
         final_state["migration_complete"] = True
         return final_state
@@ -111,8 +354,8 @@ class ModularAgentFramework:
         try:
             from IPython.display import Image, display
 
-            # Create the main graph
-            main_graph = self.create_main_graph()
+            # Get the main graph
+            main_graph = self.get_compiled_graph()
 
             # Generate and display the mermaid diagram
             graph_image = main_graph.get_graph(xray=xray).draw_mermaid_png()
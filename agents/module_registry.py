@@ -0,0 +1,242 @@
+"""
+Registry of the AgentModule implementations available to the framework.
+
+Modules are declared as "package.module:ClassName" targets and only imported when first
+used, so tools that never build the pipeline do not pay for LangGraph, the Anthropic SDK
+or the modules' own dependencies. Besides the built-in modules, plugins are discovered from
+the `bian.agent_modules` entry point group and from the AGENT_MODULES environment variable:
+
+    AGENT_MODULES="framework_detector,requirement_generator,my_module=my_package.my_module:MyModule"
+
+A bare name selects a known module, `name=target` declares a new one; when AGENT_MODULES is
+set only the listed modules are enabled. Every import is timed for the import-time report,
+which imports the heavy third-party dependencies first and lists them on their own lines so
+their cost is not charged to whichever module happens to import them first:
+
+    python -m agents.module_registry
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+ENTRY_POINT_GROUP = "bian.agent_modules"
+
+BUILTIN_MODULES = {
+    "framework_detector": "agents.modules.framework_detector:FrameworkDetectorModule",
+    "requirement_generator": "agents.modules.requirement_generator:RequirementGeneratorModule",
+    "project_structure": "agents.modules.project_structure:ProjectStructureModule",
+}
+
+# Heavy dependencies shown in the import-time report (the submodules the agents import,
+# since the top-level langgraph/langchain_core packages are nearly empty)
+TRACKED_DEPENDENCIES = ["anthropic", "langchain_core.runnables", "langgraph.graph", "pika"]
+
+
+class ModuleSpec:
+    """A module declared by name and import target, imported on first load()"""
+
+    def __init__(self, name: str, target: str, source: str):
+        self.name = name
+        self.target = target
+        # "builtin", "entry_point" or "config"
+        self.source = source
+        self.import_seconds: Optional[float] = None
+        # Tracked dependencies this module imported for the first time in the process
+        self.imported_dependencies: List[str] = []
+        self._factory = None
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._factory is not None
+
+    def load(self):
+        """The module class (or factory), importing it on the first call"""
+        if self._factory is None:
+            module_path, _, attribute = self.target.partition(":")
+            already_imported = {name for name in TRACKED_DEPENDENCIES if name in sys.modules}
+            started = time.perf_counter()
+            try:
+                factory = importlib.import_module(module_path)
+                for part in attribute.split(".") if attribute else []:
+                    factory = getattr(factory, part)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                raise ImportError(f"Cannot load agent module '{self.name}' from {self.target}: {e}") from e
+            finally:
+                self.import_seconds = time.perf_counter() - started
+                self.imported_dependencies = [
+                    name for name in TRACKED_DEPENDENCIES if name in sys.modules and name not in already_imported
+                ]
+            self._factory = factory
+        return self._factory
+
+
+class ModuleRegistry:
+    """Name -> ModuleSpec, in registration order"""
+
+    def __init__(self, specs: Optional[List[ModuleSpec]] = None):
+        self._lock = threading.Lock()
+        self._specs: Dict[str, ModuleSpec] = {}
+        for spec in specs or []:
+            self.register(spec.name, spec.target, spec.source)
+
+    @classmethod
+    def from_env(cls) -> "ModuleRegistry":
+        """Built-in modules, entry point plugins and AGENT_MODULES, see the module docstring"""
+        registry = cls()
+        for name, target in BUILTIN_MODULES.items():
+            registry.register(name, target, "builtin")
+        for name, target in discover_entry_points().items():
+            registry.register(name, target, "entry_point")
+
+        config = os.getenv("AGENT_MODULES", "").strip()
+        if not config:
+            return registry
+
+        enabled = []
+        for item in config.split(","):
+            name, _, target = (part.strip() for part in item.partition("="))
+            if not name:
+                continue
+            if target:
+                registry.register(name, target, "config")
+            elif name not in registry:
+                raise ValueError(f"AGENT_MODULES lists unknown module '{name}' (use name=package.module:Class)")
+            enabled.append(name)
+        return cls([registry.spec(name) for name in enabled])
+
+    def register(self, name: str, target: str, source: str = "config"):
+        """Declare a module; a later registration of the same name replaces the earlier one"""
+        if ":" not in target:
+            raise ValueError(f"Module target for '{name}' must look like 'package.module:ClassName', got {target!r}")
+        with self._lock:
+            self._specs[name] = ModuleSpec(name, target, source)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def spec(self, name: str) -> ModuleSpec:
+        try:
+            return self._specs[name]
+        except KeyError:
+            raise KeyError(f"Unknown agent module '{name}' (registered: {', '.join(self._specs) or 'none'})") from None
+
+    def load(self, name: str):
+        """The class (or factory) of a module, imported on first use"""
+        spec = self.spec(name)
+        with self._lock:
+            return spec.load()
+
+    def create(self, name: str, **kwargs) -> Any:
+        """Instantiate a module"""
+        return self.load(name)(**kwargs)
+
+    def import_report(self) -> List[Dict[str, Any]]:
+        """One entry per module: where it comes from, whether it is imported and how long that took"""
+        return [
+            {
+                "name": spec.name,
+                "source": spec.source,
+                "target": spec.target,
+                "loaded": spec.loaded,
+                "import_seconds": spec.import_seconds,
+                "imported_dependencies": spec.imported_dependencies,
+                "error": spec.error,
+            }
+            for spec in self._specs.values()
+        ]
+
+    def format_import_report(self, dependency_seconds: Optional[Dict[str, Optional[float]]] = None) -> str:
+        """The report table; `dependency_seconds` (from import_dependencies) adds a line per dependency"""
+        lines = [f"{'module':<24} {'source':<12} {'import':>9}  target"]
+        for name, seconds in (dependency_seconds or {}).items():
+            status = "missing" if seconds is None else f"{seconds * 1000:.0f} ms"
+            lines.append(f"{name:<24} {'dependency':<12} {status:>9}  {name}")
+        for entry in self.import_report():
+            if entry["error"]:
+                status = "failed"
+            elif entry["loaded"]:
+                status = f"{entry['import_seconds'] * 1000:.0f} ms"
+            else:
+                status = "lazy"
+            target = entry["target"]
+            if entry["imported_dependencies"]:
+                target += f" (includes {', '.join(entry['imported_dependencies'])})"
+            lines.append(f"{entry['name']:<24} {entry['source']:<12} {status:>9}  {target}")
+        imported = [name for name in TRACKED_DEPENDENCIES if name in sys.modules]
+        lines.append(f"Dependencies imported: {', '.join(imported) or 'none'}")
+        return "\n".join(lines)
+
+
+def import_dependencies() -> Dict[str, Optional[float]]:
+    """
+    Import each tracked dependency not imported yet and time it on its own
+    (None when it is not installed); dependencies already imported are left out.
+    """
+    timings: Dict[str, Optional[float]] = {}
+    for name in TRACKED_DEPENDENCIES:
+        if name in sys.modules:
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            timings[name] = None
+        else:
+            timings[name] = time.perf_counter() - started
+    return timings
+
+
+def discover_entry_points() -> Dict[str, str]:
+    """name -> target of the plugins installed under the bian.agent_modules entry point group"""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return {}
+    try:
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python < 3.10: entry_points() returns a dict of groups
+        found = entry_points().get(ENTRY_POINT_GROUP, [])
+    return {entry_point.name: entry_point.value for entry_point in found}
+
+
+_module_registry: Optional[ModuleRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_module_registry() -> ModuleRegistry:
+    """The process-wide registry built from the environment"""
+    global _module_registry
+    with _registry_lock:
+        if _module_registry is None:
+            _module_registry = ModuleRegistry.from_env()
+        return _module_registry
+
+
+def main():
+    """Print the registered modules and how long importing each of them takes"""
+    started = time.perf_counter()
+    registry = get_module_registry()
+    print(f"Discovered {len(registry.names())} module(s) in {(time.perf_counter() - started) * 1000:.0f} ms\n")
+    dependency_seconds = import_dependencies()
+    for name in registry.names():
+        try:
+            registry.load(name)
+        except ImportError as e:
+            print(f"[!] {e}")
+    print(registry.format_import_report(dependency_seconds))
+    print("\nDependencies are imported first, so module times only cover the modules' own code "
+          "and whatever they import besides the tracked dependencies.")
+
+
+if __name__ == '__main__':
+    main()
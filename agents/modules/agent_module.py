@@ -1,4 +1,4 @@
-from typing import List, Protocol, Tuple
+from typing import Dict, List, Optional, Protocol, Tuple
 from langgraph.graph import StateGraph
 
 class AgentModule(Protocol):
@@ -18,6 +18,10 @@ class AgentModule(Protocol):
         """
         Adds this module's nodes and internal edges to the provided graph.
 
+        Nodes must return partial state updates rather than mutating the shared state,
+        since modules without mutual dependencies may run in the same graph step.
+        `errors` and `module_results` are merged by reducers.
+
         Args:
             graph (StateGraph): The main graph to add nodes to.
 
@@ -34,6 +38,27 @@ class AgentModule(Protocol):
         """Get the exit point node name for this subgraph"""
         ...
 
+    @property
+    def output_keys(self) -> List[str]:
+        """State keys this module produces; stored and replayed by incremental runs"""
+        return []
+
+    def input_fingerprint(self, state) -> Optional[Dict[str, str]]:
+        """
+        Fingerprints (name -> hash) of every input this module consumes.
+        Modules returning None (the default) always run; otherwise the framework skips
+        the module and replays its stored outputs when the fingerprints are unchanged.
+        """
+        return None
+
+    def subscribe_streams(self, hub) -> None:
+        """
+        Optional: subscribe to the token streams of predecessors (see internal.token_streams)
+        to start work on a prefix of their output before their nodes finish. Called by a
+        pipelined framework with the TokenStreamHub of every run.
+        """
+        ...
+
     def log_loading(self) -> None:
         """
         Log when this module is being loaded.
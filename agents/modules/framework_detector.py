@@ -1,22 +1,36 @@
+import asyncio
 import os
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 from agents.bian_core import CoreBianState
 from agents.modules.agent_module import AgentModule
+from internal.run_manifest import fingerprint_files, fingerprint_text
+from internal.metrics import track_module_metrics
+from internal.stack_detection import detect_stack
+from llm.async_anthropic_llm_client import agenerate
+from llm.token_budget import BudgetPlanner
 
 class FrameworkDetectorModule(AgentModule):
     """
     Module to detect the framework and programming language of API endpoint files.
     """
 
-    def __init__(self, file_reader, llm_client):
+    def __init__(self, file_reader, llm_client, heuristic_threshold: Optional[float] = 0.8,
+                 budget_planner: Optional[BudgetPlanner] = None, max_input_tokens: int = 8000):
         self.file_reader = file_reader
         self.llm_client = llm_client
+        self.budget_planner = budget_planner or BudgetPlanner.for_client(llm_client)
+        # The first lines of a file are enough to recognize its stack
+        self.max_input_tokens = max_input_tokens
+        # Rule-based detection at or above this confidence skips the LLM call; None always asks the LLM
+        self.heuristic_threshold = heuristic_threshold
         self._module_name = "framework_detector"
         self._dependencies = []
+        # The answer is two short lines
         self._llm_config = {
-            "max_tokens": 5000,
+            "max_tokens": 256,
         }
 
     @property
@@ -27,55 +41,142 @@ class FrameworkDetectorModule(AgentModule):
     def dependencies(self) -> List[str]:
         return self._dependencies
 
+    @property
+    def output_keys(self) -> List[str]:
+        return ["target_language", "target_framework"]
+
+    def input_fingerprint(self, state: CoreBianState) -> Optional[Dict[str, str]]:
+        """Fingerprint the endpoint files and LLM settings the detection depends on."""
+        endpoints_dir = Path(state["endpoints_dir"])
+        return {
+            "endpoint_files": fingerprint_files(endpoints_dir.glob("*.md")),
+            "llm": fingerprint_text(f"{getattr(self.llm_client, 'model', '')}:{sorted(self._llm_config.items())}"),
+            "heuristic_threshold": fingerprint_text(str(self.heuristic_threshold)),
+        }
+
     def add_nodes_to_graph(self, graph: StateGraph) -> Tuple[str, str]:
-        """Adds this module's node to the main graph."""
+        """Adds this module's node to the main graph (sync for invoke, async for ainvoke)."""
         node_name = f"{self.module_name}_node"
-        graph.add_node(node_name, self.detect_framework_and_language)
+        graph.add_node(
+            node_name,
+            RunnableLambda(self.detect_framework_and_language, afunc=self.adetect_framework_and_language)
+        )
         return (node_name, node_name)
 
-    def detect_framework_and_language(self, state: CoreBianState) -> CoreBianState:
+    def _list_endpoint_files(self, state: CoreBianState) -> List[Path]:
+        endpoints_dir = Path(state["endpoints_dir"])
+        if not endpoints_dir.exists() or not endpoints_dir.is_dir():
+            raise FileNotFoundError(f"Endpoints directory not found at: {endpoints_dir}")
+
+        endpoint_files = sorted(endpoints_dir.glob("*.md"))
+        if not endpoint_files:
+            raise FileNotFoundError(f"No supported endpoint files found in {endpoints_dir}")
+        return endpoint_files
+
+    def _detect_heuristically(self, state: CoreBianState) -> Optional[Dict[str, Any]]:
+        """
+        Votes across every endpoint file with the rule-based detector.
+        Returns the partial state update when confident enough, None to fall back to the LLM.
+        """
+        if self.heuristic_threshold is None:
+            return None
+
+        endpoint_files = self._list_endpoint_files(state)
+        detection = detect_stack(self.file_reader.read_many(endpoint_files))
+        print(f"[{self.module_name}] Heuristic detection: {detection['language']} / "
+              f"{detection['framework']} (confidence {detection['confidence']:.2f} over {detection['files']} files)")
+
+        if detection["language"] is None or detection["confidence"] < self.heuristic_threshold:
+            return None
+
+        print(f"[{self.module_name}] Detected language: {detection['language']}")
+        print(f"[{self.module_name}] Detected framework: {detection['framework']}")
+        return {
+            "target_language": detection["language"],
+            "target_framework": detection["framework"],
+            "module_results": {
+                self.module_name: {"detection": "heuristic", "confidence": detection["confidence"]}
+            },
+        }
+
+    def _build_prompts(self, state: CoreBianState) -> Tuple[str, str]:
+        """Reads the first endpoint file and builds the (system, user) prompts for the LLM."""
+        first_file = self._list_endpoint_files(state)[0]
+        print(f"[{self.module_name}] Analyzing file: {first_file}")
+
+        # Read the file content, whole lines up to the input budget
+        file_content = self.budget_planner.fit_text(
+            self.file_reader.read_file(str(first_file)), self.max_input_tokens
+        )
+
+        # Prepare the prompt for the LLM
+        system_prompt = """
+        You are an expert software engineer analyzing code to identify the programming language 
+        and web framework used. Respond with ONLY the language and framework in this exact format:
+        "Language: <language>\nFramework: <framework>"
+        
+        If the framework is not a known web framework, just put 'None'.
+        Be concise and specific in your identification.
+        """
+
+        user_prompt = f"""Analyze this code and identify the programming language and web framework:
+        
+        {file_content}
+        
+        Format your response as:
+        Language: <language>
+        Framework: <framework or None>
+        """
+
+        return system_prompt, user_prompt
+
+    def _parse_response(self, response: str) -> Dict[str, Any]:
+        """Parses the LLM answer into a partial state update with the detected information."""
+        print(response)
+
+        # Parse the response
+        language = None
+        framework = None
+        
+        for line in response.split('\n'):
+            if line.lower().startswith('language:'):
+                language = line.split(':', 1)[1].strip()
+            elif line.lower().startswith('framework:'):
+                framework = line.split(':', 1)[1].strip()
+                if framework.lower() == 'none':
+                    framework = None
+
+        # Collect the detected information
+        updates = {}
+        if language:
+            updates["target_language"] = language.lower()
+            print(f"[{self.module_name}] Detected language: {language}")
+        if framework:
+            updates["target_framework"] = framework.lower()
+            print(f"[{self.module_name}] Detected framework: {framework}")
+
+        return updates
+
+    def _error_update(self, e: Exception) -> Dict[str, Any]:
+        error_msg = f"{self.module_name}: Error detecting framework and language: {str(e)}"
+        print(f"[ERROR] {error_msg}")
+        return {"errors": [error_msg]}
+
+    @track_module_metrics
+    def detect_framework_and_language(self, state: CoreBianState) -> Dict[str, Any]:
         """
-        Detects the framework and programming language of the first file in the endpoints directory.
-        Updates the state with the detected information.
+        Detects the framework and programming language of the endpoint files, locally when the
+        rule-based detector is confident and with the LLM on the first file otherwise.
+        Returns a partial state update with the detected information.
         """
         print(f"[{self.module_name}] Detecting framework and language...")
-        state["current_module"] = self.module_name
 
         try:
-            # Get the first file in the endpoints directory
-            endpoints_dir = Path(state["endpoints_dir"])
-            if not endpoints_dir.exists() or not endpoints_dir.is_dir():
-                raise FileNotFoundError(f"Endpoints directory not found at: {endpoints_dir}")
-
-            # Get the first .py or .js file in the directory
-            endpoint_files = list(endpoints_dir.glob("*.md"))
-            if not endpoint_files:
-                raise FileNotFoundError(f"No supported endpoint files found in {endpoints_dir}")
-
-            first_file = endpoint_files[0]
-            print(f"[{self.module_name}] Analyzing file: {first_file}")
-
-            # Read the file content
-            file_content = self.file_reader.read_file(str(first_file))
-
-            # Prepare the prompt for the LLM
-            system_prompt = """
-            You are an expert software engineer analyzing code to identify the programming language 
-            and web framework used. Respond with ONLY the language and framework in this exact format:
-            "Language: <language>\nFramework: <framework>"
-            
-            If the framework is not a known web framework, just put 'None'.
-            Be concise and specific in your identification.
-            """
-
-            user_prompt = f"""Analyze this code and identify the programming language and web framework:
-            
-            {file_content}
-            
-            Format your response as:
-            Language: <language>
-            Framework: <framework or None>
-            """
+            heuristic_update = self._detect_heuristically(state)
+            if heuristic_update is not None:
+                return heuristic_update
+
+            system_prompt, user_prompt = self._build_prompts(state)
 
             # Call the LLM
             response, _ = self.llm_client.generate(
@@ -84,31 +185,33 @@ class FrameworkDetectorModule(AgentModule):
                 **self._llm_config
             )
 
-            print(response)
-
-            # Parse the response
-            language = None
-            framework = None
-            
-            for line in response.split('\n'):
-                if line.lower().startswith('language:'):
-                    language = line.split(':', 1)[1].strip()
-                elif line.lower().startswith('framework:'):
-                    framework = line.split(':', 1)[1].strip()
-                    if framework.lower() == 'none':
-                        framework = None
-
-            # Update the state with the detected information
-            if language:
-                state["target_language"] = language.lower()
-                print(f"[{self.module_name}] Detected language: {language}")
-            if framework:
-                state["target_framework"] = framework.lower()
-                print(f"[{self.module_name}] Detected framework: {framework}")
+            return self._parse_response(response)
 
         except Exception as e:
-            error_msg = f"{self.module_name}: Error detecting framework and language: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            state["errors"].append(error_msg)
+            return self._error_update(e)
+
+    @track_module_metrics
+    async def adetect_framework_and_language(self, state: CoreBianState) -> Dict[str, Any]:
+        """Async variant of detect_framework_and_language used by ainvoke."""
+        print(f"[{self.module_name}] Detecting framework and language...")
 
-        return state
+        try:
+            # File reads stay off the event loop
+            heuristic_update = await asyncio.to_thread(self._detect_heuristically, state)
+            if heuristic_update is not None:
+                return heuristic_update
+
+            system_prompt, user_prompt = self._build_prompts(state)
+
+            # Call the LLM without blocking the event loop
+            response, _ = await agenerate(
+                self.llm_client,
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                **self._llm_config
+            )
+
+            return self._parse_response(response)
+
+        except Exception as e:
+            return self._error_update(e)
@@ -1,26 +1,65 @@
+import asyncio
+import contextvars
+import functools
+import inspect
 import os
 import re
-from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional, Union
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Any, Callable, Tuple, Optional, Union
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 from agents.bian_core import CoreBianState
 from agents.modules.agent_module import AgentModule
+from internal.run_manifest import fingerprint_text
+from internal.metrics import ModuleMetrics, collect_module_metrics, current_module_metrics, track_module_metrics
+from internal.streaming_output import StreamingOutput
+from internal.template_registry import TemplateRegistry
+from internal.token_streams import TokenStream, TokenStreamHub, current_hub
+from internal.markdown_sections import (
+    PROJECT_STRUCTURE_TITLES, insert_section, parse_sections, remove_sections, replace_section_body
+)
+from llm.prompt_blocks import PromptContent, text_block
+from llm.token_budget import BudgetPlanner, estimate_tokens
+
+STRUCTURE_TITLES = PROJECT_STRUCTURE_TITLES
+STRUCTURE_TITLES_LOWER = {title.lower() for title in STRUCTURE_TITLES}
+
+OUTPUT_FILE_NAME = "updated_requirements.md"
 
 class ProjectStructureModule(AgentModule):
     """
     Module to update the project structure based on the detected language and framework.
-    Uses architecture templates from tmp/architectures/{LANGUAGE}.txt
+    Uses architecture templates from tmp/architectures/{language}/{architecture}.txt
+
+    In a pipelined framework the structure call starts on a prefix of the requirements while
+    they are still being generated (the prompt only needs `requirements_context_tokens` of
+    them); the node then only merges the section into the finished document.
     """
 
-    def __init__(self, file_reader, llm_client):
+    def __init__(self, file_reader, llm_client, min_section_tokens: int = 1024,
+                 streaming_output: Optional[StreamingOutput] = None,
+                 template_registry: Optional[TemplateRegistry] = None,
+                 budget_planner: Optional[BudgetPlanner] = None, requirements_context_tokens: int = 4000):
         self.file_reader = file_reader
         self.llm_client = llm_client
+        self.budget_planner = budget_planner or BudgetPlanner.for_client(llm_client)
+        # Whole sections of the requirements (outside the structure section) given as context
+        self.requirements_context_tokens = requirements_context_tokens
+        # Templates are indexed once; lookups resolve aliases and close architecture names
+        self.template_registry = template_registry or TemplateRegistry()
         self._module_name = "project_structure"
         self._dependencies = ["framework_detector", "requirement_generator"]
+        # Only the structure section is regenerated; max_tokens caps the per-section budget
+        self.min_section_tokens = min_section_tokens
+        # When set, the patched document is written atomically to {output_dir}/updated_requirements.md
+        self.streaming_output = streaming_output
         self._llm_config = {
-            "max_tokens": 64000,
+            "max_tokens": 16000,
             "temperature": 0.0
         }
+        # Structure calls started from a token stream on an event loop (asyncio keeps weak references)
+        self._pipelined_tasks = set()
 
     @property
     def module_name(self) -> str:
@@ -30,154 +69,427 @@ class ProjectStructureModule(AgentModule):
     def dependencies(self) -> List[str]:
         return self._dependencies
 
+    @property
+    def output_keys(self) -> List[str]:
+        return ["updated_requirements"]
+
+    def input_fingerprint(self, state: CoreBianState) -> Optional[Dict[str, str]]:
+        """Fingerprint the generated requirements, architecture template and LLM settings."""
+        language = state.get("target_language", "").lower()
+        architecture = state.get("target_architecture", "multimodule").lower()
+        template = self._load_architecture_template(language, architecture) if language else None
+        return {
+            "requirements": fingerprint_text(state.get("generated_requirements", "")),
+            "template": fingerprint_text(f"{language}/{architecture}:{template or ''}"),
+            "llm": fingerprint_text(
+                f"{getattr(self.llm_client, 'model', '')}:{sorted(self._llm_config.items())}:"
+                f"{self.min_section_tokens}:{self.requirements_context_tokens}"
+            ),
+        }
+
     def add_nodes_to_graph(self, graph: StateGraph) -> Tuple[str, str]:
-        """Adds this module's node to the main graph."""
+        """Adds this module's node to the main graph (sync for invoke, async for ainvoke)."""
         node_name = f"{self.module_name}_node"
-        graph.add_node(node_name, self.update_project_structure)
+        graph.add_node(
+            node_name,
+            RunnableLambda(self.update_project_structure, afunc=self.aupdate_project_structure)
+        )
         return (node_name, node_name)
 
     def _load_architecture_template(self, language: str, architecture: str) -> Optional[str]:
-        """Load the architecture template for the given language and architecture."""
-        template_path = Path(f"tmp/architectures/{language.lower()}/{architecture.lower()}.txt")
-        
-        try:
-            if template_path.exists():
-                return self.file_reader.read_file(str(template_path))
-        except Exception as e:
-            print(f"[WARNING] Could not load template {template_path}: {e}")
-                
-        return None
-        
-    def _generate_structure_with_llm(self, language: str, architecture: str, requirements: str, template: str) -> str:
-        """Use LLM to update the requirements with an appropriate project structure."""
+        """Look up the architecture template for the given language and architecture."""
+        template = self.template_registry.get(language, architecture)
+        return template.text if template else None
+
+    def _section_max_tokens(self, system_prompt: str, structure_prompt: PromptContent,
+                            template: str, current_section: str) -> int:
+        """Output budget proportional to the section being regenerated (2x headroom), within the model's limits."""
+        planner = self.budget_planner
+        estimate = 2 * (planner.count(template) + planner.count(current_section))
+        expected = min(self._llm_config["max_tokens"], max(self.min_section_tokens, estimate))
+        return planner.max_tokens(system_prompt, structure_prompt, expected, minimum=self.min_section_tokens)
+
+    def _build_structure_prompts(self, requirements: str, template: str) -> Tuple[str, PromptContent, int]:
+        """Build the (system, user) prompts asking the LLM for the new structure section, and its token budget."""
+        root = parse_sections(requirements)
+        section = root.find(STRUCTURE_TITLES)
+        current_section = requirements[section.body_start:section.end].strip() if section else "(none)"
+
         system_prompt = """
-        You are an expert software architect. Your task is to update the project requirements document
-        by replacing the "Proposed Project Structure" section with a new one based on the provided template.
+        You are an expert software architect. Your task is to write the "Proposed Project Structure"
+        section of a project requirements document based on the provided template.
         
         INSTRUCTIONS:
-        1. Find the "## Proposed Project Structure" or "## Project Structure" section in the requirements
-        2. Replace ONLY this section with the new structure
-        3. Keep all other content exactly as is
-        4. The new structure should be based on the provided template but adapted to the project
-        5. Maintain consistent markdown formatting
+        1. Return ONLY the body of the section: no heading, no other sections, no commentary
+        2. The new structure should be based on the provided template but adapted to the project
+        3. Maintain consistent markdown formatting (a short introduction and a code block with the tree)
         
         The template is just an example - adapt it intelligently to fit the project's requirements.
         """
 
-        user_prompt = f"""
-        Please update the project requirements document below by replacing the "Proposed Project Structure"
-        section with a new one based on the template. The new structure should be tailored to this project.
+        # The template is shared by every project with this architecture: keep it first
+        # as a cacheable prefix, followed by the project-specific context
+        outline = "\n".join(root.outline())
+        # Whole sections rather than a character cut; the structure section is already given above
+        requirements_context = self.budget_planner.fit_sections(
+            requirements, self.requirements_context_tokens, exclude_titles=tuple(STRUCTURE_TITLES)
+        )
+        structure_prompt = [
+            text_block(f"""
+        Template Structure:
+        {template}
+        """, cache=True),
+            text_block(f"""
+        Based on the following project requirements and the template above, write the new body of the
+        "Proposed Project Structure" section. Only this section is replaced; the rest of the document stays as is.
         
-        ========== EXISTING REQUIREMENTS ==========
-        {requirements}
+        Document outline:
+        {outline}
         
-        ========== TEMPLATE STRUCTURE ==========
-        {template}
+        Current "Proposed Project Structure" section:
+        {current_section}
         
-        ========== INSTRUCTIONS ==========
-        1. Find the "## Proposed Project Structure" section
-        2. Replace ONLY this section with the new structure
-        3. Keep all other content exactly as is
-        4. The structure should follow the template but be adapted to this project
-        5. Use proper markdown formatting with code blocks
+        Requirements:
+        {requirements_context}
         
-        Return the complete updated requirements document with the replaced structure section.
+        Return ONLY the section body (introduction and code block), without the "## Proposed Project Structure" heading.
+        """),
+        ]
+
+        max_tokens = self._section_max_tokens(system_prompt, structure_prompt, template, current_section)
+        return system_prompt, structure_prompt, max_tokens
+
+    @staticmethod
+    def _section_complete(response: str) -> bool:
+        """True once the streamed answer has moved past the structure section into another one."""
+        root = parse_sections(response)
+        return any(
+            section.title.lower() not in STRUCTURE_TITLES_LOWER and section.start > 0 and section.level <= 2
+            for section in root.walk() if section.level
+        )
+
+    @staticmethod
+    def _extract_section_body(response: str) -> str:
+        """The section body from the answer, dropping a repeated heading and anything after the section."""
+        root = parse_sections(response)
+        top_level = root.children
+        if top_level and top_level[0].title.lower() in STRUCTURE_TITLES_LOWER:
+            section = top_level[0]
+            # Subsections of the structure section belong to it, anything after does not
+            return response[section.body_start:section.end].strip()
+        # Same rule as _section_complete: only another section of level <= 2 ends it,
+        # so ### subsections written inside the structure section are kept
+        end = next(
+            (section.start for section in root.walk()
+             if section.level and section.level <= 2 and section.start > 0
+             and section.title.lower() not in STRUCTURE_TITLES_LOWER),
+            None
+        )
+        return response[:end].strip() if end is not None else response.strip()
+
+    def _stream_section(self, system_prompt: str, structure_prompt: PromptContent, max_tokens: int,
+                        cancelled: Optional[Callable[[], bool]] = None) -> str:
+        """Stream the section in, stopping as soon as the model runs past it or `cancelled()` is true."""
+        parts = []
+        stream = self.llm_client.generate_stream(
+            system_prompt=system_prompt,
+            user_prompt=structure_prompt,
+            **{**self._llm_config, "max_tokens": max_tokens}
+        )
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                if cancelled is not None and cancelled():
+                    print(f"[{self.module_name}] Section no longer needed, stopping the stream")
+                    break
+                if "#" in chunk and self._section_complete("".join(parts)):
+                    print(f"[{self.module_name}] Section complete, stopping the stream early")
+                    break
+        finally:
+            stream.close()
+        return "".join(parts)
+
+    async def _astream_section(self, system_prompt: str, structure_prompt: PromptContent, max_tokens: int,
+                               cancelled: Optional[Callable[[], bool]] = None) -> str:
+        """Async variant of _stream_section; sync clients are streamed in a worker thread."""
+        if not inspect.isasyncgenfunction(self.llm_client.generate_stream):
+            return await asyncio.to_thread(self._stream_section, system_prompt, structure_prompt, max_tokens, cancelled)
+
+        parts = []
+        stream = self.llm_client.generate_stream(
+            system_prompt=system_prompt,
+            user_prompt=structure_prompt,
+            **{**self._llm_config, "max_tokens": max_tokens}
+        )
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                if "#" in chunk and self._section_complete("".join(parts)):
+                    print(f"[{self.module_name}] Section complete, stopping the stream early")
+                    break
+        finally:
+            await stream.aclose()
+        return "".join(parts)
+
+    def _merge_structure(self, requirements: str, structure_response: str) -> str:
+        """Patch the LLM-generated structure section into the requirements document in place."""
+        body = self._extract_section_body(structure_response)
+        root = parse_sections(requirements)
+        section = root.find(STRUCTURE_TITLES)
+
+        if section is not None:
+            updated_requirements = replace_section_body(requirements, section, body)
+        else:
+            # If the section doesn't exist, add it before the first section
+            updated_requirements = insert_section(requirements, root, STRUCTURE_TITLES[0], body)
+
+        return updated_requirements.strip()
+
+    def _generate_structure_with_llm(self, language: str, architecture: str, requirements: str, template: str) -> str:
         """
+        Use LLM to update the requirements with an appropriate project structure.
+        LLM failures propagate: the node reports them as errors, so they are neither
+        recorded by incremental runs nor mistaken for a finished run.
+        """
+        system_prompt, structure_prompt, max_tokens = self._build_structure_prompts(requirements, template)
+
+        # Only the structure section is requested and streamed back
+        structure_response = self._stream_section(system_prompt, structure_prompt, max_tokens)
+        return self._merge_structure(requirements, structure_response)
+
+    async def _agenerate_structure_with_llm(self, language: str, architecture: str, requirements: str, template: str) -> str:
+        """Async variant of _generate_structure_with_llm."""
+        system_prompt, structure_prompt, max_tokens = self._build_structure_prompts(requirements, template)
+
+        structure_response = await self._astream_section(system_prompt, structure_prompt, max_tokens)
+        return self._merge_structure(requirements, structure_response)
+
+    # --- Pipelining ---
 
+    def subscribe_streams(self, hub: TokenStreamHub) -> None:
+        """Start the structure call on a prefix of the requirements while they are still generated."""
+        hub.subscribe("generated_requirements", functools.partial(self._start_pipelined_section, hub))
+
+    def _requirements_prefix(self, text: str, closed: bool) -> Optional[str]:
+        """
+        The prefix the prompt needs: complete sections worth requirements_context_tokens besides
+        the structure section, which must be complete too if it has started. None until then.
+        """
+        if closed:
+            return text
+        root = parse_sections(text)
+        headings = [section.start for section in root.walk() if section.level]
+        if not headings:
+            return None
+        # The last section may still be growing
+        complete = text[:max(headings)]
+        section = root.find(STRUCTURE_TITLES)
+        if section is not None and section.end > len(complete):
+            return None
+        context = remove_sections(complete, STRUCTURE_TITLES)
+        # A local estimate is enough to decide when to start; the prompt itself is fitted by the planner
+        return complete if estimate_tokens(context) >= self.requirements_context_tokens else None
+
+    def _start_pipelined_section(self, hub: TokenStreamHub, stream: TokenStream, state: CoreBianState):
+        """
+        Called when the requirements stream opens; the result is picked up by this module's node.
+        Cancelling the future in the hub (the framework does when the node is skipped) stops the call.
+        """
+        inputs = self._prepare_inputs(state)
+        if inputs is None:
+            return
+        template = inputs[2]
+        prefix = stream.when(self._requirements_prefix, trigger="#")
+        future = Future()
+        hub.put_result(self.module_name, future)
         try:
-            # First, get the structure from the LLM
-            structure_prompt = f"""
-            Based on the following project requirements and template, generate a new "Proposed Project Structure" 
-            section in markdown format. The structure should be based on the template but adapted to this project.
-            
-            Focus on creating a clean, well-organized structure that follows the template's organization 
-            but is tailored to this project's needs.
-            
-            Requirements (first 4000 chars):
-            {requirements[:4000]}
-            
-            Template Structure:
-            {template}
-            
-            Return ONLY the updated "Proposed Project Structure" section, including the header and code block.
-            """
-            
-            structure_response, _ = self.llm_client.generate(
-                system_prompt=system_prompt,
-                user_prompt=structure_prompt,
-                **self._llm_config
-            )
-            
-            # Extract just the structure part
-            structure_md = structure_response.strip()
-            
-            # Now update the requirements document
-            if "## Proposed Project Structure" in requirements:
-                # Split the document at the section we want to replace
-                parts = requirements.split("## Proposed Project Structure", 1)
-                before_section = parts[0]
-                after_section = parts[1].split("\n## ", 1)  # Split at next heading
-                
-                # If there's content after the section, keep it with proper heading
-                after_content = after_section[1] if len(after_section) > 1 else ""
-                if after_content:
-                    after_content = "## " + after_content
-                
-                # Rebuild the document with the new structure
-                updated_requirements = (
-                    f"{before_section}## Proposed Project Structure\n\n"
-                    f"{structure_md}\n\n"
-                    f"{after_content}"
-                )
-            else:
-                # If the section doesn't exist, add it before the first heading
-                parts = requirements.split("##", 1)
-                updated_requirements = (
-                    f"{parts[0]}\n\n## Proposed Project Structure\n\n"
-                    f"{structure_md}\n\n##{parts[1] if len(parts) > 1 else ''}"
-                )
-            
-            return updated_requirements.strip()
-            
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._run_pipelined_section, future, prefix, template),
+                name=f"{self.module_name}-pipelined", daemon=True
+            ).start()
+        else:
+            task = loop.create_task(self._arun_pipelined_section(future, prefix, template))
+            self._pipelined_tasks.add(task)
+            task.add_done_callback(self._pipelined_tasks.discard)
+            future.add_done_callback(lambda done: done.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+    @staticmethod
+    def _finish_pipelined(future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """Hand the outcome to the node, unless the future was cancelled meanwhile"""
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _run_pipelined_section(self, future: Future, prefix: Future, template: str):
+        """Wait for the prefix, then generate the section; sets (prefix, response, metrics) on `future`."""
+        try:
+            requirements = prefix.result()
+            if future.cancelled():
+                return
+            with collect_module_metrics(self.module_name) as metrics:
+                print(f"[{self.module_name}] Requirements prefix ready ({len(requirements)} chars), generating the structure ahead")
+                system_prompt, structure_prompt, max_tokens = self._build_structure_prompts(requirements, template)
+                response = self._stream_section(system_prompt, structure_prompt, max_tokens, future.cancelled)
+        except BaseException as e:
+            self._finish_pipelined(future, error=e)
+        else:
+            self._finish_pipelined(future, (requirements, response, metrics))
+
+    async def _arun_pipelined_section(self, future: Future, prefix: Future, template: str):
+        """Async variant of _run_pipelined_section, run as a task on the producer's event loop."""
+        try:
+            requirements = await asyncio.wrap_future(prefix)
+            with collect_module_metrics(self.module_name) as metrics:
+                print(f"[{self.module_name}] Requirements prefix ready ({len(requirements)} chars), generating the structure ahead")
+                system_prompt, structure_prompt, max_tokens = self._build_structure_prompts(requirements, template)
+                response = await self._astream_section(system_prompt, structure_prompt, max_tokens, future.cancelled)
+        except BaseException as e:
+            self._finish_pipelined(future, error=e)
+        else:
+            self._finish_pipelined(future, (requirements, response, metrics))
+
+    def _take_pipelined_future(self) -> Optional[Future]:
+        hub = current_hub()
+        return hub.take_result(self.module_name) if hub is not None else None
+
+    def _accept_pipelined(self, requirements: str, result: Tuple[str, str, ModuleMetrics]) -> Optional[str]:
+        """The section generated ahead, if it was generated from a prefix of the final requirements."""
+        prefix, response, metrics = result
+        node_metrics = current_module_metrics()
+        if node_metrics is not None:
+            node_metrics.merge(metrics)
+        if not requirements.startswith(prefix):
+            print(f"[{self.module_name}] Requirements differ from the streamed prefix, generating the structure again")
+            return None
+        print(f"[{self.module_name}] Using the structure section generated while the requirements streamed")
+        return response
+
+    def _pipelined_response(self, requirements: str) -> Optional[str]:
+        """Wait for the structure call started from the requirements stream, if there is one."""
+        future = self._take_pipelined_future()
+        if future is None:
+            return None
+        try:
+            result = future.result()
         except Exception as e:
-            print(f"[ERROR] Failed to generate project structure with LLM: {str(e)}")
-            return template  # Fall back to the template if LLM fails
+            print(f"[{self.module_name}] Pipelined structure call failed ({e}), generating it now")
+            return None
+        return self._accept_pipelined(requirements, result)
+
+    async def _apipelined_response(self, requirements: str) -> Optional[str]:
+        """Async variant of _pipelined_response."""
+        future = self._take_pipelined_future()
+        if future is None:
+            return None
+        try:
+            result = await asyncio.wrap_future(future)
+        except Exception as e:
+            print(f"[{self.module_name}] Pipelined structure call failed ({e}), generating it now")
+            return None
+        return self._accept_pipelined(requirements, result)
+
+    def _prepare_inputs(self, state: CoreBianState) -> Optional[Tuple[str, str, str, str]]:
+        """Resolve (language, architecture, template, requirements), or None when no template applies."""
+        # Get the target language and architecture from state
+        language = state.get("target_language", "").lower()
+        architecture = state.get("target_architecture", "multimodule").lower()
+        
+        if not language:
+            raise ValueError("Target language not detected")
 
-    def update_project_structure(self, state: CoreBianState) -> CoreBianState:
+        # Load the architecture template as a guideline
+        template = self._load_architecture_template(language, architecture)
+        if not template:
+            print(f"[{self.module_name}] No architecture template found for {language}/{architecture}, no updating project structure")
+            return None
+
+        requirements = state.get('generated_requirements', '')
+        return language, architecture, template, requirements
+
+    def _write_output(self, state: CoreBianState, updated_requirements: str) -> Dict[str, Any]:
+        """Returns the update, after writing the document when streaming output is on."""
+        update = {"updated_requirements": updated_requirements}
+        if self.streaming_output is None:
+            return update
+
+        output = self.streaming_output.open(
+            OUTPUT_FILE_NAME, output_dir=state.get("output_dir"), run_id=state.get("run_id")
+        )
+        try:
+            output.write(updated_requirements)
+        except BaseException:
+            output.abort()
+            raise
+        output.close()
+        update["module_results"] = {self.module_name: {"output_file": str(output.path)}}
+        return update
+
+    def _error_update(self, e: Exception) -> Dict[str, Any]:
+        error_msg = f"{self.module_name}: Error updating project structure: {str(e)}"
+        print(f"[ERROR] {error_msg}")
+        return {"errors": [error_msg]}
+
+    @track_module_metrics
+    def update_project_structure(self, state: CoreBianState) -> Dict[str, Any]:
         """
         Update the generated requirements with a project structure adapted by LLM.
+        Returns a partial state update with the updated requirements.
         """
         print(f"[{self.module_name}] Generating project structure...")
-        state["current_module"] = self.module_name
 
         try:
-            # Get the target language and architecture from state
-            language = state.get("target_language", "").lower()
-            architecture = state.get("target_architecture", "multimodule").lower()
-            
-            if not language:
-                raise ValueError("Target language not detected")
-
-            # Load the architecture template as a guideline
-            template = self._load_architecture_template(language, architecture)
-            if not template:
-                print(f"[{self.module_name}] No architecture template found for {language}/{architecture}, no updating project structure")
-                return state
-
-            requirements = state.get('generated_requirements', '')
-            updated_requirements = self._generate_structure_with_llm(
-                language=language,
-                architecture=architecture,
-                requirements=requirements,
-                template=template
-            )
+            inputs = self._prepare_inputs(state)
+            if inputs is None:
+                return {}
+
+            language, architecture, template, requirements = inputs
+            structure_response = self._pipelined_response(requirements)
+            if structure_response is not None:
+                updated_requirements = self._merge_structure(requirements, structure_response)
+            else:
+                updated_requirements = self._generate_structure_with_llm(
+                    language=language,
+                    architecture=architecture,
+                    requirements=requirements,
+                    template=template
+                )
                 
-            state['updated_requirements'] = updated_requirements
             print(f"[{self.module_name}] Updated requirements with LLM-generated project structure")
+            return self._write_output(state, updated_requirements)
                 
         except Exception as e:
-            error_msg = f"{self.module_name}: Error updating project structure: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            state["errors"].append(error_msg)
-            
-        return state
+            return self._error_update(e)
+
+    @track_module_metrics
+    async def aupdate_project_structure(self, state: CoreBianState) -> Dict[str, Any]:
+        """Async variant of update_project_structure used by ainvoke."""
+        print(f"[{self.module_name}] Generating project structure...")
+
+        try:
+            inputs = self._prepare_inputs(state)
+            if inputs is None:
+                return {}
+
+            language, architecture, template, requirements = inputs
+            structure_response = await self._apipelined_response(requirements)
+            if structure_response is not None:
+                updated_requirements = self._merge_structure(requirements, structure_response)
+            else:
+                updated_requirements = await self._agenerate_structure_with_llm(
+                    language=language,
+                    architecture=architecture,
+                    requirements=requirements,
+                    template=template
+                )
+
+            print(f"[{self.module_name}] Updated requirements with LLM-generated project structure")
+            return await asyncio.to_thread(self._write_output, state, updated_requirements)
+
+        except Exception as e:
+            return self._error_update(e)
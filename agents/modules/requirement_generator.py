@@ -1,25 +1,100 @@
-import json
+import asyncio
+import inspect
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 from agents.bian_core import CoreBianState
 from agents.modules.agent_module import AgentModule
+from internal.markdown_sections import PROJECT_STRUCTURE_TITLES, remove_sections, shift_headings
+from internal.openapi_index import OpenAPIIndex, load_openapi_index
+from internal.run_manifest import fingerprint_files, fingerprint_text
+from internal.metrics import submit_in_context, track_module_metrics
+from internal.streaming_output import StreamingOutput
+from internal.token_streams import open_token_stream
+from llm.async_anthropic_llm_client import agenerate
+from llm.prompt_blocks import PromptContent, text_block
+from llm.token_budget import BudgetPlanner
+
+OUTPUT_FILE_NAME = "api_requirements.md"
+
+REQUIREMENTS_SYSTEM_PROMPT = """
+        You are an expert software architect. Your task is to analyze the provided endpoint implementations
+        and OpenAPI specification to generate comprehensive requirements for the API endpoints.
+        
+        CRITICAL: You MUST preserve all endpoint names, request/response models, and error models exactly as defined in the OpenAPI specification.
+        CRITICAL: request and response models must be included into domain layer.
+        
+        For each endpoint, include:
+        1. Endpoint path and HTTP method
+        2. Required headers and parameters
+        3. Request/response models with all fields and their types
+        4. Error responses and status codes
+        5. Any business rules or validations
+        
+        Format the output in clear, well-structured markdown.
+        """
+
+SUMMARY_SYSTEM_PROMPT = """
+        You are an expert software architect. Summarize the provided endpoint implementation into a compact,
+        factual brief that another architect will use to write API requirements.
+        
+        Keep, using the exact names from the source:
+        1. Endpoint path and HTTP method (or RPC name)
+        2. Required headers and parameters
+        3. Request/response models with their fields and types
+        4. Error responses and status codes
+        5. Business rules and validations
+        
+        Omit boilerplate, imports and commentary. Use terse markdown bullet points.
+        """
+
 
 class RequirementGeneratorModule(AgentModule):
     """
     Module to generate requirements by analyzing endpoint implementations and OpenAPI specifications.
+
+    In map-reduce mode each endpoint file is first summarized on its own (up to
+    `max_parallel_summaries` LLM calls at a time), summaries are condensed in batches
+    until they fit `max_reduce_chars` (and cut on whole lines when condensing stops
+    shrinking them), and the final call sees the summaries plus at most `max_spec_tokens`
+    of the spec, so prompt size stays bounded as the endpoints folder and contract grow.
+
+    Every OpenAPI JSON in the bian directory is a contract: the endpoint context (files or
+    summaries) is loaded once and each contract gets its own document, generated up to
+    `max_parallel_contracts` at a time. Several contracts are also merged into an index.
     """
 
-    def __init__(self, file_reader, llm_client):
+    def __init__(self, file_reader, llm_client, map_reduce: bool = False,
+                 max_parallel_summaries: int = 4, max_reduce_chars: int = 60000,
+                 streaming_output: Optional[StreamingOutput] = None, max_parallel_contracts: int = 4,
+                 budget_planner: Optional[BudgetPlanner] = None, max_spec_tokens: int = 40000):
         self.file_reader = file_reader
         self.llm_client = llm_client
+        self.budget_planner = budget_planner or BudgetPlanner.for_client(llm_client)
         self._module_name = "requirement_generator"
         self._dependencies = ["framework_detector"]
+        # max_tokens is a cap: each document asks for an output sized from its contract (see
+        # _expected_document_tokens), within what the model's limits leave after its prompt
         self._llm_config = {
             "max_tokens": 64000,
             "temperature": 0.0
         }
+        self._min_document_tokens = 4096
+        self._document_tokens_per_operation = 2000
+        self._summary_llm_config = {
+            "max_tokens": 4000,
+            "temperature": 0.0
+        }
+        self.map_reduce = map_reduce
+        self.max_parallel_summaries = max(1, max_parallel_summaries)
+        self.max_reduce_chars = max_reduce_chars
+        self.max_spec_tokens = max_spec_tokens
+        self.max_parallel_contracts = max(1, max_parallel_contracts)
+        # When set, the requirements are streamed to {output_dir}/api_requirements*.md as they are generated
+        self.streaming_output = streaming_output
 
     @property
     def module_name(self) -> str:
@@ -29,118 +104,534 @@ class RequirementGeneratorModule(AgentModule):
     def dependencies(self) -> List[str]:
         return self._dependencies
 
+    @property
+    def output_keys(self) -> List[str]:
+        return ["generated_requirements", "contract_requirements"]
+
+    def input_fingerprint(self, state: CoreBianState) -> Optional[Dict[str, str]]:
+        """Fingerprint endpoint files, BIAN specs, detected stack, prompts and generation mode."""
+        bian_dir = Path(state["bian_dir"])
+        settings = (
+            f"{getattr(self.llm_client, 'model', '')}:{sorted(self._llm_config.items())}:"
+            f"{self.map_reduce}:{self.max_reduce_chars}:{self.max_spec_tokens}"
+        )
+        return {
+            "endpoint_files": fingerprint_files(self._list_endpoint_files(state)),
+            "bian_spec": fingerprint_files(bian_dir.glob("*.json")),
+            "target": fingerprint_text(f"{state.get('target_language')}:{state.get('target_framework')}"),
+            "prompts": fingerprint_text(REQUIREMENTS_SYSTEM_PROMPT + SUMMARY_SYSTEM_PROMPT),
+            "llm": fingerprint_text(settings),
+        }
+
     def add_nodes_to_graph(self, graph: StateGraph) -> Tuple[str, str]:
-        """Adds this module's node to the main graph."""
+        """Adds this module's node to the main graph (sync for invoke, async for ainvoke)."""
         node_name = f"{self.module_name}_node"
-        graph.add_node(node_name, self.generate_requirements)
+        graph.add_node(
+            node_name,
+            RunnableLambda(self.generate_requirements, afunc=self.agenerate_requirements)
+        )
         return (node_name, node_name)
 
-    def _load_json_file(self, file_path: str) -> Dict[str, Any]:
-        """Load and parse a JSON file."""
-        try:
-            content = self.file_reader.read_file(file_path)
-            return json.loads(content)
-        except Exception as e:
-            raise Exception(f"Failed to parse JSON file {file_path}: {str(e)}")
-
-    def _read_endpoints_directory(self) -> str:
-        """Read and merge all files from the endpoints directory."""
-        endpoints_dir = Path("tmp/endpoints")
+    def _list_endpoint_files(self, state: CoreBianState) -> List[Path]:
+        """List the files in the run's endpoints directory in a stable order."""
+        endpoints_dir = Path(state["endpoints_dir"])
         if not endpoints_dir.exists() or not endpoints_dir.is_dir():
             raise FileNotFoundError(f"Endpoints directory not found at: {endpoints_dir}")
 
-        merged_content = []
-        for file_path in sorted(endpoints_dir.glob("*")):
-            if file_path.is_file():
-                try:
-                    content = self.file_reader.read_file(str(file_path))
-                    merged_content.append(f"\n{'='*80}\nFile: {file_path.name}\n{'='*80}\n{content}")
-                except Exception as e:
-                    print(f"Warning: Could not read {file_path}: {str(e)}")
-
-        if not merged_content:
+        files = [file_path for file_path in sorted(endpoints_dir.glob("*")) if file_path.is_file()]
+        if not files:
             raise FileNotFoundError(f"No files found in {endpoints_dir}")
 
+        return files
+
+    def _read_endpoint_files(self, state: CoreBianState) -> List[Tuple[str, str]]:
+        """Read every endpoint file as (file_name, content), skipping unreadable ones."""
+        file_paths = self._list_endpoint_files(state)
+        # The reader loads the files concurrently and returns "" for unreadable ones
+        contents = self.file_reader.read_many(file_paths)
+        endpoint_files = []
+        for file_path, content in zip(file_paths, contents):
+            if content:
+                endpoint_files.append((file_path.name, content))
+            else:
+                print(f"Warning: Could not read {file_path}")
+
+        if not endpoint_files:
+            raise FileNotFoundError("No readable endpoint files found")
+
+        return endpoint_files
+
+    def _read_endpoints_directory(self, state: CoreBianState) -> str:
+        """Read and merge all files from the endpoints directory."""
+        merged_content = [
+            f"\n{'='*80}\nFile: {file_name}\n{'='*80}\n{content}"
+            for file_name, content in self._read_endpoint_files(state)
+        ]
         return "\n".join(merged_content)
 
-    def _load_openapi_spec(self, state: CoreBianState) -> Dict[str, Any]:
-        """Load the OpenAPI specification from the bian directory."""
+    def _load_openapi_specs(self, state: CoreBianState) -> List[Tuple[str, OpenAPIIndex]]:
+        """Load and index every OpenAPI specification in the bian directory as (contract_name, index)."""
         bian_dir = Path(state["bian_dir"])
         if not bian_dir.exists() or not bian_dir.is_dir():
             raise FileNotFoundError(f"BIAN directory not found at: {bian_dir}")
 
-        json_files = list(bian_dir.glob("*.json"))
+        json_files = sorted(bian_dir.glob("*.json"))
         if not json_files:
             raise FileNotFoundError(f"No JSON files found in {bian_dir}")
 
-        # Assuming there's only one JSON file as per requirements
-        return self._load_json_file(str(json_files[0]))
+        contracts = []
+        for file_path, content in zip(json_files, self.file_reader.read_many(json_files)):
+            try:
+                # Indexes are cached by content hash
+                contracts.append((file_path.stem, load_openapi_index(content)))
+            except Exception as e:
+                raise Exception(f"Failed to parse JSON file {file_path}: {str(e)}")
+        return contracts
+
+    def _build_prompts(self, state: CoreBianState, endpoints_content: str,
+                       openapi_spec: OpenAPIIndex) -> Tuple[str, PromptContent]:
+        """Builds the (system, user) prompts for one contract from the shared endpoint files."""
+        # Get target language and framework from state
+        target_language = state.get("target_language", "Java")
+        target_framework = state.get("target_framework", "Spring Boot")
+
+        # Static parts first so they form a cacheable prompt prefix: the endpoints are shared by
+        # every contract of the message, then the contract's spec; the per-run target stack goes last
+        user_prompt = [
+            text_block(f"""
+        Here are the endpoint implementations:
+        {endpoints_content}
+        """, cache=True),
+            text_block(f"""
+        Here is the OpenAPI specification that must be strictly followed:
+        {openapi_spec.compact_spec()}
+        """, cache=True),
+            text_block(f"""
+        I need to generate requirements for a {target_framework} application in {target_language}.
+        
+        Please generate comprehensive requirements for this API, ensuring all endpoints, models, and error handling from the OpenAPI spec are preserved.
+        """),
+        ]
+
+        return REQUIREMENTS_SYSTEM_PROMPT, user_prompt
 
-    def generate_requirements(self, state: CoreBianState) -> CoreBianState:
+    # --- Map-reduce mode ---
+
+    def _build_summary_prompt(self, file_name: str, content: str) -> str:
+        """Map step: summarize a single endpoint file (whole lines up to the input budget)."""
+        content = self.budget_planner.fit_text(
+            content, self.budget_planner.input_budget(self._summary_llm_config["max_tokens"])
+        )
+        return f"""
+        Summarize the endpoint implementation below.
+        
+        ========== FILE: {file_name} ==========
+        {content}
         """
-        Generate requirements by analyzing endpoint implementations and OpenAPI spec.
+
+    def _build_condense_prompt(self, summaries: List[str]) -> str:
+        """Intermediate reduce step: merge a batch of summaries into one shorter brief."""
+        joined = "\n\n".join(summaries)
+        return f"""
+        Merge the endpoint summaries below into a single brief. Keep every endpoint, model, field,
+        header and error exactly as named; drop duplicated information.
+        
+        {joined}
         """
-        print(f"[{self.module_name}] Generating requirements...")
-        state["current_module"] = self.module_name
 
+    def _build_reduce_prompt(self, state: CoreBianState, summaries: List[str], openapi_spec: OpenAPIIndex) -> PromptContent:
+        """Final reduce step: write the requirements from the summaries and the spec."""
+        target_language = state.get("target_language", "Java")
+        target_framework = state.get("target_framework", "Spring Boot")
+        joined = "\n\n".join(summaries)
+
+        # Summaries are shared by every contract of the message: keep them first in the cached prefix
+        return [
+            text_block(f"""
+        Here are summaries of the endpoint implementations:
+        {joined}
+        """, cache=True),
+            text_block(f"""
+        Here is the OpenAPI specification that must be strictly followed:
+        {openapi_spec.compact_spec_within(self.max_spec_tokens, self.budget_planner.count)}
+        """, cache=True),
+            text_block(f"""
+        I need to generate requirements for a {target_framework} application in {target_language}.
+        
+        Please generate comprehensive requirements for this API, ensuring all endpoints, models, and error handling from the OpenAPI spec are preserved.
+        """),
+        ]
+
+    def _batch_summaries(self, summaries: List[str]) -> List[List[str]]:
+        """
+        Group summaries into batches whose combined size stays under max_reduce_chars.
+        Every batch holds at least two summaries (unless there is only one) so each
+        condensing round shrinks the list.
+        """
+        batches, current, size = [], [], 0
+        for summary in summaries:
+            if len(current) >= 2 and size + len(summary) > self.max_reduce_chars:
+                batches.append(current)
+                current, size = [], 0
+            current.append(summary)
+            size += len(summary)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _needs_condensing(self, summaries: List[str], previous_size: Optional[int] = None) -> bool:
+        """Condense while the summaries are over max_reduce_chars and the last round made them smaller."""
+        size = sum(len(summary) for summary in summaries)
+        return size > self.max_reduce_chars and (previous_size is None or size < previous_size)
+
+    def _truncate_summaries(self, summaries: List[str]) -> List[str]:
+        """Last resort when condensing cannot reach max_reduce_chars: cut each summary to its share on whole lines."""
+        if sum(len(summary) for summary in summaries) <= self.max_reduce_chars:
+            return summaries
+        share = max(1, self.max_reduce_chars // len(summaries))
+        print(f"[{self.module_name}] Summaries still over {self.max_reduce_chars} chars, truncating...")
+        truncated = []
+        for summary in summaries:
+            if len(summary) > share:
+                cut = summary.rfind("\n", 0, share)
+                summary = summary[:cut if cut > 0 else share].rstrip()
+            truncated.append(summary)
+        return truncated
+
+    def _summarize_endpoints(self, state: CoreBianState) -> List[str]:
+        """Map and condense steps: bounded per-call prompts, running map calls in a thread pool."""
+        endpoint_files = self._read_endpoint_files(state)
+
+        def summarize(user_prompt: str) -> str:
+            response, _ = self.llm_client.generate(
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                **self._summary_llm_config
+            )
+            return response.strip()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_summaries) as executor:
+            print(f"[{self.module_name}] Summarizing {len(endpoint_files)} endpoint file(s)...")
+            prompts = [self._build_summary_prompt(name, content) for name, content in endpoint_files]
+            futures = [submit_in_context(executor, summarize, prompt) for prompt in prompts]
+            summaries = [
+                f"### {name}\n{future.result()}"
+                for (name, _), future in zip(endpoint_files, futures)
+            ]
+
+            previous_size = None
+            while self._needs_condensing(summaries, previous_size):
+                previous_size = sum(len(summary) for summary in summaries)
+                batches = self._batch_summaries(summaries)
+                print(f"[{self.module_name}] Condensing {len(summaries)} summaries into {len(batches)}...")
+                futures = [
+                    submit_in_context(executor, summarize, self._build_condense_prompt(batch))
+                    for batch in batches
+                ]
+                summaries = [future.result() for future in futures]
+
+        return self._truncate_summaries(summaries)
+
+    async def _asummarize_endpoints(self, state: CoreBianState) -> List[str]:
+        """Async variant of _summarize_endpoints bounded by a semaphore."""
+        endpoint_files = self._read_endpoint_files(state)
+        semaphore = asyncio.Semaphore(self.max_parallel_summaries)
+
+        async def summarize(user_prompt: str) -> str:
+            async with semaphore:
+                response, _ = await agenerate(
+                    self.llm_client,
+                    system_prompt=SUMMARY_SYSTEM_PROMPT,
+                    user_prompt=user_prompt,
+                    **self._summary_llm_config
+                )
+            return response.strip()
+
+        print(f"[{self.module_name}] Summarizing {len(endpoint_files)} endpoint file(s)...")
+        results = await asyncio.gather(
+            *[summarize(self._build_summary_prompt(name, content)) for name, content in endpoint_files]
+        )
+        summaries = [f"### {name}\n{summary}" for (name, _), summary in zip(endpoint_files, results)]
+
+        previous_size = None
+        while self._needs_condensing(summaries, previous_size):
+            previous_size = sum(len(summary) for summary in summaries)
+            batches = self._batch_summaries(summaries)
+            print(f"[{self.module_name}] Condensing {len(summaries)} summaries into {len(batches)}...")
+            summaries = list(await asyncio.gather(
+                *[summarize(self._build_condense_prompt(batch)) for batch in batches]
+            ))
+
+        return self._truncate_summaries(summaries)
+
+    # --- Contracts ---
+
+    def _contract_prompts(self, state: CoreBianState, shared_context: Any,
+                          openapi_spec: OpenAPIIndex) -> Tuple[str, PromptContent]:
+        """Prompts for one contract; shared_context is the endpoint summaries or the merged endpoint files."""
+        if self.map_reduce:
+            return REQUIREMENTS_SYSTEM_PROMPT, self._build_reduce_prompt(state, shared_context, openapi_spec)
+        return self._build_prompts(state, shared_context, openapi_spec)
+
+    @staticmethod
+    def _output_file_names(contracts: List[Tuple[str, OpenAPIIndex]]) -> Dict[str, str]:
+        """A single contract keeps api_requirements.md; with several, that name goes to the merged index."""
+        if len(contracts) == 1:
+            return {contracts[0][0]: OUTPUT_FILE_NAME}
+        return {name: f"api_requirements_{name}.md" for name, _ in contracts}
+
+    @staticmethod
+    def _stream_name(contracts: List[Tuple[str, OpenAPIIndex]]) -> Optional[str]:
+        """
+        A single contract's document is generated_requirements as it streams in, so it is published
+        for pipelined modules; with several, generated_requirements is the index built at the end.
+        """
+        return "generated_requirements" if len(contracts) == 1 else None
+
+    def _generate_contracts(self, state: CoreBianState) -> Tuple[List[Tuple[str, OpenAPIIndex]], Dict[str, str]]:
+        """Generate one requirements document per contract, in parallel, from shared endpoint context."""
+        contracts = self._load_openapi_specs(state)
+        print(f"[{self.module_name}] Loading endpoint context shared by {len(contracts)} contract(s)...")
+        shared_context = self._summarize_endpoints(state) if self.map_reduce else self._read_endpoints_directory(state)
+        file_names = self._output_file_names(contracts)
+        stream_name = self._stream_name(contracts)
+
+        def generate(name: str, openapi_spec: OpenAPIIndex) -> str:
+            system_prompt, user_prompt = self._contract_prompts(state, shared_context, openapi_spec)
+            print(f"[{self.module_name}] Generating requirements for {name} with LLM...")
+            return self._generate_document(
+                state, openapi_spec, system_prompt, user_prompt, file_names[name], stream_name
+            )
+
+        if len(contracts) == 1:
+            name, openapi_spec = contracts[0]
+            return contracts, {name: generate(name, openapi_spec)}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_contracts, len(contracts))) as executor:
+            futures = [(name, submit_in_context(executor, generate, name, spec)) for name, spec in contracts]
+            return contracts, {name: future.result() for name, future in futures}
+
+    async def _agenerate_contracts(self, state: CoreBianState) -> Tuple[List[Tuple[str, OpenAPIIndex]], Dict[str, str]]:
+        """Async variant of _generate_contracts bounded by a semaphore."""
+        contracts = self._load_openapi_specs(state)
+        print(f"[{self.module_name}] Loading endpoint context shared by {len(contracts)} contract(s)...")
+        shared_context = (
+            await self._asummarize_endpoints(state) if self.map_reduce else self._read_endpoints_directory(state)
+        )
+        file_names = self._output_file_names(contracts)
+        stream_name = self._stream_name(contracts)
+        semaphore = asyncio.Semaphore(self.max_parallel_contracts)
+
+        async def generate(name: str, openapi_spec: OpenAPIIndex) -> str:
+            system_prompt, user_prompt = self._contract_prompts(state, shared_context, openapi_spec)
+            async with semaphore:
+                print(f"[{self.module_name}] Generating requirements for {name} with LLM...")
+                return await self._agenerate_document(
+                    state, openapi_spec, system_prompt, user_prompt, file_names[name], stream_name
+                )
+
+        documents = await asyncio.gather(*[generate(name, spec) for name, spec in contracts])
+        return contracts, {name: document for (name, _), document in zip(contracts, documents)}
+
+    def _merge_contracts(self, contracts: List[Tuple[str, OpenAPIIndex]], documents: Dict[str, str]) -> str:
+        """
+        The merged index: a table of the contracts followed by each document under its own heading.
+        Per-contract project structure sections are dropped; the service gets a single one later.
+        """
+        file_names = self._output_file_names(contracts)
+        lines = [
+            "# Requirements Index",
+            "",
+            "| Contract | Operations | Document |",
+            "|---|---|---|",
+        ]
+        for name, openapi_spec in contracts:
+            lines.append(f"| {name} | {len(openapi_spec.operation_keys())} | {file_names[name]} |")
+
+        parts = ["\n".join(lines)]
+        for name, _ in contracts:
+            body = remove_sections(documents[name], PROJECT_STRUCTURE_TITLES)
+            parts.append(f"## Contract: {name}\n\n{shift_headings(body, 2).strip()}")
+        return "\n\n".join(parts) + "\n"
+
+    def _expected_document_tokens(self, openapi_spec: OpenAPIIndex) -> int:
+        """
+        Output budget for one contract's document: the requirements restate the spec's models
+        and endpoints (2x headroom) plus a fixed allowance per operation, capped by max_tokens.
+        """
+        estimate = (
+            2 * self.budget_planner.count(openapi_spec.compact_spec())
+            + self._document_tokens_per_operation * len(openapi_spec.operation_keys())
+        )
+        return min(self._llm_config["max_tokens"], max(self._min_document_tokens, estimate))
+
+    def _document_llm_config(self, openapi_spec: OpenAPIIndex, system_prompt: str,
+                             user_prompt: PromptContent) -> Dict[str, Any]:
+        """LLM settings for a document call, with max_tokens sized from the contract and the context window."""
         try:
-            # 1. Read and merge all endpoint files
-            print(f"[{self.module_name}] Reading endpoint files...")
-            endpoints_content = self._read_endpoints_directory()
-            
-            # 2. Load OpenAPI specification
-            print(f"[{self.module_name}] Loading OpenAPI specification...")
-            openapi_spec = self._load_openapi_spec(state)
-            
-            # 3. Get target language and framework from state
-            target_language = state.get("target_language", "Java")
-            target_framework = state.get("target_framework", "Spring Boot")
-
-            # 4. Prepare the prompt for the LLM
-            system_prompt = """
-            You are an expert software architect. Your task is to analyze the provided endpoint implementations
-            and OpenAPI specification to generate comprehensive requirements for the API endpoints.
-            
-            CRITICAL: You MUST preserve all endpoint names, request/response models, and error models exactly as defined in the OpenAPI specification.
-            CRITICAL: request and response models must be included into domain layer.
-            
-            For each endpoint, include:
-            1. Endpoint path and HTTP method
-            2. Required headers and parameters
-            3. Request/response models with all fields and their types
-            4. Error responses and status codes
-            5. Any business rules or validations
-            
-            Format the output in clear, well-structured markdown.
-            """
-
-            user_prompt = f"""
-            I need to generate requirements for a {target_framework} application in {target_language}.
-            
-            Here are the endpoint implementations:
-            {endpoints_content}
-            
-            And here is the OpenAPI specification that must be strictly followed:
-            {json.dumps(openapi_spec, indent=2)}
-            
-            Please generate comprehensive requirements for this API, ensuring all endpoints, models, and error handling from the OpenAPI spec are preserved.
-            """
-
-            # 5. Call the LLM
-            print(f"[{self.module_name}] Generating requirements with LLM...")
+            max_tokens = self.budget_planner.max_tokens(
+                system_prompt, user_prompt, self._expected_document_tokens(openapi_spec),
+                minimum=self._min_document_tokens
+            )
+        except ValueError as e:
+            hint = "" if self.map_reduce else " (set REQUIREMENTS_MAP_REDUCE=true to summarize endpoint files)"
+            raise ValueError(f"{e}{hint}") from e
+        return {**self._llm_config, "max_tokens": max_tokens}
+
+    def _open_output(self, state: CoreBianState, file_name: str):
+        return self.streaming_output.open(
+            file_name, output_dir=state.get("output_dir"), run_id=state.get("run_id")
+        )
+
+    def _generate_document(self, state: CoreBianState, openapi_spec: OpenAPIIndex, system_prompt: str,
+                           user_prompt: PromptContent, file_name: str = OUTPUT_FILE_NAME,
+                           stream_name: Optional[str] = None) -> str:
+        """
+        The final requirements call; streamed to the output file when streaming output is on,
+        and to the `stream_name` token stream when a pipelined module subscribed to it.
+        """
+        llm_config = self._document_llm_config(openapi_spec, system_prompt, user_prompt)
+        output = self._open_output(state, file_name) if self.streaming_output is not None else None
+        token_stream = open_token_stream(stream_name, state) if stream_name else None
+        if output is None and token_stream is None:
             requirements, _ = self.llm_client.generate(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                **self._llm_config
+                **llm_config
+            )
+            return requirements
+
+        parts = []
+        try:
+            for chunk in self.llm_client.generate_stream(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                **llm_config
+            ):
+                self._write_chunk(output, token_stream, parts, chunk)
+        except BaseException as e:
+            self._abort_document(output, token_stream, e)
+            raise
+        return self._close_document(output, token_stream, parts)
+
+    async def _agenerate_document(self, state: CoreBianState, openapi_spec: OpenAPIIndex, system_prompt: str,
+                                  user_prompt: PromptContent, file_name: str = OUTPUT_FILE_NAME,
+                                  stream_name: Optional[str] = None) -> str:
+        """Async variant of _generate_document; sync clients stream in a worker thread."""
+        llm_config = self._document_llm_config(openapi_spec, system_prompt, user_prompt)
+        if not inspect.isasyncgenfunction(self.llm_client.generate_stream):
+            if self.streaming_output is not None or stream_name:
+                return await asyncio.to_thread(
+                    self._generate_document, state, openapi_spec, system_prompt, user_prompt, file_name, stream_name
+                )
+
+        output = self._open_output(state, file_name) if self.streaming_output is not None else None
+        token_stream = open_token_stream(stream_name, state) if stream_name else None
+        if output is None and token_stream is None:
+            requirements, _ = await agenerate(
+                self.llm_client,
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                **llm_config
             )
+            return requirements
+
+        parts = []
+        try:
+            async for chunk in self.llm_client.generate_stream(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                **llm_config
+            ):
+                # Chunks are small; a buffered file write does not stall the loop
+                self._write_chunk(output, token_stream, parts, chunk)
+        except BaseException as e:
+            self._abort_document(output, token_stream, e)
+            raise
+        return await asyncio.to_thread(self._close_document, output, token_stream, parts)
+
+    @staticmethod
+    def _write_chunk(output, token_stream, parts: List[str], chunk: str):
+        if output is not None:
+            output.write(chunk)
+        else:
+            parts.append(chunk)
+        if token_stream is not None:
+            token_stream.write(chunk)
+
+    @staticmethod
+    def _abort_document(output, token_stream, error: BaseException):
+        if output is not None:
+            output.abort()
+        if token_stream is not None:
+            token_stream.abort(error)
+
+    @staticmethod
+    def _close_document(output, token_stream, parts: List[str]) -> str:
+        """The whole document; the output file is closed first so subscribers see it on disk"""
+        document = output.close() if output is not None else "".join(parts)
+        if token_stream is not None:
+            token_stream.close()
+        return document
+
+    def _requirements_update(self, state: CoreBianState, contracts: List[Tuple[str, OpenAPIIndex]],
+                             documents: Dict[str, str]) -> Dict[str, Any]:
+        """generated_requirements is the single document, or the merged index for several contracts."""
+        if len(contracts) == 1:
+            requirements = documents[contracts[0][0]]
+        else:
+            requirements = self._merge_contracts(contracts, documents)
+            if self.streaming_output is not None:
+                output = self._open_output(state, OUTPUT_FILE_NAME)
+                output.write(requirements)
+                output.close()
+
+        results = {"contracts": [name for name, _ in contracts]}
+        if self.streaming_output is not None:
+            # Tells the caller the documents are already on disk
+            output_path = Path(state.get("output_dir") or self.streaming_output.output_dir) / OUTPUT_FILE_NAME
+            results["output_file"] = str(output_path)
+
+        return {
+            "generated_requirements": requirements,
+            "contract_requirements": documents,
+            "module_results": {self.module_name: results},
+        }
 
-            # 6. Save the requirements to the state
-            state["generated_requirements"] = requirements
-            print(f"[{self.module_name}] Successfully generated requirements")
+    def _error_update(self, e: Exception) -> Dict[str, Any]:
+        error_msg = f"{self.module_name}: Error generating requirements: {str(e)}"
+        print(f"[ERROR] {error_msg}")
+        return {"errors": [error_msg]}
+
+    @track_module_metrics
+    def generate_requirements(self, state: CoreBianState) -> Dict[str, Any]:
+        """
+        Generate requirements by analyzing endpoint implementations and every OpenAPI spec of the contract.
+        Returns a partial state update with the generated requirements.
+        """
+        print(f"[{self.module_name}] Generating requirements...")
+
+        try:
+            contracts, documents = self._generate_contracts(state)
+
+            # Hand the requirements back to the graph
+            print(f"[{self.module_name}] Successfully generated requirements for {len(contracts)} contract(s)")
+            return self._requirements_update(state, contracts, documents)
 
         except Exception as e:
-            error_msg = f"{self.module_name}: Error generating requirements: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            state["errors"].append(error_msg)
+            return self._error_update(e)
 
-        return state
+    @track_module_metrics
+    async def agenerate_requirements(self, state: CoreBianState) -> Dict[str, Any]:
+        """Async variant of generate_requirements used by ainvoke."""
+        print(f"[{self.module_name}] Generating requirements...")
+
+        try:
+            contracts, documents = await self._agenerate_contracts(state)
+
+            print(f"[{self.module_name}] Successfully generated requirements for {len(contracts)} contract(s)")
+            # The merged index may be written to disk
+            return await asyncio.to_thread(self._requirements_update, state, contracts, documents)
+
+        except Exception as e:
+            return self._error_update(e)
@@ -0,0 +1,114 @@
+"""
+Offline backfill: regenerate requirements for many contracts through the Message Batches API.
+
+    python batch_main.py contracts.jsonl [--poll-interval 30] [--max-rounds 6] [--fake]
+
+Each line of the input file is a queue message ({"bianContract": ..., "output": ...}).
+Every round runs the pipeline of each contract, collects the LLM calls it could not answer
+yet into one message batch, and waits for it; results feed the next round. Documents are
+saved to each contract's output folder once its pipeline completes without pending calls;
+contracts still waiting on a batch when the rounds run out are reported as incomplete.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+from agents.agent_setup import setup_agent_framework
+from llm.batch_client import BatchCollectingLLMClient, FakeMessageBatches, MessageBatchRunner
+from llm.response_cache import LLMResponseCache
+from main import build_initial_state, save_contract_requirements, save_requirements
+
+
+def load_messages(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_batch(messages: list, batches_api, poll_interval: float = 30.0, max_rounds: int = 6) -> tuple:
+    """
+    Run every contract's pipeline in batch rounds.
+
+    Returns:
+        tuple: (index of the message -> final state,
+                indexes of the messages whose pipelines still had pending calls in the last round)
+    """
+    client = BatchCollectingLLMClient(
+        prompt_caching=os.getenv("LLM_PROMPT_CACHING", "true").lower() not in ("0", "false", "no"),
+        cache=LLMResponseCache.from_env()
+    )
+    # Intermediate rounds fail on purpose: keep them out of the manifest and checkpoints
+    # Batched calls only complete between rounds: there is no token stream to start early on
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False, pipelined=False)
+    runner = MessageBatchRunner(batches_api, poll_interval=poll_interval)
+
+    final_states = {}
+    incomplete = set()
+    for round_number in range(1, max_rounds + 1):
+        print(f"\n[batch] Round {round_number}: running {len(messages)} pipeline(s)")
+        incomplete = set()
+        for index, message in enumerate(messages):
+            client.begin_run()
+            final_states[index] = framework.start_analysis(build_initial_state(message, output_dir=message['output']))
+            if client.run_pending:
+                incomplete.add(index)
+
+        pending = client.take_pending()
+        if not pending:
+            print(f"[batch] All pipelines complete after {round_number} round(s)")
+            return final_states, incomplete
+
+        started = time.perf_counter()
+        client.add_results(runner.run(pending))
+        print(f"[batch] Round {round_number}: {len(pending)} request(s) answered in "
+              f"{time.perf_counter() - started:.1f}s")
+
+    print(f"[!] Stopped after {max_rounds} rounds with requests still pending")
+    return final_states, incomplete
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate requirements for many contracts with message batches")
+    parser.add_argument("contracts", help="JSONL file with one {\"bianContract\", \"output\"} message per line")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status polls")
+    parser.add_argument("--max-rounds", type=int, default=6, help="Upper bound on batch rounds")
+    parser.add_argument("--fake", action="store_true",
+                        help="Answer batches with a local fake endpoint instead of the API (dry run)")
+    args = parser.parse_args()
+
+    messages = load_messages(args.contracts)
+    if args.fake:
+        batches_api = FakeMessageBatches()
+    else:
+        import anthropic
+        batches_api = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY')).messages.batches
+
+    final_states, incomplete = run_batch(
+        messages, batches_api, poll_interval=args.poll_interval, max_rounds=args.max_rounds
+    )
+
+    for index, message in enumerate(messages):
+        final_state = final_states[index]
+        if index in incomplete:
+            # Its last round still waited on batched calls: the outputs are not final
+            print(f"\n⏳ {message['bianContract']}: incomplete, requests still pending (raise --max-rounds)")
+            continue
+        if final_state.get('errors'):
+            print(f"\n❌ {message['bianContract']}:")
+            for error in final_state['errors']:
+                print(f"- {error}")
+            continue
+        if 'updated_requirements' in final_state:
+            save_requirements(final_state['updated_requirements'], output_dir=message['output'],
+                              file_name="updated_requirements.md")
+            save_requirements(final_state['generated_requirements'], output_dir=message['output'],
+                              file_name="api_requirements.md")
+            save_contract_requirements(final_state.get('contract_requirements'), output_dir=message['output'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Offline benchmarks of the pipeline against a latency-modelled fake LLM client (no API calls)."""
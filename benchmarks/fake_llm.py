@@ -0,0 +1,146 @@
+"""
+Latency-modelled stand-in for AnthropicLLMClient.
+
+FakeAnthropicLLMClient only replaces the network call (`_create_stream`): responses come back
+as Messages API stream events paced by a time-to-first-token and a tokens-per-second rate,
+so the real client code (response cache, rate limiter, usage and timing metrics) still runs.
+Responses are replayed from a recorded response cache when the exact prompt was recorded,
+and otherwise from canned answers picked by the kind of call.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from llm.anthropic_llm_client import AnthropicLLMClient
+from llm.prompt_blocks import PromptContent, to_text
+from llm.rate_limiter import RateLimiter
+from llm.response_cache import LLMResponseCache
+from llm.token_budget import estimate_tokens
+
+CANNED_RESPONSES = {
+    "framework": "Language: Java\nFramework: Spring Boot",
+    "summary": (
+        "- GET /servicios/{id}: returns the service by id (200 ServicioResponse, 404 ErrorResponse)\n"
+        "- Headers: x-request-id (required), x-channel\n"
+        "- Models: ServicioResponse {id, nombre, categoria}, ErrorResponse {code, message}\n"
+    ),
+    "structure": (
+        "The service follows a multimodule layout.\n\n"
+        "```\nservice/\n  application/\n  domain/\n  infrastructure/\n  boot/\n```\n"
+    ),
+}
+
+# Repeated per endpoint section of the canned requirements document
+REQUIREMENTS_SECTION = """
+### {method} /{path}
+
+- Headers: x-request-id (required), x-channel
+- Parameters: id (path, required), page (query), size (query)
+- Response 200: {model} with id, name, category, status and audit fields
+- Errors: 400 ValidationError, 404 NotFoundError, 500 InternalError
+- Validation: id must be a positive integer; page and size default to 0 and 20
+"""
+
+
+def canned_requirements(sections: int = 20) -> str:
+    """A requirements document shaped like the real ones (endpoint sections, a structure section)"""
+    endpoints = "".join(
+        REQUIREMENTS_SECTION.format(method="GET" if i % 2 else "POST", path=f"resource{i}", model=f"Resource{i}Response")
+        for i in range(sections)
+    )
+    return (
+        "# API Requirements\n\n## Overview\n\nRequirements generated for the service endpoints.\n\n"
+        f"## Endpoints\n{endpoints}\n"
+        f"## Proposed Project Structure\n\n{CANNED_RESPONSES['structure']}\n"
+        "## Error Handling\n\nErrors follow the ErrorResponse model of the specification.\n"
+    )
+
+
+class _Event:
+    """Attribute access over keyword fields, mimicking the SDK's stream events"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeAnthropicLLMClient(AnthropicLLMClient):
+    """AnthropicLLMClient whose API calls are simulated locally"""
+
+    def __init__(self, model: str = "claude-sonnet-4-20250514", time_to_first_token: float = 0.05,
+                 tokens_per_second: float = 2000.0, recordings: Optional[LLMResponseCache] = None,
+                 responses: Optional[Dict[str, str]] = None, requirements_sections: int = 20,
+                 cache: Optional[LLMResponseCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 chunk_tokens: int = 8):
+        super().__init__(api_key="benchmark", model=model, cache=cache, prompt_caching=True, rate_limiter=rate_limiter)
+        self.time_to_first_token = time_to_first_token
+        self.tokens_per_second = tokens_per_second
+        # Response cache recorded from real runs (LLM_CACHE_PATH); exact prompts are replayed from it
+        self.recordings = recordings
+        self.responses = {**CANNED_RESPONSES, "requirements": canned_requirements(requirements_sections)}
+        self.responses.update(responses or {})
+        self.chunk_tokens = chunk_tokens
+
+    @staticmethod
+    def load_responses(path: str) -> Dict[str, str]:
+        """Canned responses from a JSON object keyed by call kind (framework, summary, structure, requirements)"""
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def call_kind(system_prompt: PromptContent) -> str:
+        system = to_text(system_prompt)
+        if "Language: <language>" in system:
+            return "framework"
+        if "Summarize the provided endpoint" in system:
+            return "summary"
+        if "Proposed Project Structure" in system:
+            return "structure"
+        return "requirements"
+
+    def _response_for(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                      max_tokens: int, temperature: float) -> str:
+        if self.recordings is not None:
+            recorded = self.recordings.get(self._cache_key(system_prompt, user_prompt, max_tokens, temperature))
+            if recorded is not None:
+                return recorded[0]
+        return self.responses[self.call_kind(system_prompt)]
+
+    def _create_stream(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                       max_tokens: int, temperature: float, usage_info: Dict[str, Any]):
+        response = self._response_for(system_prompt, user_prompt, max_tokens, temperature)
+        input_tokens = estimate_tokens(to_text(system_prompt)) + estimate_tokens(to_text(user_prompt))
+
+        if self.rate_limiter is None:
+            return self._events(response, input_tokens)
+        estimated_tokens = input_tokens
+        usage_info['estimated_input_tokens'] = estimated_tokens
+        usage_info['reserved_output_tokens'] = max_tokens
+        return self.rate_limiter.call(
+            lambda: self._events(response, input_tokens), estimated_tokens,
+            priority=estimated_tokens + max_tokens, usage_info=usage_info, output_tokens=max_tokens
+        )
+
+    def _events(self, response: str, input_tokens: int) -> Iterator[_Event]:
+        """message_start, paced content_block_delta events, message_delta with the output usage"""
+        started = time.perf_counter()
+        yield _Event(type="message_start", message=_Event(usage=_Event(
+            input_tokens=input_tokens, output_tokens=1,
+            cache_creation_input_tokens=0, cache_read_input_tokens=0
+        )))
+
+        chunk_chars = self.chunk_tokens * 4
+        emitted_tokens = 0
+        for offset in range(0, len(response), chunk_chars):
+            chunk = response[offset:offset + chunk_chars]
+            # Pace against the start time so sleep overshoot does not accumulate;
+            # tokens_per_second <= 0 streams without delay (pure pipeline overhead)
+            emitted_tokens += self.chunk_tokens
+            generation_time = emitted_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+            delay = started + self.time_to_first_token + generation_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield _Event(type="content_block_delta", delta=_Event(type="text_delta", text=chunk))
+
+        yield _Event(type="message_delta", usage=_Event(output_tokens=estimate_tokens(response)))
+        yield _Event(type="message_stop")
@@ -0,0 +1,349 @@
+"""
+Offline pipeline benchmarks: no API calls, no broker.
+
+    python -m benchmarks.run_benchmarks [--concurrency 1,4,8] [--endpoints 5,50] [--runs 16]
+                                        [--ttft 0.05] [--tokens-per-second 2000]
+                                        [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Every cell (scenario x concurrency x endpoint-folder size) runs in a fresh subprocess so its peak
+RSS is its own. Scenarios:
+    framework  setup_agent_framework + start_analysis, `concurrency` runs at a time
+    consumer   AmqpConsumer -> main.process_message -> worker pool -> run_pipeline ->
+               batched publish, confirm, ack; on an in-memory broker, `concurrency` workers
+The LLM is FakeAnthropicLLMClient: --ttft 0 --tokens-per-second 0 leaves only the pipeline's
+own overhead. Results are compared with the baseline; the exit code is 1 on a regression.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pika.spec import Basic
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = REPO_ROOT / "benchmarks" / "baseline.json"
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# Metric -> True when higher is better
+COMPARED_METRICS = {"throughput_per_second": True, "p95_seconds": False, "peak_rss_mb": False}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values` (q in 0..100)"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, or None where getrusage is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+# --- Scenarios (run inside the cell subprocess) ---
+
+def run_framework_scenario(framework, messages: List[dict], concurrency: int) -> Tuple[List[float], int]:
+    """start_analysis per message; returns the run latencies and the number of failed runs"""
+    from main import build_initial_state
+
+    def run(index: int, message: dict) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        final_state = framework.start_analysis(build_initial_state(message, run_id=f"bench-{index}"))
+        return time.perf_counter() - started, bool(final_state.get("errors"))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, range(len(messages)), messages))
+    return [latency for latency, _ in results], sum(failed for _, failed in results)
+
+
+class _Record:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class _InMemoryIOLoop:
+    """The parts of pika's IOLoop the consumer uses, run by the benchmark thread"""
+
+    def __init__(self):
+        self.callbacks: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self.timers: List[list] = []
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]):
+        self.callbacks.put(callback)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        timer = [time.monotonic() + delay, callback]
+        self.timers.append(timer)
+        return timer
+
+    def remove_timeout(self, timer: list):
+        if timer in self.timers:
+            self.timers.remove(timer)
+
+    def run_once(self, timeout: float = 0.01):
+        now = time.monotonic()
+        for timer in [timer for timer in self.timers if timer[0] <= now]:
+            self.timers.remove(timer)
+            timer[1]()
+        try:
+            self.callbacks.get(timeout=timeout)()
+        except queue.Empty:
+            pass
+
+
+class _InMemoryChannel:
+    """Stands in for the broker: confirms every publish and records when each delivery is settled"""
+
+    def __init__(self, ioloop: _InMemoryIOLoop, on_confirm: Callable[[Any], None]):
+        self.ioloop = ioloop
+        self.on_confirm = on_confirm
+        self.is_open = True
+        self.published: List[Any] = []
+        self.delivered: List[int] = []
+        self.settled_at: Dict[int, float] = {}
+        self.failed = 0
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None):
+        self.published.append(body)
+        confirm = _Record(method=Basic.Ack(delivery_tag=len(self.published), multiple=False))
+        self.ioloop.add_callback_threadsafe(functools.partial(self.on_confirm, confirm))
+
+    def _settle(self, delivery_tag: int, multiple: bool):
+        tags = [tag for tag in self.delivered if tag <= delivery_tag] if multiple else [delivery_tag]
+        for tag in tags:
+            self.settled_at.setdefault(tag, time.perf_counter())
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False):
+        self._settle(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int, multiple: bool = False, requeue: bool = True):
+        self._settle(delivery_tag, multiple)
+        self.failed += 1
+
+
+def run_consumer_scenario(framework, messages: List[dict], concurrency: int) -> Tuple[List[float], int]:
+    """Deliver every message through AmqpConsumer and main.process_message at once; latency is delivery to ack"""
+    import main
+    from internal.amqp_consumer import AmqpConsumer
+    from internal.single_flight import SingleFlight
+    from internal.worker_pool import BoundedWorkerPool
+
+    main._framework = framework
+    # The backlog holds every delivery, as the broker's prefetch window would
+    pool = BoundedWorkerPool(max_workers=concurrency, kind="thread", max_backlog=len(messages))
+    consumer = AmqpConsumer(
+        None, main.INPUT_QUEUE_NAME, main.OUTPUT_QUEUE_NAME,
+        on_message=functools.partial(main.process_message, pool=pool, single_flight=SingleFlight()),
+        confirm_batch_size=main.AMQP_CONFIRM_BATCH_SIZE, confirm_flush_interval=main.AMQP_CONFIRM_FLUSH_SECONDS
+    )
+    ioloop = _InMemoryIOLoop()
+    channel = _InMemoryChannel(ioloop, consumer._on_confirm)
+    consumer._connection = _Record(ioloop=ioloop, is_closed=False, is_closing=False)
+    consumer._channel = channel
+    consumer._generation = 1
+
+    delivered_at = {}
+    for tag, message in enumerate(messages, start=1):
+        delivered_at[tag] = time.perf_counter()
+        channel.delivered.append(tag)
+        consumer._on_delivery(channel, _Record(delivery_tag=tag, redelivered=True),
+                              _Record(message_id=f"bench-{tag}"), json.dumps(message).encode())
+
+    # Play the connection's I/O loop until every delivery is settled
+    while len(channel.settled_at) < len(messages):
+        ioloop.run_once()
+    pool.drain(timeout=0)
+
+    return [channel.settled_at[tag] - delivered_at[tag] for tag in delivered_at], channel.failed
+
+
+SCENARIOS = {
+    "framework": run_framework_scenario,
+    "consumer": run_consumer_scenario,
+}
+
+
+def run_cell(cell: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one benchmark cell in this process and summarize it"""
+    sys.path.insert(0, str(REPO_ROOT))
+    from agents.agent_setup import setup_agent_framework
+    from benchmarks.fake_llm import FakeAnthropicLLMClient
+    from benchmarks.workload import build_workspace
+    from llm.response_cache import LLMResponseCache
+
+    workdir = tempfile.mkdtemp(prefix="bian-bench-")
+    cwd = os.getcwd()
+    # Files written relative to the working directory (manifests, checkpoints) stay in the workspace
+    os.chdir(workdir)
+    try:
+        messages = [build_workspace(workdir, cell["endpoints"], name=f"service_{index}")
+                    for index in range(cell["runs"] + 1)]
+        client = FakeAnthropicLLMClient(
+            time_to_first_token=cell["ttft"],
+            tokens_per_second=cell["tokens_per_second"],
+            recordings=LLMResponseCache(cell["recordings"]) if cell.get("recordings") else None,
+            responses=FakeAnthropicLLMClient.load_responses(cell["responses"]) if cell.get("responses") else None,
+        )
+
+        with open(os.devnull, "w") as devnull, \
+                (contextlib.nullcontext() if cell.get("verbose") else contextlib.redirect_stdout(devnull)):
+            framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False)
+            # Warm-up run: imports, template indexing and first-call costs stay out of the numbers
+            run_framework_scenario(framework, messages[:1], 1)
+            started = time.perf_counter()
+            latencies, failed = SCENARIOS[cell["scenario"]](framework, messages[1:], cell["concurrency"])
+            elapsed = time.perf_counter() - started
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        **{key: value for key, value in cell.items() if key != "verbose"},
+        "failed_runs": failed,
+        "wall_seconds": round(elapsed, 4),
+        "throughput_per_second": round(len(latencies) / elapsed, 4),
+        "mean_seconds": round(sum(latencies) / len(latencies), 4),
+        "p50_seconds": round(percentile(latencies, 50), 4),
+        "p95_seconds": round(percentile(latencies, 95), 4),
+        "p99_seconds": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+    }
+
+
+# --- Driver ---
+
+def cell_key(result: Dict[str, Any]) -> str:
+    return f"{result['scenario']}/c{result['concurrency']}/e{result['endpoints']}"
+
+
+def run_cell_subprocess(cell: Dict[str, Any]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run_benchmarks", "--cell", json.dumps(cell)],
+        cwd=str(REPO_ROOT), capture_output=True, text=True
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Benchmark cell {cell_key(cell)} failed:\n{completed.stdout[-2000:]}{completed.stderr[-4000:]}")
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `results` against the baseline beyond `tolerance` (relative)"""
+    regressions = []
+    cells = baseline.get("results", {})
+    for result in results:
+        reference = cells.get(cell_key(result))
+        if reference is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = reference.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{cell_key(result)} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results: List[Dict[str, Any]]):
+    print(f"{'cell':<24} {'runs':>5} {'fail':>5} {'thru/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'rss MB':>8}")
+    for result in results:
+        print(f"{cell_key(result):<24} {result['runs']:>5} {result['failed_runs']:>5} "
+              f"{result['throughput_per_second']:>8.2f} {result['p50_seconds']:>8.3f} "
+              f"{result['p95_seconds']:>8.3f} {result['p99_seconds']:>8.3f} {result['peak_rss_mb']:>8.1f}")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks against a fake LLM")
+    parser.add_argument("--scenarios", default="framework,consumer", help="Comma-separated: framework, consumer")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 8], help="Concurrent runs / pool sizes")
+    parser.add_argument("--endpoints", type=int_list, default=[5, 50], help="Endpoint-folder sizes (files)")
+    parser.add_argument("--runs", type=int, default=16, help="Measured runs per cell")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Fake time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0,
+                        help="Fake output rate; 0 streams without delay")
+    parser.add_argument("--recordings", help="Response cache (SQLite) recorded from real runs to replay")
+    parser.add_argument("--responses", help="JSON of canned responses keyed by call kind")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative change reported as a regression")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's output")
+    parser.add_argument("--cell", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cell:
+        print(RESULT_PREFIX + json.dumps(run_cell(json.loads(args.cell))))
+        return
+
+    settings = {
+        "runs": args.runs,
+        "ttft": args.ttft,
+        "tokens_per_second": args.tokens_per_second,
+        "recordings": args.recordings,
+        "responses": args.responses,
+        "verbose": args.verbose,
+    }
+    results = []
+    for scenario in args.scenarios.split(","):
+        for endpoints in args.endpoints:
+            for concurrency in args.concurrency:
+                cell = {"scenario": scenario.strip(), "concurrency": concurrency, "endpoints": endpoints, **settings}
+                print(f"[benchmark] {cell_key(cell)} ...", flush=True)
+                results.append(run_cell_subprocess(cell))
+
+    print()
+    print_table(results)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in settings.items() if key != "verbose"},
+        "results": {cell_key(result): result for result in results},
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\n[benchmark] Baseline saved to {args.baseline}")
+        return
+
+    if not Path(args.baseline).exists():
+        print(f"\n[benchmark] No baseline at {args.baseline}; run with --save-baseline to store one")
+        return
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    if baseline.get("settings") != report["settings"]:
+        print("\n[WARNING] Baseline was recorded with different settings; comparison is indicative only")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Synthetic inputs for the benchmarks: a contract folder and an endpoints folder of any size,
+built from the sample files in tmp/bian and tmp/endpoints.
+"""
+
+import shutil
+from pathlib import Path
+from typing import Dict
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_BIAN_DIR = REPO_ROOT / "tmp" / "bian"
+SAMPLE_ENDPOINTS_DIR = REPO_ROOT / "tmp" / "endpoints"
+
+
+def build_workspace(root: str, endpoint_files: int, name: str = "service") -> Dict[str, str]:
+    """
+    Lay out one queue message's inputs under `root` and return the message.
+
+    The endpoints folder gets `endpoint_files` files, cycling over the samples;
+    the layout matches what main.build_initial_state expects ({bianContract}/output, {output}/reqs).
+    """
+    contract_dir = Path(root) / name / "contract"
+    service_dir = Path(root) / name / "service"
+    bian_dir = contract_dir / "output"
+    endpoints_dir = service_dir / "reqs"
+    bian_dir.mkdir(parents=True, exist_ok=True)
+    endpoints_dir.mkdir(parents=True, exist_ok=True)
+
+    for spec in sorted(SAMPLE_BIAN_DIR.glob("*.json")):
+        shutil.copyfile(spec, bian_dir / spec.name)
+
+    samples = sorted(SAMPLE_ENDPOINTS_DIR.glob("*.md"))
+    for index in range(endpoint_files):
+        sample = samples[index % len(samples)]
+        file_name = f"{sample.stem}_{index:04d}.md"
+        shutil.copyfile(sample, endpoints_dir / file_name)
+
+    return {"bianContract": str(contract_dir), "output": str(service_dir)}
@@ -0,0 +1,295 @@
+"""
+Non-blocking RabbitMQ consumer for long pipeline runs.
+
+The connection runs on pika's SelectConnection I/O loop, which never blocks on a run, so
+heartbeats are always answered. Results are published to the output queue with publisher
+confirms, in batches; an input delivery is acked only once the broker has confirmed its
+result, so a crash between the two never loses a result (the input is redelivered instead).
+Lost connections are re-established with backoff. Delivery tags belong to one channel, so
+results of deliveries from a previous connection are dropped: the broker redelivers them.
+"""
+
+import functools
+import json
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import pika
+from pika.spec import Basic
+
+
+class AmqpDelivery:
+    """One input message, tied to the channel generation it was received on"""
+
+    def __init__(self, generation: int, delivery_tag: int, redelivered: bool, properties, body: bytes):
+        self.generation = generation
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.properties = properties
+        self.body = body
+
+
+class AmqpConsumer:
+    """
+    Consumes `input_queue` and hands each delivery to `on_message(consumer, delivery)`,
+    which settles it with `settle_when_done` (publish the result, then ack) or `reject`.
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters, input_queue: str, output_queue: str,
+                 on_message: Callable[["AmqpConsumer", AmqpDelivery], None], prefetch_count: int = 1,
+                 confirm_batch_size: int = 50, confirm_flush_interval: float = 0.2,
+                 max_reconnect_delay: float = 30.0):
+        self.parameters = parameters
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.on_message = on_message
+        self.prefetch_count = prefetch_count
+        # Results are published once this many are waiting, or after the flush interval
+        self.confirm_batch_size = max(1, confirm_batch_size)
+        self.confirm_flush_interval = confirm_flush_interval
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._consumer_tag: Optional[str] = None
+        # Bumped on every new channel; deliveries of older generations cannot be acked any more
+        self._generation = 0
+        self._reconnect_delay = 1.0
+        self._stopping = False
+        self._drain_check: Callable[[], bool] = lambda: True
+        self._drain_timeout = 600.0
+        self._drain_deadline: Optional[float] = None
+
+        # Per channel: unsettled input tags, results waiting to be published, results awaiting a confirm
+        self._outstanding: Set[int] = set()
+        self._outbox: List[Tuple[AmqpDelivery, str]] = []
+        self._flush_timer = None
+        self._publish_seq = 0
+        self._unconfirmed: Dict[int, AmqpDelivery] = {}
+
+    # --- Lifecycle ---
+
+    def run(self, drain_check: Optional[Callable[[], bool]] = None, drain_timeout: float = 600.0):
+        """
+        Consume until `stop()` (or CTRL+C), reconnecting whenever the connection is lost.
+        On stop, consuming is cancelled and the I/O loop keeps running until `drain_check()`
+        is true and every result is confirmed, or `drain_timeout` seconds have passed.
+        """
+        if drain_check is not None:
+            self._drain_check = drain_check
+        self._drain_timeout = drain_timeout
+
+        while True:
+            self._connection = self._connect()
+            try:
+                self._connection.ioloop.start()
+            except KeyboardInterrupt:
+                self.stop()
+                if not self._connection.is_closed:
+                    # Let the drain finish on the I/O loop
+                    self._connection.ioloop.start()
+
+            if self._stopping:
+                break
+            delay = self._reconnect_delay
+            self._reconnect_delay = min(self.max_reconnect_delay, self._reconnect_delay * 2)
+            print(f"[amqp] Reconnecting in {delay:.0f}s...")
+            time.sleep(delay)
+
+    def stop(self):
+        """Stop consuming and drain; safe to call from a signal handler or another thread"""
+        if self._connection is None or self._connection.is_closed:
+            self._stopping = True
+            return
+        self._connection.ioloop.add_callback_threadsafe(self._begin_stop)
+
+    def _begin_stop(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        self._drain_deadline = time.monotonic() + self._drain_timeout
+        if self._channel is not None and self._channel.is_open and self._consumer_tag:
+            print(f"[amqp] Cancelling consumer on '{self.input_queue}'")
+            self._channel.basic_cancel(self._consumer_tag, callback=lambda _frame: self._check_drained())
+        else:
+            self._check_drained()
+
+    def _check_drained(self):
+        """Close once runs are finished and results confirmed; re-checked on the I/O loop"""
+        if self._connection is None or self._connection.is_closed:
+            return
+        drained = self._drain_check() and not self._outbox and not self._unconfirmed
+        if drained or time.monotonic() >= self._drain_deadline:
+            if not drained:
+                print("[!] Drain timed out. Unacknowledged deliveries will be redelivered by the broker.")
+            self._connection.close()
+            return
+        self._connection.ioloop.call_later(0.5, self._check_drained)
+
+    # --- Connection and channel setup ---
+
+    def _connect(self) -> pika.SelectConnection:
+        print(f"[amqp] Connecting to {self.parameters.host} (heartbeat {self.parameters.heartbeat}s)")
+        return pika.SelectConnection(
+            parameters=self.parameters,
+            on_open_callback=self._on_connection_open,
+            on_open_error_callback=self._on_connection_open_error,
+            on_close_callback=self._on_connection_closed
+        )
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        print(f"[!] Connection failed: {error!r}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._channel = None
+        if not self._stopping:
+            print(f"[!] Connection lost: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        self._generation += 1
+        self._outstanding = set()
+        self._outbox = []
+        self._flush_timer = None
+        self._unconfirmed = {}
+        self._publish_seq = 0
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.queue_declare(queue=self.input_queue, durable=True, callback=self._on_input_declared)
+
+    def _on_channel_closed(self, channel, reason):
+        print(f"[!] Channel closed: {reason}")
+        self._channel = None
+        if self._connection is not None and not self._connection.is_closing and not self._connection.is_closed:
+            self._connection.close()
+
+    def _on_input_declared(self, _frame):
+        self._channel.queue_declare(queue=self.output_queue, durable=True, callback=self._on_output_declared)
+
+    def _on_output_declared(self, _frame):
+        # The broker never hands us more unacked deliveries than the pool can hold
+        self._channel.basic_qos(prefetch_count=self.prefetch_count, callback=self._on_qos_ok)
+
+    def _on_qos_ok(self, _frame):
+        self._channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=self._on_confirm_ok)
+
+    def _on_confirm_ok(self, _frame):
+        self._channel.add_on_cancel_callback(self._on_consumer_cancelled)
+        self._consumer_tag = self._channel.basic_consume(self.input_queue, self._on_delivery)
+        self._reconnect_delay = 1.0
+        print(f"[*] Waiting for messages on queue '{self.input_queue}'")
+        if self._stopping:
+            self._begin_stop()
+
+    def _on_consumer_cancelled(self, _frame):
+        print("[!] Consumer cancelled by the broker")
+        if self._channel is not None:
+            self._channel.close()
+
+    # --- Deliveries ---
+
+    def _on_delivery(self, _channel, method, properties, body: bytes):
+        delivery = AmqpDelivery(self._generation, method.delivery_tag, method.redelivered, properties, body)
+        self._outstanding.add(delivery.delivery_tag)
+        self.on_message(self, delivery)
+
+    def _is_current(self, delivery: AmqpDelivery) -> bool:
+        return (delivery.generation == self._generation and self._channel is not None
+                and self._channel.is_open and delivery.delivery_tag in self._outstanding)
+
+    def reject(self, delivery: AmqpDelivery, requeue: bool):
+        """Nack a delivery; call on the I/O loop (e.g. from on_message)"""
+        if not self._is_current(delivery):
+            return
+        self._outstanding.discard(delivery.delivery_tag)
+        self._channel.basic_nack(delivery_tag=delivery.delivery_tag, requeue=requeue)
+
+    def settle_when_done(self, delivery: AmqpDelivery, future: Future, result: Optional[Any] = None):
+        """
+        Once `future` completes, publish its result (or `result` instead) and ack the delivery after
+        the broker confirms the publish. A failed run is nacked, requeued once.
+        """
+        connection = self._connection
+        callback = functools.partial(self._settle, delivery, result)
+
+        def on_done(done: Future):
+            try:
+                connection.ioloop.add_callback_threadsafe(functools.partial(callback, done))
+            except Exception as e:
+                # The connection is gone; the broker redelivers the message
+                print(f"[!] Could not settle delivery {delivery.delivery_tag}: {e}")
+
+        future.add_done_callback(on_done)
+
+    def _settle(self, delivery: AmqpDelivery, result: Optional[Any], future: Future):
+        if not self._is_current(delivery):
+            print(f"[!] Delivery {delivery.delivery_tag} belongs to a closed channel; the broker will redeliver it.")
+            return
+
+        error = future.exception()
+        if error is not None:
+            # Requeue once so a transient failure gets a second chance, then drop it
+            requeue = not delivery.redelivered
+            print(f"[!] Pipeline failed for delivery {delivery.delivery_tag}: {error} (requeue={requeue})")
+            self.reject(delivery, requeue=requeue)
+            return
+
+        self._outbox.append((delivery, json.dumps(future.result() if result is None else result)))
+        if len(self._outbox) >= self.confirm_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = self._connection.ioloop.call_later(self.confirm_flush_interval, self._flush)
+
+    def _flush(self):
+        """Publish every waiting result; their deliveries are acked as the confirms arrive"""
+        if self._flush_timer is not None:
+            self._connection.ioloop.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        outbox, self._outbox = self._outbox, []
+        # delivery_mode=2: persistent, like the durable queue it goes to
+        properties = pika.BasicProperties(content_type="application/json", delivery_mode=2)
+        for delivery, body in outbox:
+            if not self._is_current(delivery):
+                continue
+            self._channel.basic_publish(exchange='', routing_key=self.output_queue, body=body, properties=properties)
+            self._publish_seq += 1
+            self._unconfirmed[self._publish_seq] = delivery
+        if outbox:
+            print(f"[*] Published {len(outbox)} result(s) to queue '{self.output_queue}'.")
+
+    def _on_confirm(self, frame):
+        """Broker confirm of one (or, with multiple, every earlier) publish"""
+        method = frame.method
+        if method.multiple:
+            sequences = sorted(seq for seq in self._unconfirmed if seq <= method.delivery_tag)
+        else:
+            sequences = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+        deliveries = [self._unconfirmed.pop(seq) for seq in sequences]
+
+        if isinstance(method, Basic.Ack):
+            self._ack_many([delivery.delivery_tag for delivery in deliveries if self._is_current(delivery)])
+            return
+        # The broker could not take the result: redeliver the input so it is produced again
+        print(f"[!] Broker rejected {len(deliveries)} result(s); requeueing their deliveries.")
+        for delivery in deliveries:
+            self.reject(delivery, requeue=True)
+
+    def _ack_many(self, delivery_tags: List[int]):
+        """Ack with one multiple=True frame up to the first outstanding delivery not being acked"""
+        if not delivery_tags:
+            return
+        acked = set(delivery_tags)
+        blocking = min((tag for tag in self._outstanding if tag not in acked), default=None)
+        prefix = sorted(tag for tag in acked if blocking is None or tag < blocking)
+        if len(prefix) > 1:
+            self._channel.basic_ack(delivery_tag=prefix[-1], multiple=True)
+        else:
+            prefix = []
+        for tag in sorted(acked.difference(prefix)):
+            self._channel.basic_ack(delivery_tag=tag)
+        self._outstanding.difference_update(acked)
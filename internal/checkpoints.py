@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that also serves LangGraph's async API by running the sync
+    methods in a worker thread, so one checkpointer works for invoke and ainvoke.
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter: Optional[dict] = None, before=None,
+                    limit: Optional[int] = None) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes: Sequence, task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_sqlite_checkpointer(db_path: str = ".cache/checkpoints.sqlite3") -> ThreadedSqliteSaver:
+    """Open (or create) a SQLite checkpoint store shared by every run in the process"""
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    checkpointer = ThreadedSqliteSaver(conn)
+    checkpointer.setup()
+    return checkpointer
+
+
+def create_checkpointer_from_env() -> Optional[ThreadedSqliteSaver]:
+    """Build the checkpointer from PIPELINE_CHECKPOINTS_* environment variables, or None when disabled"""
+    if os.getenv("PIPELINE_CHECKPOINTS_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return create_sqlite_checkpointer(os.getenv("PIPELINE_CHECKPOINTS_PATH", ".cache/checkpoints.sqlite3"))
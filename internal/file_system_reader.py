@@ -1,129 +1,166 @@
+import codecs
+import mmap
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
 
 
 class FileSystemReader:
-    """File system reader with encoding handling and Windows long path support"""
+    """
+    File system reader with encoding handling and Windows long path support.
+
+    Thread-safe: contents are kept in an LRU cache keyed on (path, mtime, size), so a file
+    is only read again after it changes. Files of `mmap_threshold` bytes or more are decoded
+    straight from a memory map, and each file's encoding is detected once and remembered.
+    """
 
-    def __init__(self, base_path: str = None):
+    def __init__(self, base_path: str = None, cache_max_bytes: int = 64 * 1024 * 1024,
+                 mmap_threshold: int = 1024 * 1024, max_workers: int = 8):
         if base_path:
             self.base_path = Path(base_path).resolve()
         else:
             self.base_path = None
-
-    def read_file(self, file_path: str) -> str:
-        file_p = Path(file_path)
-        """Read file content with proper encoding detection and long path handling"""
+        self.cache_max_bytes = cache_max_bytes
+        self.mmap_threshold = mmap_threshold
+        self.max_workers = max(1, max_workers)
+
+        self._lock = threading.Lock()
+        # (path, mtime_ns, size) -> content
+        self._cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._cache_bytes = 0
+        # path -> encoding detected on the first read
+        self._encodings: Dict[str, str] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def _full_path(self, file_path: str) -> str:
+        """Absolute path, with the UNC prefix for Windows paths over 260 characters"""
         if self.base_path:
-            full_path = (self.base_path / file_p).resolve()
+            full_path = os.path.abspath(os.path.join(self.base_path, file_path))
         else:
-            full_path = file_p.resolve()
-
-        # Try standard approach first
-        if full_path.exists():
-            return self._read_with_encoding_fallback(full_path)
+            full_path = os.path.abspath(file_path)
 
-        # If standard approach fails, try alternative methods (handles Windows long paths)
-        return self._try_alternative_reads(full_path)
+        if os.name == 'nt' and len(full_path) > 260 and not full_path.startswith("\\\\?\\"):
+            full_path = "\\\\?\\" + full_path
+        return full_path
 
-    def _read_with_encoding_fallback(self, file_path: Path) -> str:
-        """Read file with UTF-8 and Latin-1 fallback"""
+    def read_file(self, file_path: str) -> str:
+        """Read file content with proper encoding detection and long path handling"""
+        full_path = self._full_path(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    return f.read()
-            except Exception as e:
-                print(f"Failed to read {file_path}: {str(e)}")
-                return ""
-        except Exception as e:
-            print(f"Error reading {file_path}: {str(e)}")
+            stat = os.stat(full_path)
+        except OSError:
+            print(f"File not found or inaccessible: {full_path}")
             return ""
 
-    def _try_alternative_reads(self, full_path: Path) -> str:
-        """Try alternative methods for files that should exist but aren't accessible"""
-        raw_path = str(full_path)
-
-        # Method 1: UNC long path prefix for Windows paths > 260 characters
-        if len(raw_path) > 260 and os.name == 'nt':
-            try:
-                unc_path = "\\\\?\\" + raw_path
-                with open(unc_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(unc_path, 'r', encoding='latin-1') as f:
-                        return f.read()
-                except:
-                    pass
-            except:
-                pass
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            content = self._cache.get(key)
+            if content is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return content
+            self._misses += 1
 
-        # Method 2: Change to parent directory and use relative path
         try:
-            original_dir = os.getcwd()
-            parent_dir = full_path.parent
-            filename = full_path.name
-
-            os.chdir(str(parent_dir))
-            with open(filename, 'r', encoding='utf-8') as f:
-                content = f.read()
-                return content
+            content = self._read_and_decode(full_path, stat.st_size)
+        except Exception as e:
+            print(f"Error reading {full_path}: {str(e)}")
+            return ""
 
-        except UnicodeDecodeError:
-            try:
-                with open(filename, 'r', encoding='latin-1') as f:
-                    return f.read()
-            except:
-                pass
-        except Exception:
-            pass
-        finally:
-            try:
-                os.chdir(original_dir)
-            except:
-                pass
+        self._store(key, content)
+        return content
 
-        # Method 3: Try pathlib is_file() which sometimes works when exists() doesn't
-        try:
-            p = Path(raw_path)
-            if p.is_file():
-                return self._read_with_encoding_fallback(p)
-        except:
-            pass
+    def read_many(self, file_paths: Sequence[str], max_workers: Optional[int] = None) -> List[str]:
+        """Read several files concurrently; contents are returned in the order of `file_paths`"""
+        file_paths = [str(file_path) for file_path in file_paths]
+        workers = min(max_workers or self.max_workers, len(file_paths))
+        if workers <= 1:
+            return [self.read_file(file_path) for file_path in file_paths]
 
-        # Method 4: Try shorter base path approach
-        if self.base_path:
-            try:
-                shorter_base = self.base_path.parent.parent
-                relative_from_shorter = full_path.relative_to(shorter_base)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.read_file, file_paths))
 
-                original_dir = os.getcwd()
-                os.chdir(str(shorter_base))
+    def _read_and_decode(self, full_path: str, size: int) -> str:
+        with open(full_path, 'rb') as f:
+            if size >= self.mmap_threshold:
+                # Decode straight from the page cache instead of copying into a bytes object first
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return self._decode(full_path, memoryview(mapped))
+            return self._decode(full_path, f.read())
 
-                with open(str(relative_from_shorter), 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    return content
+    def _decode(self, full_path: str, data) -> str:
+        with self._lock:
+            encoding = self._encodings.get(full_path)
 
+        if encoding is not None:
+            try:
+                return str(data, encoding)
             except UnicodeDecodeError:
-                try:
-                    with open(str(relative_from_shorter), 'r', encoding='latin-1') as f:
-                        return f.read()
-                except:
-                    pass
-            except Exception:
+                # The file was rewritten in another encoding since it was first read
                 pass
-            finally:
-                try:
-                    os.chdir(original_dir)
-                except:
-                    pass
-
-        # If all methods fail
-        print(f"File not found or inaccessible: {full_path}")
-        return ""
+
+        encoding, content = self._detect_and_decode(data)
+        with self._lock:
+            self._encodings[full_path] = encoding
+        return content
+
+    @staticmethod
+    def _detect_and_decode(data) -> Tuple[str, str]:
+        """BOM first, then UTF-8 if the bytes are valid UTF-8, else Latin-1 (which accepts any byte)"""
+        head = bytes(data[:4])
+        for bom, encoding in BOM_ENCODINGS:
+            if head.startswith(bom):
+                return encoding, str(data, encoding)
+        try:
+            return "utf-8", str(data, "utf-8")
+        except UnicodeDecodeError:
+            return "latin-1", str(data, "latin-1")
+
+    def _store(self, key: Tuple[str, int, int], content: str):
+        # str length is a cheap stand-in for its memory footprint
+        size = len(content)
+        if size > self.cache_max_bytes:
+            return
+
+        with self._lock:
+            if key in self._cache:
+                return
+            # Drop stale versions of the same file
+            for stale_key in [k for k in self._cache if k[0] == key[0]]:
+                self._cache_bytes -= len(self._cache.pop(stale_key))
+            self._cache[key] = content
+            self._cache_bytes += size
+            while self._cache_bytes > self.cache_max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": self._cache_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+            self._encodings.clear()
 
     def list_directory_contents(self, directory_path: str = None) -> list:
         """List contents of a directory"""
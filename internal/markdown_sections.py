@@ -0,0 +1,142 @@
+"""
+Section tree of a markdown document.
+
+ATX headings ("## Title") outside fenced code blocks open a section that runs until the next
+heading of the same or a higher level. Every section keeps its offsets into the source text,
+so a single section can be replaced in place without regenerating the rest of the document.
+"""
+
+import re
+from typing import Iterable, Iterator, List, Optional
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+FENCE_PATTERN = re.compile(r"^[ \t]{0,3}(`{3,}|~{3,})")
+
+# Headings the project structure section may have in a generated requirements document
+PROJECT_STRUCTURE_TITLES = ["Proposed Project Structure", "Project Structure"]
+
+
+class MarkdownSection:
+    """
+    One heading and its content.
+
+    `start` is the offset of the heading line, `body_start` the offset just after it and
+    `end` the offset where the next heading of the same or a higher level begins.
+    The root section (level 0) spans the whole document and has no heading.
+    """
+
+    def __init__(self, level: int, title: str, start: int, body_start: int, end: int):
+        self.level = level
+        self.title = title
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+        self.children: List["MarkdownSection"] = []
+
+    def walk(self) -> Iterator["MarkdownSection"]:
+        """This section and all of its descendants, in document order"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def find(self, titles: Iterable[str]) -> Optional["MarkdownSection"]:
+        """First descendant whose title matches one of `titles` (case-insensitive)"""
+        wanted = {title.strip().lower() for title in titles}
+        for section in self.walk():
+            if section.level and section.title.lower() in wanted:
+                return section
+        return None
+
+    def outline(self) -> List[str]:
+        """The heading lines of every descendant, indented by level"""
+        return [f"{'  ' * (section.level - 1)}{'#' * section.level} {section.title}"
+                for section in self.walk() if section.level]
+
+    def __repr__(self) -> str:
+        return f"MarkdownSection(level={self.level}, title={self.title!r}, start={self.start}, end={self.end})"
+
+
+def parse_sections(text: str) -> MarkdownSection:
+    """Parse `text` into a heading tree rooted at a level-0 section spanning the whole document"""
+    root = MarkdownSection(0, "", 0, 0, len(text))
+    stack = [root]
+    fence: Optional[str] = None
+    offset = 0
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        fence_match = FENCE_PATTERN.match(stripped)
+        if fence_match:
+            marker = fence_match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+        elif fence is None:
+            heading = HEADING_PATTERN.match(stripped)
+            if heading:
+                level = len(heading.group(1))
+                while stack[-1].level >= level:
+                    stack.pop().end = offset
+                section = MarkdownSection(level, heading.group(2).strip(), offset, offset + len(line), len(text))
+                stack[-1].children.append(section)
+                stack.append(section)
+        offset += len(line)
+
+    return root
+
+
+def replace_section_body(text: str, section: MarkdownSection, body: str) -> str:
+    """Replace the content under `section`'s heading (subsections included), keeping the heading"""
+    body = body.strip("\n")
+    separator = "\n\n" if section.end < len(text) else "\n"
+    return f"{text[:section.body_start]}\n{body}{separator}{text[section.end:]}"
+
+
+def insert_section(text: str, root: MarkdownSection, title: str, body: str, level: int = 2) -> str:
+    """
+    Add a new section before the first existing section of the same level,
+    or at the end of the document when there is none.
+    """
+    heading = f"{'#' * level} {title}"
+    body = body.strip("\n")
+    following = next((section for section in root.walk() if section.level == level), None)
+    if following is None:
+        return f"{text.rstrip()}\n\n{heading}\n\n{body}\n"
+    return f"{text[:following.start]}{heading}\n\n{body}\n\n{text[following.start:]}"
+
+
+def remove_sections(text: str, titles: Iterable[str]) -> str:
+    """Drop every section (heading, content and subsections) whose title matches one of `titles`"""
+    wanted = {title.strip().lower() for title in titles}
+    root = parse_sections(text)
+    spans = []
+    for section in root.walk():
+        if section.level and section.title.lower() in wanted:
+            if not spans or section.start >= spans[-1][1]:
+                spans.append((section.start, section.end))
+
+    for start, end in reversed(spans):
+        text = text[:start] + text[end:]
+    return text
+
+
+def shift_headings(text: str, levels: int = 1) -> str:
+    """Demote (or promote, with a negative `levels`) every heading outside fenced code, within 1..6"""
+    lines = []
+    fence: Optional[str] = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        fence_match = FENCE_PATTERN.match(stripped)
+        if fence_match:
+            marker = fence_match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+        elif fence is None and HEADING_PATTERN.match(stripped):
+            hashes = len(stripped) - len(stripped.lstrip("#"))
+            level = min(6, max(1, hashes + levels))
+            line = "#" * level + line[hashes:]
+        lines.append(line)
+    return "".join(lines)
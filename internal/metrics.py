@@ -0,0 +1,274 @@
+"""
+Per-run latency, token and cost instrumentation.
+
+Module nodes decorated with `track_module_metrics` get a ModuleMetrics collector bound to
+the current context; the LLM clients report every call into it through `record_llm_call`.
+The collected numbers land in `module_results[<module>]["metrics"]`, and MetricsRecorder
+aggregates finished runs into a JSONL trace and a Prometheus text file.
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_current_module_metrics: contextvars.ContextVar[Optional["ModuleMetrics"]] = contextvars.ContextVar(
+    "current_module_metrics", default=None
+)
+
+
+class ModuleMetrics:
+    """Numbers collected while one module node runs"""
+
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self.wall_time_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_time_seconds = 0.0
+        self.time_to_first_token_seconds: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_llm_call(self, usage_info: Dict[str, Any]):
+        """Add one LLM call's usage_info (as returned by the LLM clients)"""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_time_seconds += usage_info.get("latency_seconds") or 0.0
+            self.input_tokens += usage_info.get("input_tokens") or 0
+            self.output_tokens += usage_info.get("output_tokens") or 0
+            self.cache_creation_input_tokens += usage_info.get("cache_creation_input_tokens") or 0
+            self.cache_read_input_tokens += usage_info.get("cache_read_input_tokens") or 0
+            self.retries += usage_info.get("retries") or 0
+            if usage_info.get("cache_hit"):
+                self.cache_hits += 1
+            # The module's time-to-first-token is the one of its first call
+            ttft = usage_info.get("time_to_first_token_seconds")
+            if ttft is not None and self.time_to_first_token_seconds is None:
+                self.time_to_first_token_seconds = ttft
+
+    def merge(self, other: "ModuleMetrics"):
+        """Add the LLM calls collected by `other` (e.g. work the module started ahead of its node)"""
+        with other._lock:
+            counts = {
+                name: getattr(other, name) for name in (
+                    "llm_calls", "llm_time_seconds", "input_tokens", "output_tokens",
+                    "cache_creation_input_tokens", "cache_read_input_tokens", "cache_hits", "retries"
+                )
+            }
+            ttft = other.time_to_first_token_seconds
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+            if ttft is not None and self.time_to_first_token_seconds is None:
+                self.time_to_first_token_seconds = ttft
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "wall_time_seconds": round(self.wall_time_seconds, 4),
+                "llm_calls": self.llm_calls,
+                "llm_time_seconds": round(self.llm_time_seconds, 4),
+                "time_to_first_token_seconds": (
+                    None if self.time_to_first_token_seconds is None
+                    else round(self.time_to_first_token_seconds, 4)
+                ),
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cache_creation_input_tokens": self.cache_creation_input_tokens,
+                "cache_read_input_tokens": self.cache_read_input_tokens,
+                "cache_hits": self.cache_hits,
+                "retries": self.retries,
+            }
+
+
+def record_llm_call(usage_info: Dict[str, Any]):
+    """Report an LLM call to the module currently running in this context, if any"""
+    metrics = _current_module_metrics.get()
+    if metrics is not None:
+        metrics.record_llm_call(usage_info)
+
+
+def current_module_name() -> Optional[str]:
+    """Name of the module node running in this context, if any"""
+    metrics = _current_module_metrics.get()
+    return metrics.module_name if metrics is not None else None
+
+
+def current_module_metrics() -> Optional[ModuleMetrics]:
+    """Collector of the module node running in this context, if any"""
+    return _current_module_metrics.get()
+
+
+@contextlib.contextmanager
+def collect_module_metrics(module_name: str) -> Iterator[ModuleMetrics]:
+    """Collect the LLM calls made inside the block for `module_name`, outside of its node"""
+    metrics = ModuleMetrics(module_name)
+    token = _current_module_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_module_metrics.reset(token)
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args) -> Future:
+    """Submit to an executor so the task still reports into the caller's module metrics"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _with_metrics(update: Optional[Dict[str, Any]], metrics: ModuleMetrics) -> Dict[str, Any]:
+    update = dict(update or {})
+    module_results = dict(update.get("module_results", {}))
+    module_results[metrics.module_name] = {
+        **module_results.get(metrics.module_name, {}),
+        "metrics": metrics.to_dict(),
+    }
+    update["module_results"] = module_results
+    return update
+
+
+def track_module_metrics(node: Callable) -> Callable:
+    """
+    Decorator for module node methods (sync or async) returning partial state updates.
+    Times the node, collects the LLM calls it makes and adds them to module_results.
+    """
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(self, state, *args, **kwargs):
+            metrics = ModuleMetrics(self.module_name)
+            token = _current_module_metrics.set(metrics)
+            start = time.perf_counter()
+            try:
+                update = await node(self, state, *args, **kwargs)
+            finally:
+                metrics.wall_time_seconds = time.perf_counter() - start
+                _current_module_metrics.reset(token)
+            return _with_metrics(update, metrics)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(self, state, *args, **kwargs):
+        metrics = ModuleMetrics(self.module_name)
+        token = _current_module_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            update = node(self, state, *args, **kwargs)
+        finally:
+            metrics.wall_time_seconds = time.perf_counter() - start
+            _current_module_metrics.reset(token)
+        return _with_metrics(update, metrics)
+
+    return wrapper
+
+
+class MetricsRecorder:
+    """
+    Process-wide aggregation of finished runs.
+
+    Every run is appended to a JSONL trace (one line per run) and the running totals are
+    rewritten as a Prometheus text file, suitable for node_exporter's textfile collector.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._failed_runs = 0
+        self._run_seconds = 0.0
+        # module -> metric name -> running total
+        self._module_totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    @classmethod
+    def from_env(cls) -> Optional["MetricsRecorder"]:
+        """Build a recorder from METRICS_* environment variables, or None when neither output is set"""
+        trace_path = os.getenv("METRICS_TRACE_PATH")
+        prometheus_path = os.getenv("METRICS_PROMETHEUS_PATH")
+        if not trace_path and not prometheus_path:
+            return None
+        return cls(trace_path=trace_path, prometheus_path=prometheus_path)
+
+    def observe_run(self, run_id: Optional[str], final_state: Dict[str, Any], run_seconds: float):
+        """Record a finished run"""
+        module_metrics = {
+            module_name: result["metrics"]
+            for module_name, result in (final_state.get("module_results") or {}).items()
+            if isinstance(result, dict) and isinstance(result.get("metrics"), dict)
+        }
+        errors = final_state.get("errors") or []
+
+        with self._lock:
+            self._runs += 1
+            self._run_seconds += run_seconds
+            if errors:
+                self._failed_runs += 1
+            for module_name, metrics in module_metrics.items():
+                totals = self._module_totals[module_name]
+                totals["runs"] += 1
+                for name, value in metrics.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        totals[name] += value
+
+            if self.trace_path:
+                self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+                record = {
+                    "timestamp": time.time(),
+                    "run_id": run_id,
+                    "run_seconds": round(run_seconds, 4),
+                    "errors": len(errors),
+                    "modules": module_metrics,
+                }
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+            if self.prometheus_path:
+                self._write_atomic(self.prometheus_path, self._prometheus_text())
+
+    def to_prometheus(self) -> str:
+        """Current totals in the Prometheus text exposition format"""
+        with self._lock:
+            return self._prometheus_text()
+
+    def _prometheus_text(self) -> str:
+        """Must be called with the lock held"""
+        lines = [
+            "# TYPE bian_pipeline_runs_total counter",
+            f"bian_pipeline_runs_total {self._runs}",
+            "# TYPE bian_pipeline_failed_runs_total counter",
+            f"bian_pipeline_failed_runs_total {self._failed_runs}",
+            "# TYPE bian_pipeline_run_seconds_total counter",
+            f"bian_pipeline_run_seconds_total {self._run_seconds:.4f}",
+        ]
+
+        metric_names = sorted({name for totals in self._module_totals.values() for name in totals})
+        for name in metric_names:
+            metric = f"bian_module_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for module_name in sorted(self._module_totals):
+                value = self._module_totals[module_name].get(name)
+                if value is not None:
+                    lines.append(f'{metric}{{module="{module_name}"}} {value:g}')
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write_atomic(path: Path, content: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+
+class OpenAPIIndex:
+    """
+    Pre-computed view of an OpenAPI document.
+
+    Every local `$ref` is resolved once into a component dependency graph, so the
+    components reachable from each operation can be looked up without re-walking the
+    spec, and compact fragments carrying only those components can be emitted for prompts.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.operations: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # "#/components/schemas/Foo" -> refs used directly inside Foo
+        self._component_refs: Dict[str, Set[str]] = {}
+        self._operation_refs: Dict[Tuple[str, str], Set[str]] = {}
+        self._reachable_cache: Dict[Tuple[str, str], Set[str]] = {}
+
+        for section, components in spec.get("components", {}).items():
+            if not isinstance(components, dict):
+                continue
+            for name, component in components.items():
+                self._component_refs[f"#/components/{section}/{name}"] = set(self._iter_refs(component))
+
+        for path, path_item in spec.get("paths", {}).items():
+            # Path-level parameters apply to every operation below them
+            shared_refs = set(self._iter_refs(path_item.get("parameters", [])))
+            for method, operation in path_item.items():
+                if method.lower() not in HTTP_METHODS:
+                    continue
+                key = (path, method.lower())
+                self.operations[key] = operation
+                self._operation_refs[key] = shared_refs | set(self._iter_refs(operation))
+
+    @staticmethod
+    def _iter_refs(node: Any) -> Iterator[str]:
+        """Yield every local $ref found in a JSON node"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, dict):
+                ref = current.get("$ref")
+                if isinstance(ref, str) and ref.startswith("#/"):
+                    yield ref
+                stack.extend(current.values())
+            elif isinstance(current, list):
+                stack.extend(current)
+
+    def resolve(self, ref: str) -> Optional[Any]:
+        """Return the node a local $ref points to, or None if it does not exist"""
+        node: Any = self.spec
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def operation_keys(self) -> List[Tuple[str, str]]:
+        """All (path, method) pairs defined in the spec"""
+        return list(self.operations.keys())
+
+    def reachable_refs(self, path: str, method: str) -> Set[str]:
+        """Transitive closure of component refs used by one operation (cycle-safe)"""
+        key = (path, method.lower())
+        if key not in self._reachable_cache:
+            if key not in self._operation_refs:
+                raise KeyError(f"Operation not found in spec: {method.upper()} {path}")
+            seen: Set[str] = set()
+            stack = list(self._operation_refs[key])
+            while stack:
+                ref = stack.pop()
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                stack.extend(self._component_refs.get(ref, ()))
+            self._reachable_cache[key] = seen
+        return self._reachable_cache[key]
+
+    def _fragment(self, keys: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Build a standalone spec holding only the given operations and the components they reach"""
+        paths: Dict[str, Dict[str, Any]] = {}
+        refs: Set[str] = set()
+        for path, method in keys:
+            path_item = paths.setdefault(path, {})
+            if "parameters" in self.spec["paths"][path]:
+                path_item["parameters"] = self.spec["paths"][path]["parameters"]
+            path_item[method] = self.operations[(path, method)]
+            refs |= self.reachable_refs(path, method)
+
+        operations = [self.operations[key] for key in keys]
+        # Security schemes are referenced by name from security requirements, not by $ref
+        scheme_names = self._security_scheme_names([self.spec] + operations)
+        refs |= {f"#/components/securitySchemes/{name}" for name in scheme_names}
+
+        components: Dict[str, Dict[str, Any]] = {}
+        for ref in sorted(refs):
+            parts = ref.split("/")
+            if len(parts) != 4 or parts[1] != "components":
+                continue
+            target = self.resolve(ref)
+            if target is not None:
+                components.setdefault(parts[2], {})[parts[3]] = target
+
+        fragment = {
+            key: self.spec[key] for key in ("openapi", "info", "servers", "security", "externalDocs")
+            if key in self.spec
+        }
+        # Tag definitions of the operations in the fragment
+        used_tags = {tag for operation in operations for tag in operation.get("tags", [])}
+        tags = [tag for tag in self.spec.get("tags", []) if isinstance(tag, dict) and tag.get("name") in used_tags]
+        if tags:
+            fragment["tags"] = tags
+        fragment["paths"] = paths
+        if components:
+            fragment["components"] = components
+        return fragment
+
+    @staticmethod
+    def _security_scheme_names(nodes: List[Dict[str, Any]]) -> Set[str]:
+        """Names used by the `security` requirement lists of the given spec/operation nodes"""
+        names: Set[str] = set()
+        for node in nodes:
+            for requirement in node.get("security") or []:
+                if isinstance(requirement, dict):
+                    names.update(requirement)
+        return names
+
+    def reachable_spec(self) -> Dict[str, Any]:
+        """The whole spec without components no operation can reach"""
+        return self._fragment(self.operation_keys())
+
+    @staticmethod
+    def to_compact_json(fragment: Dict[str, Any]) -> str:
+        """Minified JSON for prompts (no indentation or separator whitespace)"""
+        return json.dumps(fragment, separators=(",", ":"), ensure_ascii=False)
+
+    def compact_spec(self) -> str:
+        return self.to_compact_json(self.reachable_spec())
+
+    def compact_spec_within(self, budget_tokens: int, count: Callable[[str], int]) -> str:
+        """
+        The compact spec when it fits `budget_tokens` (as measured by `count`); otherwise the
+        largest leading run of operations whose fragment fits, followed by the method and path
+        of every operation left out.
+        """
+        full = self.compact_spec()
+        keys = self.operation_keys()
+        if count(full) <= budget_tokens or not keys:
+            return full
+
+        # Fragments grow with the number of operations: binary search the longest prefix that fits
+        low, high, best = 1, len(keys), ""
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = self.to_compact_json(self._fragment(keys[:middle]))
+            if count(candidate) <= budget_tokens:
+                low, best = middle + 1, candidate
+            else:
+                high = middle - 1
+        omitted = keys[low - 1:]
+        listing = "\n".join(f"{method.upper()} {path}" for path, method in omitted)
+        return f"{best}\nOperations left out of the fragment above to fit the prompt:\n{listing}"
+
+
+# Indexes keyed by the SHA-256 of the spec content, shared by every run in the process
+_INDEX_CACHE: "OrderedDict[str, OpenAPIIndex]" = OrderedDict()
+_INDEX_CACHE_SIZE = 32
+_index_cache_lock = threading.Lock()
+
+
+def load_openapi_index(content: str) -> OpenAPIIndex:
+    """Parse and index an OpenAPI document, reusing the index when the same content was seen before"""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    with _index_cache_lock:
+        index = _INDEX_CACHE.get(digest)
+        if index is not None:
+            _INDEX_CACHE.move_to_end(digest)
+            return index
+
+    index = OpenAPIIndex(json.loads(content))
+
+    with _index_cache_lock:
+        _INDEX_CACHE[digest] = index
+        while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return index
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+
+def fingerprint_text(text: str) -> str:
+    """SHA-256 of a string"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def fingerprint_file(path: Path) -> str:
+    """SHA-256 of a file's bytes, or a marker when the file is missing"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    except FileNotFoundError:
+        return "missing"
+
+
+def fingerprint_files(paths: Iterable[Path]) -> str:
+    """Order-independent fingerprint of a set of files (names and contents)"""
+    entries = sorted(f"{Path(path).name}:{fingerprint_file(Path(path))}" for path in paths)
+    return fingerprint_text("\n".join(entries))
+
+
+class RunManifest:
+    """
+    Records, per module, the fingerprints of the inputs it consumed and the outputs it produced.
+
+    ModularAgentFramework looks modules up by (module_name, combined input fingerprint)
+    before running them and reuses the stored outputs when nothing changed.
+    """
+
+    def __init__(self, db_path: str = ".cache/run_manifest.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS module_runs (
+                module TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                inputs TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (module, fingerprint)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["RunManifest"]:
+        """Build a manifest from RUN_MANIFEST_* environment variables, or None when disabled"""
+        if os.getenv("RUN_MANIFEST_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(db_path=os.getenv("RUN_MANIFEST_PATH", ".cache/run_manifest.sqlite3"))
+
+    @staticmethod
+    def combine(inputs: Dict[str, str]) -> str:
+        """Single fingerprint for a module's named input fingerprints"""
+        return fingerprint_text(json.dumps(inputs, sort_keys=True))
+
+    def lookup(self, module_name: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Stored outputs for a module run with these inputs, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT outputs FROM module_runs WHERE module = ? AND fingerprint = ?",
+                (module_name, fingerprint),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, module_name: str, fingerprint: str, inputs: Dict[str, str], outputs: Dict[str, Any]):
+        """Store the outputs a module produced for the given inputs"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO module_runs (module, fingerprint, inputs, outputs, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (module_name, fingerprint, json.dumps(inputs, sort_keys=True), json.dumps(outputs), time.time()),
+            )
+            self._conn.commit()
+
+    def forget(self, module_name: Optional[str] = None):
+        """Drop stored runs for one module (or all modules) to force recomputation"""
+        with self._lock:
+            if module_name:
+                self._conn.execute("DELETE FROM module_runs WHERE module = ?", (module_name,))
+            else:
+                self._conn.execute("DELETE FROM module_runs")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
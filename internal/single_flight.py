@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent jobs with the same key onto one in-flight Future.
+
+    The first caller for a key submits the job; callers arriving while it runs get the same
+    Future instead of starting another one. The key is forgotten once the job completes,
+    so a later call starts a fresh run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        # Number of calls answered by another call's job
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def run(self, key: Optional[str], submit: Callable[[], Optional[Future]]) -> Tuple[Optional[Future], bool]:
+        """
+        Future for `key`: the in-flight one, or a new one from `submit()`.
+        A None key always submits.
+
+        Returns:
+            Tuple[Optional[Future], bool]: The future (None if `submit` declined the job)
+                                           and whether it is shared with an earlier call.
+        """
+        if key is None:
+            return submit(), False
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            future = submit()
+            if future is None:
+                return None, False
+            self._in_flight[key] = future
+
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, False
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
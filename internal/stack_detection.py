@@ -0,0 +1,147 @@
+"""
+Rule-based detection of the programming language and web framework described by endpoint files.
+
+Each file is scored from explicit stack declarations ("**Language**: Java 21"), fenced code
+block language tags, source file extensions and framework signatures (annotations, imports).
+Every file then casts one normalized vote, so the result reflects the whole endpoints folder.
+"""
+
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Fenced code block tags that name an implementation language (json/yaml/protobuf are ignored)
+FENCE_LANGUAGES = {
+    "java": "java", "kotlin": "kotlin", "kt": "kotlin",
+    "python": "python", "py": "python",
+    "javascript": "javascript", "js": "javascript", "typescript": "typescript", "ts": "typescript",
+    "go": "go", "golang": "go", "csharp": "c#", "cs": "c#", "c#": "c#",
+}
+
+EXTENSION_LANGUAGES = {
+    ".java": "java", ".kt": "kotlin", ".py": "python", ".js": "javascript",
+    ".ts": "typescript", ".go": "go", ".cs": "c#",
+}
+
+# (pattern, framework, implied language, weight)
+FRAMEWORK_SIGNATURES = [
+    (r"@RestController|@SpringBootApplication|@(?:Get|Post|Put|Delete|Patch|Request)Mapping|\bSpring Boot\b",
+     "spring boot", "java", 3.0),
+    (r"\bQuarkus\b|io\.quarkus", "quarkus", "java", 3.0),
+    (r"\bMicronaut\b|io\.micronaut", "micronaut", "java", 3.0),
+    (r"\bFastAPI\b|from fastapi import", "fastapi", "python", 3.0),
+    (r"from flask import|\bFlask\(", "flask", "python", 3.0),
+    (r"\bDjango\b|from django", "django", "python", 3.0),
+    (r"require\(['\"]express['\"]\)|from ['\"]express['\"]|\bexpress\(\)", "express", "javascript", 3.0),
+    (r"@nestjs/|\bNestJS\b", "nestjs", "typescript", 3.0),
+    (r"\bASP\.NET\b", "asp.net core", "c#", 3.0),
+    # gRPC is a transport; it only wins when nothing else names a framework
+    (r"\bgrpc\b|```protobuf", "grpc", None, 1.0),
+]
+
+DECLARATION_PATTERN = re.compile(r"^\W*(language|framework)\W*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+FENCE_PATTERN = re.compile(r"^```\s*([\w#+-]+)", re.MULTILINE)
+EXTENSION_PATTERN = re.compile(r"\b[\w-]+(\.(?:java|kt|py|js|ts|go|cs))\b")
+
+DECLARATION_WEIGHT = 5.0
+FENCE_WEIGHT = 2.0
+EXTENSION_WEIGHT = 0.5
+# Repeated evidence of one kind stops adding weight after this many hits
+MAX_HITS = 3
+
+
+def _normalize(value: str) -> str:
+    """'Java 21' -> 'java', 'Spring Boot 3.2' -> 'spring boot'"""
+    value = re.sub(r"[*`_]", "", value).strip().lower()
+    value = re.sub(r"\s*\(.*\)$", "", value)
+    return re.sub(r"\s+v?[\d.]+$", "", value).strip()
+
+
+def score_file(content: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Raw (language_scores, framework_scores) for one file"""
+    languages: Dict[str, float] = defaultdict(float)
+    frameworks: Dict[str, float] = defaultdict(float)
+
+    for kind, value in DECLARATION_PATTERN.findall(content):
+        normalized = _normalize(value)
+        if not normalized or normalized == "none":
+            continue
+        if kind.lower() == "language":
+            languages[normalized] += DECLARATION_WEIGHT
+        else:
+            frameworks[normalized] += DECLARATION_WEIGHT
+
+    fence_hits: Dict[str, int] = defaultdict(int)
+    for tag in FENCE_PATTERN.findall(content):
+        language = FENCE_LANGUAGES.get(tag.lower())
+        if language and fence_hits[language] < MAX_HITS:
+            fence_hits[language] += 1
+            languages[language] += FENCE_WEIGHT
+
+    extension_hits: Dict[str, int] = defaultdict(int)
+    for extension in EXTENSION_PATTERN.findall(content):
+        language = EXTENSION_LANGUAGES[extension]
+        if extension_hits[language] < MAX_HITS:
+            extension_hits[language] += 1
+            languages[language] += EXTENSION_WEIGHT
+
+    for pattern, framework, language, weight in FRAMEWORK_SIGNATURES:
+        hits = min(len(re.findall(pattern, content, re.IGNORECASE if framework == "grpc" else 0)), MAX_HITS)
+        if hits:
+            frameworks[framework] += weight * hits
+            if language:
+                languages[language] += weight * hits / 2
+
+    return dict(languages), dict(frameworks)
+
+
+def _vote(totals: Dict[str, float], scores: Dict[str, float]):
+    """Add one file's scores as a single normalized vote"""
+    weight = sum(scores.values())
+    if weight <= 0:
+        return
+    for name, score in scores.items():
+        totals[name] += score / weight
+
+
+def _winner(totals: Dict[str, float]) -> Tuple[Optional[str], float]:
+    if not totals:
+        return None, 0.0
+    name = max(totals, key=totals.get)
+    return name, totals[name] / sum(totals.values())
+
+
+def detect_stack(contents: Iterable[str]) -> Dict[str, Any]:
+    """
+    Vote across the contents of all endpoint files.
+
+    Returns:
+        Dict[str, Any]: {"language", "framework", "language_confidence",
+                         "framework_confidence", "confidence", "files"} where the
+                         overall confidence is the weaker of the two.
+    """
+    language_totals: Dict[str, float] = defaultdict(float)
+    framework_totals: Dict[str, float] = defaultdict(float)
+    files = 0
+
+    for content in contents:
+        files += 1
+        languages, frameworks = score_file(content)
+        _vote(language_totals, languages)
+        _vote(framework_totals, frameworks)
+
+    language, language_confidence = _winner(language_totals)
+    framework, framework_confidence = _winner(framework_totals)
+    # Only a fraction of the files backing the winner lowers the confidence too
+    if files:
+        language_confidence *= min(1.0, sum(language_totals.values()) / files)
+        framework_confidence *= min(1.0, sum(framework_totals.values()) / files)
+
+    return {
+        "language": language,
+        "framework": framework,
+        "language_confidence": round(language_confidence, 3),
+        "framework_confidence": round(framework_confidence, 3),
+        "confidence": round(min(language_confidence, framework_confidence), 3),
+        "files": files,
+    }
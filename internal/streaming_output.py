@@ -0,0 +1,194 @@
+"""
+Incremental output of generated documents.
+
+A DocumentStream writes LLM chunks to a temp file next to its target as they arrive and
+renames it into place only once the document is complete, so readers never see a partial
+`*.md` document. Optionally every completed section is also published to a RabbitMQ stream
+queue, letting downstream generators start before the whole document has been generated.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Mode of a file created with open(path, "w"). mkstemp creates 0600 files and a rename keeps the
+# mode, so temp files are chmod-ed to this before being moved into place. The umask is read once
+# at import: it can only be queried by setting it, which is not thread-safe.
+DEFAULT_FILE_MODE = 0o666 & ~_current_umask()
+
+
+class RabbitMQStreamPublisher:
+    """
+    Publishes document progress to a RabbitMQ stream queue (x-queue-type=stream).
+
+    Each message is a JSON object {"run_id", "document", "seq", "text", "final"} with
+    message_id "<run_id>:<document>:<seq>", so consumers can reassemble and deduplicate.
+    One connection is shared by every run in the process; publishing never fails a run.
+    """
+
+    def __init__(self, queue_name: str, host: str = "localhost", user: str = "guest", password: str = "guest"):
+        self.queue_name = queue_name
+        self.host = host
+        self.user = user
+        self.password = password
+        self._connection = None
+        self._channel = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RabbitMQStreamPublisher"]:
+        """Build a publisher from OUTPUT_STREAM_QUEUE / RABBIT_* environment variables, or None when unset"""
+        queue_name = os.getenv("OUTPUT_STREAM_QUEUE")
+        if not queue_name:
+            return None
+        return cls(
+            queue_name,
+            host=os.getenv("RABBIT_HOST", "localhost"),
+            user=os.getenv("RABBIT_USER", "guest"),
+            password=os.getenv("RABBIT_PASS", "guest")
+        )
+
+    def _connect(self):
+        """Must be called with the lock held"""
+        import pika
+
+        self._connection = pika.BlockingConnection(
+            pika.ConnectionParameters(
+                host=self.host,
+                credentials=pika.PlainCredentials(self.user, self.password)
+            )
+        )
+        self._channel = self._connection.channel()
+        # Streams must be durable; consumers read them with an x-stream-offset
+        self._channel.queue_declare(
+            queue=self.queue_name, durable=True, arguments={"x-queue-type": "stream"}
+        )
+
+    def publish(self, run_id: str, document: str, seq: int, text: str, final: bool = False):
+        import pika
+
+        body = json.dumps({"run_id": run_id, "document": document, "seq": seq, "text": text, "final": final})
+        properties = pika.BasicProperties(
+            message_id=f"{run_id}:{document}:{seq}",
+            content_type="application/json",
+            delivery_mode=2
+        )
+
+        with self._lock:
+            # One reconnect per message: a BlockingConnection idle between runs may have been dropped
+            for attempt in range(2):
+                try:
+                    if self._channel is None or not self._channel.is_open:
+                        self._connect()
+                    self._channel.basic_publish(
+                        exchange="", routing_key=self.queue_name, body=body, properties=properties
+                    )
+                    return
+                except Exception as e:
+                    self._channel = None
+                    if attempt:
+                        print(f"[WARNING] Could not publish progress for {document} ({run_id}): {e}")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+            self._connection = None
+            self._channel = None
+
+
+class DocumentStream:
+    """
+    One document being generated: `write` each chunk, then `close` on success or `abort` on failure.
+    Progress is published per completed "## " section, or once `flush_chars` are pending.
+    """
+
+    def __init__(self, path: Path, run_id: Optional[str] = None,
+                 publisher: Optional[RabbitMQStreamPublisher] = None, flush_chars: int = 4096):
+        self.path = Path(path)
+        self.run_id = run_id or ""
+        self.publisher = publisher
+        self.flush_chars = flush_chars
+        self._pending = ""
+        self._seq = 0
+        self._parts = []
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=f".{self.path.name}.")
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+
+    def write(self, chunk: str):
+        self._parts.append(chunk)
+        self._file.write(chunk)
+        self._file.flush()
+
+        if self.publisher is None:
+            return
+        self._pending += chunk
+        # Publish everything up to the start of the newest section once a section boundary appears
+        boundary = self._pending.rfind("\n## ")
+        if boundary > 0:
+            self._publish(self._pending[:boundary + 1])
+            self._pending = self._pending[boundary + 1:]
+        elif len(self._pending) >= self.flush_chars:
+            self._publish(self._pending)
+            self._pending = ""
+
+    def _publish(self, text: str, final: bool = False):
+        self.publisher.publish(self.run_id, self.path.name, self._seq, text, final=final)
+        self._seq += 1
+
+    @property
+    def text(self) -> str:
+        """Everything written so far"""
+        return "".join(self._parts)
+
+    def close(self) -> str:
+        """Move the complete document into place and return its text"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.chmod(self._tmp_path, DEFAULT_FILE_MODE)
+        os.replace(self._tmp_path, self.path)
+
+        if self.publisher is not None:
+            self._publish(self._pending, final=True)
+            self._pending = ""
+        print(f"✅ Streamed {self.path.name} to: {self.path.absolute()}")
+        return self.text
+
+    def abort(self):
+        """Drop the partial document; the previous file at `path`, if any, is left untouched"""
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class StreamingOutput:
+    """Opens DocumentStreams under an output directory, sharing one progress publisher"""
+
+    def __init__(self, output_dir: str = "output", publisher: Optional[RabbitMQStreamPublisher] = None):
+        self.output_dir = output_dir
+        self.publisher = publisher
+
+    @classmethod
+    def from_env(cls) -> Optional["StreamingOutput"]:
+        """Build from OUTPUT_STREAMING / OUTPUT_STREAM_QUEUE environment variables, or None when disabled"""
+        if os.getenv("OUTPUT_STREAMING", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(publisher=RabbitMQStreamPublisher.from_env())
+
+    def open(self, file_name: str, output_dir: Optional[str] = None, run_id: Optional[str] = None) -> DocumentStream:
+        return DocumentStream(Path(output_dir or self.output_dir) / file_name, run_id=run_id, publisher=self.publisher)
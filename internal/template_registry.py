@@ -0,0 +1,159 @@
+"""
+Registry of architecture templates (`<root>/<language>/<architecture>.txt`).
+
+The tree is scanned once and indexed by (language, architecture), so a lookup is a dict
+access. Lookups resolve aliases ("py" -> "python", "multi-module" -> "multimodule") and
+fall back to the closest architecture name of the language. The tree is re-checked at most
+every `poll_interval` seconds and re-indexed only when a template was added, removed or changed.
+"""
+
+import difflib
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Default root, independent of the working directory
+DEFAULT_ARCHITECTURES_DIR = Path(__file__).resolve().parent.parent / "tmp" / "architectures"
+
+LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python",
+    "js": "javascript", "node": "javascript", "nodejs": "javascript", "node.js": "javascript",
+    "ts": "typescript",
+    "csharp": "c#", "cs": "c#", "dotnet": "c#",
+    "golang": "go",
+    "kt": "kotlin",
+}
+
+ARCHITECTURE_ALIASES = {
+    "multi_module": "multimodule", "modular": "multimodule",
+    "simple": "basic", "default": "basic", "standard": "basic",
+}
+
+# Minimum similarity for the fuzzy architecture fallback
+FUZZY_CUTOFF = 0.6
+
+
+def _normalize_language(language: str) -> str:
+    language = (language or "").strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def _normalize_architecture(architecture: str) -> str:
+    architecture = re.sub(r"[\s-]+", "_", (architecture or "").strip().lower())
+    return ARCHITECTURE_ALIASES.get(architecture, architecture)
+
+
+class ArchitectureTemplate:
+    """One template file, read and pre-processed once"""
+
+    def __init__(self, language: str, architecture: str, path: Path, text: str):
+        self.language = language
+        self.architecture = architecture
+        self.path = path
+        self.text = text
+        self.lines = text.splitlines()
+        # ~4 characters per token, enough to budget prompts without calling the API
+        self.token_estimate = (len(text) + 3) // 4
+
+    def __repr__(self) -> str:
+        return f"ArchitectureTemplate({self.language}/{self.architecture}, {self.token_estimate} tokens)"
+
+
+class TemplateRegistry:
+    """Thread-safe, hot-reloading index of architecture templates"""
+
+    def __init__(self, root: Optional[str] = None, poll_interval: float = 5.0):
+        self.root = Path(root).resolve() if root else DEFAULT_ARCHITECTURES_DIR
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._templates: Dict[Tuple[str, str], ArchitectureTemplate] = {}
+        # Lookups that needed the fuzzy fallback, remembered until the next reload
+        self._resolved: Dict[Tuple[str, str], Optional[ArchitectureTemplate]] = {}
+        self._signature: Tuple = ()
+        self._checked_at = 0.0
+        self._reload(self._tree_signature())
+
+    @classmethod
+    def from_env(cls) -> "TemplateRegistry":
+        """Build the registry from ARCHITECTURES_DIR / ARCHITECTURES_POLL_SECONDS environment variables"""
+        return cls(
+            root=os.getenv("ARCHITECTURES_DIR"),
+            poll_interval=float(os.getenv("ARCHITECTURES_POLL_SECONDS", "5"))
+        )
+
+    def _tree_signature(self) -> Tuple:
+        """(path, mtime_ns, size) of every template; cheap enough to poll"""
+        entries = []
+        try:
+            for language_dir in os.scandir(self.root):
+                if not language_dir.is_dir():
+                    continue
+                for entry in os.scandir(language_dir.path):
+                    if entry.is_file() and entry.name.endswith(".txt"):
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            pass
+        return tuple(sorted(entries))
+
+    def _reload(self, signature: Tuple):
+        templates = {}
+        for path, _, _ in signature:
+            path = Path(path)
+            try:
+                text = path.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[WARNING] Could not load template {path}: {e}")
+                continue
+            language = _normalize_language(path.parent.name)
+            architecture = _normalize_architecture(path.stem)
+            templates[(language, architecture)] = ArchitectureTemplate(language, architecture, path, text)
+
+        with self._lock:
+            self._templates = templates
+            self._resolved = {}
+            self._signature = signature
+        print(f"[template_registry] Indexed {len(templates)} architecture template(s) from {self.root}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.poll_interval:
+                return
+            self._checked_at = now
+        signature = self._tree_signature()
+        if signature != self._signature:
+            self._reload(signature)
+
+    def get(self, language: str, architecture: str) -> Optional[ArchitectureTemplate]:
+        """The template for (language, architecture), its alias, or the closest architecture of the language"""
+        self._maybe_reload()
+        key = (_normalize_language(language), _normalize_architecture(architecture))
+
+        with self._lock:
+            templates = self._templates
+            if key in templates:
+                return templates[key]
+            if key in self._resolved:
+                return self._resolved[key]
+
+        candidates = [arch for (lang, arch) in templates if lang == key[0]]
+        matches = difflib.get_close_matches(key[1], candidates, n=1, cutoff=FUZZY_CUTOFF)
+        template = templates[(key[0], matches[0])] if matches else None
+        if template is not None:
+            print(f"[template_registry] No template for {key[0]}/{key[1]}, using {template.architecture}")
+
+        with self._lock:
+            self._resolved[key] = template
+        return template
+
+    def languages(self) -> Dict[str, list]:
+        """Available architectures per language"""
+        with self._lock:
+            available: Dict[str, list] = {}
+            for language, architecture in sorted(self._templates):
+                available.setdefault(language, []).append(architecture)
+            return available
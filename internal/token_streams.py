@@ -0,0 +1,166 @@
+"""
+Token streams shared between the modules of one run.
+
+A module generating a long document publishes its chunks on a stream named after the state
+key the document ends up in (e.g. "generated_requirements"). Modules that only need a prefix
+of that document subscribe to the stream and start their own work as soon as the prefix is
+there, instead of waiting for the producing node to finish; the node later picks up the
+result of that work from the hub. Streams live in a per-run TokenStreamHub that the
+framework binds to the context of the run (see `bind_hub`).
+"""
+
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+_current_hub: contextvars.ContextVar[Optional["TokenStreamHub"]] = contextvars.ContextVar(
+    "current_token_stream_hub", default=None
+)
+
+# predicate(text so far, stream closed) -> the prefix to hand over, or None to keep waiting
+PrefixPredicate = Callable[[str, bool], Optional[str]]
+
+
+class TokenStream:
+    """Chunks of one document as they are generated; thread-safe, written by a single producer"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._parts: List[str] = []
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._watchers: List[Tuple[PrefixPredicate, Optional[str], Future]] = []
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return "".join(self._parts)
+
+    def write(self, chunk: str):
+        with self._lock:
+            self._parts.append(chunk)
+            watchers = [watcher for watcher in self._watchers if watcher[1] is None or watcher[1] in chunk]
+        if watchers:
+            self._check(watchers)
+
+    def close(self):
+        """The document is complete; waiting predicates get a last look at the whole text"""
+        with self._lock:
+            self._closed = True
+            watchers = list(self._watchers)
+        self._check(watchers)
+
+    def abort(self, error: BaseException):
+        """The producer failed; waiting subscribers get the error"""
+        with self._lock:
+            self._closed = True
+            self._error = error
+            watchers, self._watchers = self._watchers, []
+        for _, _, future in watchers:
+            future.set_exception(error)
+
+    def when(self, predicate: PrefixPredicate, trigger: Optional[str] = None) -> Future:
+        """
+        Future of the prefix `predicate` hands over. The predicate is evaluated on every chunk
+        containing `trigger` (every chunk when None) and once more when the stream closes.
+        A stream closed before the predicate accepted a prefix fails the future.
+        """
+        future = Future()
+        watcher = (predicate, trigger, future)
+        with self._lock:
+            if self._error is not None:
+                future.set_exception(self._error)
+                return future
+            self._watchers.append(watcher)
+        self._check([watcher])
+        return future
+
+    def _check(self, watchers: List[Tuple[PrefixPredicate, Optional[str], Future]]):
+        with self._lock:
+            text, closed = "".join(self._parts), self._closed
+        for watcher in watchers:
+            predicate, _, future = watcher
+            try:
+                prefix = predicate(text, closed)
+            except Exception as e:
+                prefix, error = None, e
+            else:
+                error = None if prefix is not None or not closed else EOFError(
+                    f"Stream '{self.name}' ended before the expected prefix"
+                )
+            if prefix is None and error is None:
+                continue
+            with self._lock:
+                if watcher not in self._watchers:
+                    continue
+                self._watchers.remove(watcher)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(prefix)
+
+
+class TokenStreamHub:
+    """The streams and subscriptions of one run, plus the results of work started from them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Callable[[TokenStream, Dict[str, Any]], None]]] = {}
+        self._results: Dict[str, Future] = {}
+
+    def subscribe(self, name: str, callback: Callable[[TokenStream, Dict[str, Any]], None]):
+        """Call `callback(stream, producer_state)` when a stream with this name is opened"""
+        with self._lock:
+            self._subscribers.setdefault(name, []).append(callback)
+
+    def open(self, name: str, state: Dict[str, Any]) -> Optional[TokenStream]:
+        """A new stream for the producer to write to, or None when nobody subscribed to it"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(name, []))
+        if not subscribers:
+            return None
+        stream = TokenStream(name)
+        for callback in subscribers:
+            try:
+                callback(stream, state)
+            except Exception as e:
+                # A subscriber that cannot start falls back to waiting for the node
+                print(f"[token_streams] Subscriber of '{name}' failed to start: {e}")
+        return stream
+
+    def put_result(self, key: str, future: Future):
+        with self._lock:
+            self._results[key] = future
+
+    def take_result(self, key: str) -> Optional[Future]:
+        """The result stored under `key` (by a subscriber), removed from the hub"""
+        with self._lock:
+            return self._results.pop(key, None)
+
+
+def current_hub() -> Optional[TokenStreamHub]:
+    """The hub of the run executing in this context, if pipelining is on"""
+    return _current_hub.get()
+
+
+def open_token_stream(name: str, state: Dict[str, Any]) -> Optional[TokenStream]:
+    """Open a stream on the current run's hub; None when there is no hub or no subscriber"""
+    hub = _current_hub.get()
+    return hub.open(name, state) if hub is not None else None
+
+
+@contextlib.contextmanager
+def bind_hub(hub: Optional[TokenStreamHub]) -> Iterator[Optional[TokenStreamHub]]:
+    """Make `hub` the current one for the duration of a run (nodes inherit the context)"""
+    token = _current_hub.set(hub)
+    try:
+        yield hub
+    finally:
+        _current_hub.reset(token)
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class BoundedWorkerPool:
+    """Fixed-size thread/process executor with an in-flight limit and graceful drain"""
+
+    def __init__(self, max_workers: int = 4, kind: str = "thread", max_backlog: int = 0):
+        """
+        Args:
+            max_workers (int): Number of pipeline runs executed concurrently.
+            kind (str): "thread" or "process".
+            max_backlog (int): Extra jobs allowed to wait in the executor queue
+                               once every worker is busy.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_backlog < 0:
+            raise ValueError("max_backlog cannot be negative")
+
+        self.max_workers = max_workers
+        self.max_backlog = max_backlog
+        self.kind = kind
+        self._executor = self._create_executor(kind, max_workers)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+
+    @staticmethod
+    def _create_executor(kind: str, max_workers: int) -> Executor:
+        if kind == "thread":
+            return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        if kind == "process":
+            return ProcessPoolExecutor(max_workers=max_workers)
+        raise ValueError(f"Unknown worker pool kind: {kind} (expected 'thread' or 'process')")
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of jobs running or waiting at any time"""
+        return self.max_workers + self.max_backlog
+
+    @property
+    def prefetch_count(self) -> int:
+        """Broker prefetch matching the pool capacity, so RabbitMQ never over-delivers"""
+        return self.capacity
+
+    @property
+    def in_flight(self) -> int:
+        with self._cond:
+            return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of accepted jobs still waiting for a free worker"""
+        with self._cond:
+            return max(0, self._in_flight - self.max_workers)
+
+    def try_submit(self, fn: Callable, *args) -> Optional[Future]:
+        """
+        Submit a job if the pool has capacity.
+
+        Returns:
+            Optional[Future]: The job future, or None when the pool is full or draining.
+        """
+        with self._cond:
+            if self._closed or self._in_flight >= self.capacity:
+                return None
+            self._in_flight += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def drain(self, timeout: Optional[float] = None, poll: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Stop accepting work and wait for in-flight jobs to finish.
+
+        Args:
+            timeout (Optional[float]): Maximum seconds to wait, None waits forever.
+            poll (Optional[Callable]): Called between waits, e.g. to let the AMQP
+                                       connection run pending publish/ack callbacks.
+
+        Returns:
+            bool: True if every job finished before the timeout.
+        """
+        with self._cond:
+            self._closed = True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._in_flight == 0:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(0.5 if remaining is None else min(0.5, remaining))
+            if poll:
+                poll()
+
+        drained = self.in_flight == 0
+        self._executor.shutdown(wait=drained, cancel_futures=not drained)
+        return drained
@@ -1,45 +1,158 @@
 import os
+import time
 import anthropic
-from typing import Iterator, Optional
+from typing import Any, Dict, Iterator, Optional
+
+from internal.metrics import record_llm_call
+from llm.prompt_blocks import PromptContent, prepare_cached_prompts
+from llm.rate_limiter import RateLimiter, estimate_prompt_tokens
+from llm.response_cache import LLMResponseCache
+
+
+def accumulate_usage(usage_info: Dict[str, Any], chunk) -> None:
+    """Collect token usage from the message_start / message_delta stream events"""
+    if chunk.type == "message_start":
+        usage = chunk.message.usage
+    elif chunk.type == "message_delta":
+        usage = getattr(chunk, 'usage', None)
+    else:
+        return
+    if usage is None:
+        return
+
+    for field in ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'):
+        value = getattr(usage, field, None)
+        if value is not None:
+            usage_info[field] = value
+    usage_info['total_tokens'] = usage_info.get('input_tokens', 0) + usage_info.get('output_tokens', 0)
+
+
+def add_timings(usage_info: Dict[str, Any], start: float, first_token_at: Optional[float]) -> None:
+    """Add wall-clock latency and time-to-first-token (seconds) to usage_info"""
+    usage_info['latency_seconds'] = time.perf_counter() - start
+    usage_info['time_to_first_token_seconds'] = None if first_token_at is None else first_token_at - start
+
+
+def add_partial_output(usage_info: Dict[str, Any], chunks) -> None:
+    """
+    Output tokens of a stream stopped before its final message_delta (which carries the count):
+    estimated from the text received (~4 characters per token).
+    """
+    estimated = len("".join(chunks)) // 4 + 1
+    usage_info['output_tokens'] = max(usage_info.get('output_tokens') or 0, estimated)
+    usage_info['total_tokens'] = usage_info.get('input_tokens', 0) + usage_info['output_tokens']
+    usage_info['stopped_early'] = True
+
+
+def close_stream(stream) -> None:
+    """Close the SDK stream (and its HTTP response) if it has not run to the end"""
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
 
 
 class AnthropicLLMClient:
-    def __init__(self, api_key: str = None, model: str = "claude-sonnet-4-20250514"):
+    def __init__(self, api_key: str = None, model: str = "claude-sonnet-4-20250514",
+                 cache: Optional[LLMResponseCache] = None, prompt_caching: bool = True,
+                 rate_limiter: Optional[RateLimiter] = None):
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.model = model
+        self.cache = cache
+        # Send cache_control breakpoints so static prompt prefixes are reused across calls
+        self.prompt_caching = prompt_caching
 
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable or api_key parameter required")
 
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # The limiter owns retries (with backoff shared across calls); the SDK's own retries are off then
+        self.rate_limiter = rate_limiter
+        client_options = {"max_retries": 0} if rate_limiter is not None else {}
+        self.client = anthropic.Anthropic(api_key=self.api_key, **client_options)
 
-    def generate(self, system_prompt: str, user_prompt: str, **kwargs):
-        """Generate response using Anthropic Claude with streaming (returns full response)"""
-        try:
+    def _cache_key(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                   max_tokens: int, temperature: float) -> str:
+        return LLMResponseCache.make_key(
+            self.model, system_prompt, user_prompt,
+            max_tokens=max_tokens, temperature=temperature
+        )
 
-            stream = self.client.messages.create(
+    def _create_stream(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                       max_tokens: int, temperature: float, usage_info: Dict[str, Any]):
+        """Open the streaming request, within the rate limiter's budget when one is set"""
+        system, content = prepare_cached_prompts(system_prompt, user_prompt, self.prompt_caching)
+
+        def create():
+            return self.client.messages.create(
                 model=self.model,
-                max_tokens=kwargs.get('max_tokens', 2048),
-                temperature=kwargs.get('temperature', 0.1),
-                system=system_prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system,
                 messages=[
-                    {"role": "user", "content": user_prompt}
+                    {"role": "user", "content": content}
                 ],
                 stream=True
             )
 
-            full_response = ""
+        if self.rate_limiter is None:
+            return create()
+        # Shorter calls (small prompt, small max_tokens) are scheduled first
+        estimated_tokens = estimate_prompt_tokens(system_prompt, user_prompt)
+        usage_info['estimated_input_tokens'] = estimated_tokens
+        usage_info['reserved_output_tokens'] = max_tokens
+        return self.rate_limiter.call(
+            create, estimated_tokens, priority=estimated_tokens + max_tokens, usage_info=usage_info,
+            output_tokens=max_tokens
+        )
+
+    def _settle(self, usage_info: Dict[str, Any]):
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(usage_info.pop('estimated_input_tokens', 0), usage_info,
+                                    usage_info.pop('reserved_output_tokens', 0))
+
+    def generate(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs):
+        """Generate response using Anthropic Claude with streaming (returns full response)"""
+        max_tokens = kwargs.get('max_tokens', 2048)
+        temperature = kwargs.get('temperature', 0.1)
+        start = time.perf_counter()
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(system_prompt, user_prompt, max_tokens, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                response, usage_info = cached
+                record_llm_call({'cache_hit': True, 'latency_seconds': time.perf_counter() - start})
+                return response, {**usage_info, 'cache_hit': True}
+
+        try:
+
             usage_info = {}
-            for chunk in stream:
-                if chunk.type == "content_block_delta":
-                    full_response += chunk.delta.text
-                elif chunk.type == "message_delta":
-                    if hasattr(chunk, 'usage'):
-                        usage_info = {
-                            'input_tokens': chunk.usage.input_tokens,
-                            'output_tokens': chunk.usage.output_tokens,
-                            'total_tokens': chunk.usage.input_tokens + chunk.usage.output_tokens
-                        }
+            stream = self._create_stream(system_prompt, user_prompt, max_tokens, temperature, usage_info)
+
+            parts = []
+            first_token_at = None
+            complete = False
+            try:
+                for chunk in stream:
+                    if chunk.type == "content_block_delta":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(chunk.delta.text)
+                    else:
+                        accumulate_usage(usage_info, chunk)
+                complete = True
+            finally:
+                # Interrupted calls still used budget: settle and report what was generated
+                if not complete:
+                    close_stream(stream)
+                    add_partial_output(usage_info, parts)
+                add_timings(usage_info, start, first_token_at)
+                self._settle(usage_info)
+                record_llm_call(usage_info)
+
+            full_response = "".join(parts)
+            if cache_key is not None:
+                self.cache.put(cache_key, full_response, usage_info)
 
             return full_response, usage_info
 
@@ -47,38 +160,67 @@ class AnthropicLLMClient:
             print(f"LLM generation error: {str(e)}")
             raise
 
-    def generate_stream(self, system_prompt: str, user_prompt: str, **kwargs) -> Iterator[str]:
+    def generate_stream(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs) -> Iterator[str]:
         """Generate response using Anthropic Claude with streaming"""
+        max_tokens = kwargs.get('max_tokens', 32000)
+        temperature = kwargs.get('temperature', 0.1)
+        start = time.perf_counter()
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(system_prompt, user_prompt, max_tokens, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                record_llm_call({'cache_hit': True, 'latency_seconds': time.perf_counter() - start})
+                # Replay the cached response as a single chunk
+                yield cached[0]
+                return
+
         try:
-            stream = self.client.messages.create(
-                model=self.model,
-                max_tokens=kwargs.get('max_tokens', 32000),
-                temperature=kwargs.get('temperature', 0.1),
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ],
-                stream=True
-            )
+            usage_info = {}
+            stream = self._create_stream(system_prompt, user_prompt, max_tokens, temperature, usage_info)
+
+            chunks = []
+            first_token_at = None
+            complete = False
+            try:
+                for chunk in stream:
+                    if chunk.type == "content_block_delta":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks.append(chunk.delta.text)
+                        yield chunk.delta.text
+                    else:
+                        accumulate_usage(usage_info, chunk)
+                complete = True
+            finally:
+                # Also runs when the caller stops early (close() raises GeneratorExit at the yield):
+                # the SDK stream is closed and the tokens generated so far are settled and reported
+                if not complete:
+                    close_stream(stream)
+                    add_partial_output(usage_info, chunks)
+                add_timings(usage_info, start, first_token_at)
+                self._settle(usage_info)
+                record_llm_call(usage_info)
 
-            for chunk in stream:
-                if chunk.type == "content_block_delta":
-                    yield chunk.delta.text
+            # Only complete streams are cached; an abandoned generator never reaches here
+            if cache_key is not None:
+                self.cache.put(cache_key, "".join(chunks))
 
         except Exception as e:
             print(f"LLM streaming error: {str(e)}")
             raise
 
-    def generate_with_callback(self, system_prompt: str, user_prompt: str,
+    def generate_with_callback(self, system_prompt: PromptContent, user_prompt: PromptContent,
                                callback: callable, **kwargs) -> str:
         """Generate response with a callback function for each chunk"""
-        full_response = ""
+        parts = []
         try:
             for chunk in self.generate_stream(system_prompt, user_prompt, **kwargs):
-                full_response += chunk
+                parts.append(chunk)
                 callback(chunk)  # Call the callback with each chunk
 
-            return full_response
+            return "".join(parts)
 
         except Exception as e:
             print(f"LLM generation error: {str(e)}")
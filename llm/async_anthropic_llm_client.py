@@ -0,0 +1,213 @@
+import asyncio
+import inspect
+import os
+import time
+import anthropic
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Union
+
+from internal.metrics import record_llm_call
+from llm.anthropic_llm_client import accumulate_usage, add_partial_output, add_timings
+from llm.prompt_blocks import PromptContent, prepare_cached_prompts
+from llm.rate_limiter import RateLimiter, estimate_prompt_tokens
+from llm.response_cache import LLMResponseCache
+
+
+async def aclose_stream(stream) -> None:
+    """Close the SDK's async stream (and its HTTP response) if it has not run to the end"""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+
+class AsyncAnthropicLLMClient:
+    """Asyncio counterpart of AnthropicLLMClient with the same generate/generate_stream surface"""
+
+    def __init__(self, api_key: str = None, model: str = "claude-sonnet-4-20250514",
+                 cache: Optional[LLMResponseCache] = None, prompt_caching: bool = True,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.model = model
+        self.cache = cache
+        # Send cache_control breakpoints so static prompt prefixes are reused across calls
+        self.prompt_caching = prompt_caching
+
+        if not self.api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable or api_key parameter required")
+
+        # The limiter owns retries (with backoff shared across calls); the SDK's own retries are off then
+        self.rate_limiter = rate_limiter
+        client_options = {"max_retries": 0} if rate_limiter is not None else {}
+        self.client = anthropic.AsyncAnthropic(api_key=self.api_key, **client_options)
+
+    def _cache_key(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                   max_tokens: int, temperature: float) -> str:
+        return LLMResponseCache.make_key(
+            self.model, system_prompt, user_prompt,
+            max_tokens=max_tokens, temperature=temperature
+        )
+
+    async def _create_stream(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                             max_tokens: int, temperature: float, usage_info: Dict[str, Any]):
+        """Open the streaming request, within the rate limiter's budget when one is set"""
+        system, content = prepare_cached_prompts(system_prompt, user_prompt, self.prompt_caching)
+
+        async def create():
+            return await self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system,
+                messages=[
+                    {"role": "user", "content": content}
+                ],
+                stream=True
+            )
+
+        if self.rate_limiter is None:
+            return await create()
+        # Shorter calls (small prompt, small max_tokens) are scheduled first
+        estimated_tokens = estimate_prompt_tokens(system_prompt, user_prompt)
+        usage_info['estimated_input_tokens'] = estimated_tokens
+        usage_info['reserved_output_tokens'] = max_tokens
+        return await self.rate_limiter.acall(
+            create, estimated_tokens, priority=estimated_tokens + max_tokens, usage_info=usage_info,
+            output_tokens=max_tokens
+        )
+
+    def _settle(self, usage_info: Dict[str, Any]):
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(usage_info.pop('estimated_input_tokens', 0), usage_info,
+                                    usage_info.pop('reserved_output_tokens', 0))
+
+    async def generate(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs):
+        """Generate response using Anthropic Claude with streaming (returns full response)"""
+        max_tokens = kwargs.get('max_tokens', 2048)
+        temperature = kwargs.get('temperature', 0.1)
+        start = time.perf_counter()
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(system_prompt, user_prompt, max_tokens, temperature)
+            # SQLite is blocking; keep it off the event loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                response, usage_info = cached
+                record_llm_call({'cache_hit': True, 'latency_seconds': time.perf_counter() - start})
+                return response, {**usage_info, 'cache_hit': True}
+
+        try:
+            usage_info = {}
+            stream = await self._create_stream(system_prompt, user_prompt, max_tokens, temperature, usage_info)
+
+            parts = []
+            first_token_at = None
+            complete = False
+            try:
+                async for chunk in stream:
+                    if chunk.type == "content_block_delta":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(chunk.delta.text)
+                    else:
+                        accumulate_usage(usage_info, chunk)
+                complete = True
+            finally:
+                # Interrupted calls (errors, cancellation) still used budget: settle and report them
+                if not complete:
+                    await aclose_stream(stream)
+                    add_partial_output(usage_info, parts)
+                add_timings(usage_info, start, first_token_at)
+                self._settle(usage_info)
+                record_llm_call(usage_info)
+
+            full_response = "".join(parts)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, full_response, usage_info)
+
+            return full_response, usage_info
+
+        except Exception as e:
+            print(f"LLM generation error: {str(e)}")
+            raise
+
+    async def generate_stream(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs) -> AsyncIterator[str]:
+        """Generate response using Anthropic Claude with streaming"""
+        max_tokens = kwargs.get('max_tokens', 32000)
+        temperature = kwargs.get('temperature', 0.1)
+        start = time.perf_counter()
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(system_prompt, user_prompt, max_tokens, temperature)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                record_llm_call({'cache_hit': True, 'latency_seconds': time.perf_counter() - start})
+                # Replay the cached response as a single chunk
+                yield cached[0]
+                return
+
+        try:
+            usage_info = {}
+            stream = await self._create_stream(system_prompt, user_prompt, max_tokens, temperature, usage_info)
+
+            chunks = []
+            first_token_at = None
+            complete = False
+            try:
+                async for chunk in stream:
+                    if chunk.type == "content_block_delta":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks.append(chunk.delta.text)
+                        yield chunk.delta.text
+                    else:
+                        accumulate_usage(usage_info, chunk)
+                complete = True
+            finally:
+                # Also runs when the caller stops early (aclose() raises GeneratorExit at the yield):
+                # the SDK stream is closed and the tokens generated so far are settled and reported
+                if not complete:
+                    await aclose_stream(stream)
+                    add_partial_output(usage_info, chunks)
+                add_timings(usage_info, start, first_token_at)
+                self._settle(usage_info)
+                record_llm_call(usage_info)
+
+            # Only complete streams are cached; an abandoned generator never reaches here
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, "".join(chunks))
+
+        except Exception as e:
+            print(f"LLM streaming error: {str(e)}")
+            raise
+
+    async def generate_with_callback(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                                     callback: Callable[[str], Union[None, Awaitable[None]]], **kwargs) -> str:
+        """Generate response with a (sync or async) callback function for each chunk"""
+        parts = []
+        try:
+            async for chunk in self.generate_stream(system_prompt, user_prompt, **kwargs):
+                parts.append(chunk)
+                result = callback(chunk)  # Call the callback with each chunk
+                if inspect.isawaitable(result):
+                    await result
+
+            return "".join(parts)
+
+        except Exception as e:
+            print(f"LLM generation error: {str(e)}")
+            raise
+
+
+async def agenerate(llm_client, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs):
+    """
+    Await `generate` on either client flavour.
+    Sync clients are offloaded to a worker thread so they never block the event loop.
+    """
+    if inspect.iscoroutinefunction(llm_client.generate):
+        return await llm_client.generate(system_prompt=system_prompt, user_prompt=user_prompt, **kwargs)
+    return await asyncio.to_thread(
+        llm_client.generate, system_prompt=system_prompt, user_prompt=user_prompt, **kwargs
+    )
@@ -0,0 +1,227 @@
+"""
+Offline generation through the Message Batches API.
+
+The pipeline is run in rounds. During a round BatchCollectingLLMClient answers every call it
+already has a result for and records the others as pending batch requests (the call raises
+BatchPending, so the module fails for that round). The pending requests are submitted as one
+message batch, and once it has ended the results are fed back and the pipelines run again,
+until a round completes without new requests. Each round unlocks one level of dependent calls.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from internal.metrics import current_module_name, record_llm_call
+from llm.prompt_blocks import PromptContent, prepare_cached_prompts
+from llm.response_cache import LLMResponseCache
+
+# The Batches API accepts up to 100,000 requests or 256 MB per batch. Requirement prompts embed
+# whole endpoint folders and specs (tens of KB each), so batches are capped well below the request
+# limit to stay under the size limit; MessageBatchRunner splits larger rounds into several batches.
+MAX_REQUESTS_PER_BATCH = 10000
+
+
+class BatchPending(Exception):
+    """The call was queued for the next message batch; its result is available next round"""
+
+
+class BatchCollectingLLMClient:
+    """
+    Drop-in LLM client (generate / generate_stream) for batch rounds.
+
+    Calls made after a module of the same run went pending are not recorded: their prompts
+    would be built from missing upstream output. They are requested in a later round instead.
+    """
+
+    def __init__(self, model: str = "claude-sonnet-4-20250514", prompt_caching: bool = True,
+                 cache: Optional[LLMResponseCache] = None):
+        self.model = model
+        self.prompt_caching = prompt_caching
+        # Results are also stored in the response cache so the live path can reuse them
+        self.cache = cache
+        self._lock = threading.Lock()
+        # custom_id -> Messages API params of requests for the next batch
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # custom_id -> (response, usage_info) or an error message
+        self._results: Dict[str, Any] = {}
+        self._pending_modules: set = set()
+        # Whether a call of the current run raised BatchPending
+        self._run_pending = False
+
+    def begin_run(self):
+        """Call before running the pipeline of the next contract"""
+        with self._lock:
+            self._pending_modules = set()
+            self._run_pending = False
+
+    @property
+    def run_pending(self) -> bool:
+        """True when the current run could not complete: one of its calls awaits a batch"""
+        with self._lock:
+            return self._run_pending
+
+    def take_pending(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def add_results(self, results: Dict[str, Any]):
+        with self._lock:
+            self._results.update(results)
+        if self.cache is not None:
+            for custom_id, result in results.items():
+                if isinstance(result, tuple):
+                    self.cache.put(custom_id, *result)
+
+    def _lookup(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                max_tokens: int, temperature: float) -> Tuple[str, Dict[str, Any]]:
+        # The custom id is the response cache key (64 hex chars, within the API's custom_id limit)
+        custom_id = LLMResponseCache.make_key(
+            self.model, system_prompt, user_prompt,
+            max_tokens=max_tokens, temperature=temperature
+        )
+        module_name = current_module_name()
+
+        with self._lock:
+            result = self._results.get(custom_id)
+            if result is None and self.cache is not None:
+                result = self.cache.get(custom_id)
+            if isinstance(result, tuple):
+                response, usage_info = result
+                record_llm_call(usage_info)
+                return response, usage_info
+            if result is not None:
+                raise RuntimeError(f"Batch request failed: {result}")
+
+            if not self._pending_modules or module_name in self._pending_modules:
+                self._pending_modules.add(module_name)
+                system, content = prepare_cached_prompts(system_prompt, user_prompt, self.prompt_caching)
+                self._pending[custom_id] = {
+                    "model": self.model,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                    "system": system,
+                    "messages": [{"role": "user", "content": content}],
+                }
+            self._run_pending = True
+
+        raise BatchPending(f"Queued for the next message batch ({module_name or 'unknown module'})")
+
+    def generate(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs):
+        return self._lookup(system_prompt, user_prompt, kwargs.get('max_tokens', 2048), kwargs.get('temperature', 0.1))
+
+    def generate_stream(self, system_prompt: PromptContent, user_prompt: PromptContent, **kwargs) -> Iterator[str]:
+        response, _ = self._lookup(
+            system_prompt, user_prompt, kwargs.get('max_tokens', 32000), kwargs.get('temperature', 0.1)
+        )
+        yield response
+
+    def generate_with_callback(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                               callback: Callable[[str], None], **kwargs) -> str:
+        response = "".join(self.generate_stream(system_prompt, user_prompt, **kwargs))
+        callback(response)
+        return response
+
+
+class MessageBatchRunner:
+    """Submits requests as message batches and waits for their results"""
+
+    def __init__(self, batches_api, poll_interval: float = 30.0, max_requests_per_batch: int = MAX_REQUESTS_PER_BATCH):
+        # anthropic.Anthropic().messages.batches, or FakeMessageBatches
+        self.batches_api = batches_api
+        self.poll_interval = poll_interval
+        self.max_requests_per_batch = max_requests_per_batch
+
+    def run(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: custom_id -> (response, usage_info) for succeeded requests,
+                            or an error description for errored / canceled / expired ones.
+        """
+        items = list(requests.items())
+        batch_ids = []
+        for start in range(0, len(items), self.max_requests_per_batch):
+            chunk = items[start:start + self.max_requests_per_batch]
+            batch = self.batches_api.create(
+                requests=[{"custom_id": custom_id, "params": params} for custom_id, params in chunk]
+            )
+            print(f"[batch] Submitted batch {batch.id} with {len(chunk)} request(s)")
+            batch_ids.append(batch.id)
+
+        results = {}
+        for batch_id in batch_ids:
+            self._wait(batch_id)
+            results.update(self._collect(batch_id))
+        return results
+
+    def _wait(self, batch_id: str):
+        while True:
+            batch = self.batches_api.retrieve(batch_id)
+            if batch.processing_status == "ended":
+                return
+            counts = getattr(batch, "request_counts", None)
+            print(f"[batch] {batch_id}: {batch.processing_status} "
+                  f"({getattr(counts, 'processing', '?')} processing)")
+            time.sleep(self.poll_interval)
+
+    def _collect(self, batch_id: str) -> Dict[str, Any]:
+        results = {}
+        for entry in self.batches_api.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                message = result.message
+                text = "".join(getattr(block, "text", "") for block in message.content)
+                usage = message.usage
+                usage_info = {
+                    field: getattr(usage, field, None) or 0
+                    for field in ('input_tokens', 'output_tokens',
+                                  'cache_creation_input_tokens', 'cache_read_input_tokens')
+                }
+                usage_info['total_tokens'] = usage_info['input_tokens'] + usage_info['output_tokens']
+                usage_info['batch_id'] = batch_id
+                results[entry.custom_id] = (text, usage_info)
+            else:
+                error = getattr(result, "error", None)
+                results[entry.custom_id] = f"{result.type}: {error}" if error else result.type
+        return results
+
+
+class _Record:
+    """Attribute access over a dict, mimicking the SDK's response objects"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeMessageBatches:
+    """
+    Local stand-in for `client.messages.batches`, for dry runs and tests without the API.
+    `respond(params)` returns the text of each request; batches end after `latency_polls` polls.
+    """
+
+    def __init__(self, respond: Optional[Callable[[Dict[str, Any]], str]] = None, latency_polls: int = 1):
+        self.respond = respond or (lambda params: "Language: Unknown\nFramework: None")
+        self.latency_polls = latency_polls
+        self._batches: Dict[str, Dict[str, Any]] = {}
+
+    def create(self, requests: List[Dict[str, Any]]):
+        batch_id = f"msgbatch_fake_{len(self._batches) + 1}"
+        self._batches[batch_id] = {"requests": requests, "polls": 0}
+        return _Record(id=batch_id, processing_status="in_progress")
+
+    def retrieve(self, batch_id: str):
+        batch = self._batches[batch_id]
+        batch["polls"] += 1
+        status = "ended" if batch["polls"] > self.latency_polls else "in_progress"
+        pending = 0 if status == "ended" else len(batch["requests"])
+        return _Record(id=batch_id, processing_status=status, request_counts=_Record(processing=pending))
+
+    def results(self, batch_id: str):
+        for request in self._batches[batch_id]["requests"]:
+            text = self.respond(request["params"])
+            usage = _Record(input_tokens=len(str(request["params"]["messages"])) // 4,
+                            output_tokens=len(text) // 4,
+                            cache_creation_input_tokens=0, cache_read_input_tokens=0)
+            message = _Record(content=[_Record(type="text", text=text)], usage=usage)
+            yield _Record(custom_id=request["custom_id"], result=_Record(type="succeeded", message=message))
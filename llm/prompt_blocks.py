@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Tuple, Union
+
+# A prompt is either plain text or a list of Anthropic content blocks
+PromptContent = Union[str, List[Dict[str, Any]]]
+
+# The Messages API accepts at most four cache breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+
+def text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    """
+    A text content block. With cache=True the block ends a cacheable prefix: every block
+    up to and including it (system prompt first) is reused on the next identical request.
+    """
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = dict(EPHEMERAL_CACHE)
+    return block
+
+
+def to_text(content: PromptContent) -> str:
+    """Flatten a prompt to plain text (for logging, token estimation or fake clients)"""
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content)
+
+
+def to_blocks(content: PromptContent, cache: bool = False) -> List[Dict[str, Any]]:
+    """Normalize a prompt to content blocks; a plain string becomes one (optionally cached) block"""
+    if isinstance(content, str):
+        return [text_block(content, cache=cache)]
+    return [dict(block) for block in content]
+
+
+def strip_cache_control(content: PromptContent) -> PromptContent:
+    if isinstance(content, str):
+        return content
+    return [{key: value for key, value in block.items() if key != "cache_control"} for block in content]
+
+
+def prepare_cached_prompts(system_prompt: PromptContent, user_prompt: PromptContent,
+                           prompt_caching: bool = True) -> Tuple[PromptContent, PromptContent]:
+    """
+    Build the `system` and user `content` for a request.
+
+    With prompt caching on, a plain-string system prompt gets a breakpoint of its own and
+    only the last MAX_CACHE_BREAKPOINTS breakpoints are kept (the longest prefixes win).
+    With it off, every cache_control marker is removed.
+    """
+    if not prompt_caching:
+        return strip_cache_control(system_prompt), strip_cache_control(user_prompt)
+
+    system_blocks = to_blocks(system_prompt, cache=isinstance(system_prompt, str))
+    user_blocks = to_blocks(user_prompt) if not isinstance(user_prompt, str) else user_prompt
+
+    all_blocks = system_blocks + (user_blocks if isinstance(user_blocks, list) else [])
+    breakpoints = [block for block in all_blocks if "cache_control" in block]
+    for block in breakpoints[:-MAX_CACHE_BREAKPOINTS]:
+        del block["cache_control"]
+
+    return system_blocks, user_blocks
@@ -0,0 +1,358 @@
+"""
+Process-wide request and token budgeting for LLM calls.
+
+Like the API's own limits, input and output tokens are budgeted separately: every call takes
+one request from a requests-per-minute bucket, its estimated prompt from an input-tokens bucket
+and its max_tokens (capped at the bucket size) from an output-tokens bucket; once the response's
+usage_info is known both token buckets are settled with the real counts. Limits are opt-in and
+should match the account's tier; a bucket without a limit never holds a call back.
+
+Waiting calls are served in order of enqueue time plus the time the token buckets take to
+refill their size, so short calls (framework detection, summaries) are not stuck behind
+60k-token generations, yet a large call that has waited long enough goes ahead of newer
+short ones. Only the first call in line polls the buckets; the
+others sleep until the line moves. Failed calls get their tokens back and are retried with
+jittered exponential backoff, honoring retry-after headers; a 429 pauses every caller, not
+just the one that hit it.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import anthropic
+
+from llm.prompt_blocks import PromptContent, to_text
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors and overload
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def estimate_prompt_tokens(system_prompt: PromptContent, user_prompt: PromptContent) -> int:
+    """Rough input token count (~4 characters per token)"""
+    return (len(to_text(system_prompt)) + len(to_text(user_prompt))) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The delay the API asked for, from retry-after-ms or retry-after (seconds or HTTP date)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` per second up to `per_minute`. Not thread-safe."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity wait for a full bucket)"""
+        missing = min(amount, self.capacity) - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Token-bucket scheduler shared by every LLM call in the process; a None limit is unlimited"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, input_tokens_per_minute: Optional[float] = None,
+                 output_tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.input_tokens = TokenBucket(input_tokens_per_minute) if input_tokens_per_minute else None
+        self.output_tokens = TokenBucket(output_tokens_per_minute) if output_tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        # Heap of (deadline, ticket) for the calls waiting for budget
+        self._waiting = []
+        # Async waiters are woken through their own event loop: entry -> (loop, event)
+        self._async_waiters: Dict[tuple, tuple] = {}
+        self._tickets = itertools.count()
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        """
+        Build a limiter from the account's limits in LLM_REQUESTS_PER_MINUTE, LLM_INPUT_TOKENS_PER_MINUTE
+        and LLM_OUTPUT_TOKENS_PER_MINUTE. None (the SDK's own retries only) when none of them is set
+        or LLM_RATE_LIMIT_ENABLED=false.
+        """
+        if os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        limits = {
+            name: float(os.getenv(variable)) if os.getenv(variable) else None
+            for name, variable in (("requests_per_minute", "LLM_REQUESTS_PER_MINUTE"),
+                                   ("input_tokens_per_minute", "LLM_INPUT_TOKENS_PER_MINUTE"),
+                                   ("output_tokens_per_minute", "LLM_OUTPUT_TOKENS_PER_MINUTE"))
+        }
+        if not any(limits.values()):
+            return None
+        return cls(**limits, max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")))
+
+    # --- Budget ---
+
+    def _refill_seconds(self, size: float) -> float:
+        """Seconds the limited token buckets need to refill `size` tokens (0 without token limits)"""
+        rates = [bucket.rate for bucket in (self.input_tokens, self.output_tokens) if bucket is not None]
+        return size / sum(rates) if rates else 0.0
+
+    def _enqueue(self, size: float) -> tuple:
+        """
+        Queue a call of `size` tokens. Its deadline is the enqueue time plus the seconds the token
+        buckets need to refill that size: smaller calls go first, and waiting ages every call.
+        """
+        with self._condition:
+            entry = (time.monotonic() + self._refill_seconds(size), next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            return entry
+
+    def _notify(self):
+        """Wake every waiter (threads and event loops) to re-check the line. Call with the condition held."""
+        self._condition.notify_all()
+        for loop, event in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The waiter's loop is closed; it will never check the line again
+                pass
+
+    def _amounts(self, estimated_tokens: int, output_tokens: int) -> list:
+        """(bucket, amount) the call takes from each limited bucket; amounts above a bucket's size take all of it"""
+        amounts = [(self.requests, 1), (self.input_tokens, estimated_tokens), (self.output_tokens, output_tokens)]
+        return [(bucket, min(amount, bucket.capacity)) for bucket, amount in amounts if bucket is not None]
+
+    def _try_acquire(self, entry: tuple, estimated_tokens: int, output_tokens: int = 0) -> Optional[float]:
+        """
+        Take the budget if `entry` is first in line and it is available (0.0); else the seconds
+        to wait, or None when another call is ahead and the wait lasts until the line moves.
+        """
+        with self._condition:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._waiting[0] != entry:
+                return None
+
+            amounts = self._amounts(estimated_tokens, output_tokens)
+            for bucket, _ in amounts:
+                bucket.refill(now)
+            wait = max([bucket.wait_time(amount) for bucket, amount in amounts], default=0.0)
+            if wait > 0:
+                return wait
+
+            heapq.heappop(self._waiting)
+            for bucket, amount in amounts:
+                bucket.take(amount)
+            self._notify()
+            return 0.0
+
+    def acquire(self, estimated_tokens: int, priority: Optional[float] = None, output_tokens: int = 0) -> float:
+        """
+        Block until the call fits in the budget; returns the seconds spent waiting.
+        `estimated_tokens` is the prompt size, `output_tokens` the max_tokens reserved for the answer
+        and `priority` the call's size in tokens for ordering (default: estimated_tokens + output_tokens).
+        """
+        started = time.monotonic()
+        entry = self._enqueue(estimated_tokens + output_tokens if priority is None else priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(entry, estimated_tokens, output_tokens)
+                    if wait is not None and wait <= 0:
+                        return time.monotonic() - started
+                    # The condition is held from the check to the wait, so no notification is missed
+                    self._condition.wait(timeout=wait)
+        except BaseException:
+            self._abandon(entry)
+            raise
+
+    async def aacquire(self, estimated_tokens: int, priority: Optional[float] = None, output_tokens: int = 0) -> float:
+        """Async variant of acquire; waits on an event set from any thread instead of holding a worker thread"""
+        started = time.monotonic()
+        event = asyncio.Event()
+        entry = self._enqueue(estimated_tokens + output_tokens if priority is None else priority)
+        with self._condition:
+            self._async_waiters[entry] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                # Cleared before the check: a notification after it sets the event again
+                event.clear()
+                wait = self._try_acquire(entry, estimated_tokens, output_tokens)
+                if wait is not None and wait <= 0:
+                    return time.monotonic() - started
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(entry)
+            raise
+        finally:
+            with self._condition:
+                self._async_waiters.pop(entry, None)
+
+    def _abandon(self, entry: tuple):
+        with self._condition:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._notify()
+
+    def refund(self, estimated_tokens: int, output_tokens: int = 0):
+        """Give back the tokens taken for an attempt that failed before using them"""
+        with self._condition:
+            for bucket, amount in self._amounts(estimated_tokens, output_tokens):
+                if bucket is not self.requests:
+                    bucket.give(amount)
+            self._notify()
+
+    def settle(self, estimated_tokens: int, usage_info: Dict[str, Any], output_tokens: int = 0):
+        """
+        Correct the token buckets with the real usage once the call has finished. Input counts
+        what the API's input limit counts: uncached and cache-write tokens, not cache reads.
+        """
+        actual_input = (usage_info.get("input_tokens") or 0) + (usage_info.get("cache_creation_input_tokens") or 0)
+        actual_output = usage_info.get("output_tokens") or 0
+        if not actual_input and not actual_output:
+            return
+        with self._condition:
+            freed = False
+            for bucket, actual, taken in ((self.input_tokens, actual_input, estimated_tokens),
+                                          (self.output_tokens, actual_output, output_tokens)):
+                if bucket is None:
+                    continue
+                taken = min(taken, bucket.capacity)
+                bucket.take(actual - taken)
+                freed = freed or actual < taken
+            if freed:
+                self._notify()
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds` (after a 429)"""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # The first call in line is sleeping until its budget is due; make it wait out the pause
+            self._notify()
+
+    # --- Retries ---
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the API's retry-after"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        if isinstance(error, anthropic.APIStatusError) and error.status_code == 429:
+            self.pause(delay)
+        return delay
+
+    def _should_retry(self, attempt: int, error: Exception) -> bool:
+        return attempt < self.max_retries and is_retryable(error)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int, priority: Optional[float] = None,
+             usage_info: Optional[Dict[str, Any]] = None, output_tokens: int = 0) -> Any:
+        """Run `fn` within the budget, retrying retryable API errors. usage_info gets 'retries'."""
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens, priority, output_tokens)
+            try:
+                result = fn()
+                break
+            except Exception as e:
+                self.refund(estimated_tokens, output_tokens)
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                print(f"[rate_limiter] {type(e).__name__}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+
+        if usage_info is not None:
+            usage_info["retries"] = attempt
+        return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int, priority: Optional[float] = None,
+                    usage_info: Optional[Dict[str, Any]] = None, output_tokens: int = 0) -> Any:
+        """Async variant of call"""
+        attempt = 0
+        while True:
+            await self.aacquire(estimated_tokens, priority, output_tokens)
+            try:
+                result = await fn()
+                break
+            except Exception as e:
+                self.refund(estimated_tokens, output_tokens)
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                print(f"[rate_limiter] {type(e).__name__}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        if usage_info is not None:
+            usage_info["retries"] = attempt
+        return result
+
+
+_shared_rate_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter() -> Optional[RateLimiter]:
+    """The process-wide limiter built from the environment, shared by every client in the process"""
+    global _shared_rate_limiter
+    with _shared_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = RateLimiter.from_env()
+        return _shared_rate_limiter
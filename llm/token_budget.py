@@ -0,0 +1,228 @@
+"""
+Token estimation and prompt budgeting.
+
+TokenCounter approximates Claude's tokenizer locally (word pieces of ~4 characters, one token
+per punctuation mark), optionally deferring to the API's count_tokens endpoint. BudgetPlanner
+knows the model's context window and output limit, sizes `max_tokens` from the prompt actually
+sent, and trims long markdown inputs to whole sections that fit a token budget.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from internal.markdown_sections import parse_sections
+from llm.prompt_blocks import PromptContent, prepare_cached_prompts, to_text
+
+# model prefix -> (context window, max output tokens)
+MODEL_LIMITS = {
+    "claude-opus-4": (200000, 32000),
+    "claude-sonnet-4": (200000, 64000),
+    "claude-3-7-sonnet": (200000, 64000),
+    "claude-3-5-haiku": (200000, 8192),
+    "claude-3-5-sonnet": (200000, 8192),
+}
+DEFAULT_LIMITS = (200000, 8192)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Local approximation of the token count of `text`"""
+    if not text:
+        return 0
+    count = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        piece = match.group(0)
+        count += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    # Runs of newlines and indentation are tokens too
+    return count + text.count("\n") // 2
+
+
+def api_count_fn(api_key: str, model: str) -> Callable[[PromptContent, PromptContent], int]:
+    """Exact prompt token counts from the Messages API's count_tokens endpoint"""
+    import anthropic
+
+    client = anthropic.Anthropic(api_key=api_key)
+
+    def count(system_prompt: PromptContent, user_prompt: PromptContent) -> int:
+        system, content = prepare_cached_prompts(system_prompt, user_prompt, False)
+        result = client.messages.count_tokens(
+            model=model,
+            system=system,
+            messages=[{"role": "user", "content": content}]
+        )
+        return result.input_tokens
+
+    return count
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens, with the local approximation by default.
+    `count_fn(system_prompt, user_prompt)` (e.g. AnthropicLLMClient.count_tokens) makes counts exact;
+    results are memoized by content hash.
+    """
+
+    def __init__(self, count_fn: Optional[Callable[[PromptContent, PromptContent], int]] = None,
+                 max_entries: int = 1024):
+        self.count_fn = count_fn
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None, model: str = "claude-sonnet-4-20250514") -> "TokenCounter":
+        """LLM_TOKEN_COUNT_API=true counts prompts with the count_tokens endpoint (one extra request per call)"""
+        if os.getenv("LLM_TOKEN_COUNT_API", "false").lower() not in ("1", "true", "yes"):
+            return cls()
+        return cls(count_fn=api_count_fn(api_key or os.getenv("ANTHROPIC_API_KEY"), model))
+
+    def count_text(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def count_prompt(self, system_prompt: PromptContent, user_prompt: PromptContent) -> int:
+        system_text, user_text = to_text(system_prompt), to_text(user_prompt)
+        if self.count_fn is None:
+            return estimate_tokens(system_text) + estimate_tokens(user_text)
+
+        key = hashlib.sha256(f"{system_text}\0{user_text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        try:
+            count = self.count_fn(system_prompt, user_prompt)
+        except Exception as e:
+            print(f"[WARNING] Token counting failed, using the local estimate: {e}")
+            return estimate_tokens(system_text) + estimate_tokens(user_text)
+
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+
+class BudgetPlanner:
+    """Sizes prompt slices and `max_tokens` against the model's limits"""
+
+    def __init__(self, model: str = "", counter: Optional[TokenCounter] = None,
+                 context_window: Optional[int] = None, max_output_tokens: Optional[int] = None,
+                 safety_margin: float = 0.05):
+        default_context, default_output = next(
+            (limits for prefix, limits in MODEL_LIMITS.items() if model.startswith(prefix)), DEFAULT_LIMITS
+        )
+        self.model = model
+        self.counter = counter or TokenCounter()
+        self.context_window = context_window or default_context
+        self.max_output_tokens = max_output_tokens or default_output
+        # Head-room for the tokenizer approximation and message framing
+        self.safety_margin = safety_margin
+
+    @classmethod
+    def for_client(cls, llm_client, counter: Optional[TokenCounter] = None) -> "BudgetPlanner":
+        return cls(model=getattr(llm_client, "model", "") or "", counter=counter)
+
+    def count(self, text: str) -> int:
+        return self.counter.count_text(text)
+
+    def input_budget(self, reserved_output: int) -> int:
+        """Tokens left for the prompt once `reserved_output` tokens are kept for the answer"""
+        usable = int(self.context_window * (1 - self.safety_margin))
+        return max(0, usable - reserved_output)
+
+    def max_tokens(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                   expected_output: int, minimum: int = 256) -> int:
+        """
+        `max_tokens` for a prompt: the expected output size, capped by the model's output limit
+        and by what is left of the context window, never below `minimum`.
+        """
+        input_tokens = self.counter.count_prompt(system_prompt, user_prompt)
+        room = int(self.context_window * (1 - self.safety_margin)) - input_tokens
+        budget = min(max(expected_output, minimum), self.max_output_tokens, room)
+        if budget < minimum:
+            raise ValueError(
+                f"Prompt of ~{input_tokens} tokens leaves no room for the answer in "
+                f"{self.model or 'the model'}'s {self.context_window}-token context window"
+            )
+        return budget
+
+    def fit_sections(self, text: str, budget_tokens: int, exclude_titles: Tuple[str, ...] = ()) -> str:
+        """
+        The longest prefix of `text` made of whole markdown sections within `budget_tokens`.
+        Sections that do not fit are replaced by their heading, so the outline stays complete;
+        sections titled in `exclude_titles` are dropped.
+        """
+        excluded = {title.lower() for title in exclude_titles}
+        if not excluded and self.count(text) <= budget_tokens:
+            return text
+
+        root = parse_sections(text)
+        if not root.children:
+            return self._fit_paragraphs(text, budget_tokens)
+
+        # Content before the first heading
+        parts = []
+        used = 0
+        preamble = text[:root.children[0].start]
+        if preamble.strip():
+            preamble = self._fit_paragraphs(preamble, budget_tokens)
+            parts.append(preamble)
+            used += self.count(preamble)
+
+        def add(section):
+            nonlocal used
+            if section.title.lower() in excluded:
+                return
+            chunk = text[section.start:section.end]
+            tokens = self.count(chunk)
+            if used + tokens <= budget_tokens:
+                parts.append(chunk)
+                used += tokens
+                return
+            heading = text[section.start:section.body_start]
+            body_end = section.children[0].start if section.children else section.end
+            intro = text[section.body_start:body_end]
+            heading_tokens = self.count(heading)
+            if used + heading_tokens > budget_tokens:
+                return
+            parts.append(heading)
+            used += heading_tokens
+            if intro.strip() and used + self.count(intro) <= budget_tokens:
+                parts.append(intro)
+                used += self.count(intro)
+            for child in section.children:
+                add(child)
+
+        for section in root.children:
+            add(section)
+        return "".join(parts)
+
+    def fit_text(self, text: str, budget_tokens: int) -> str:
+        """The longest prefix of `text` made of whole lines within `budget_tokens` (for code)"""
+        if self.count(text) <= budget_tokens:
+            return text
+        parts, used = [], 0
+        for line in text.splitlines(keepends=True):
+            tokens = self.count(line)
+            if used + tokens > budget_tokens:
+                break
+            parts.append(line)
+            used += tokens
+        return "".join(parts)
+
+    def _fit_paragraphs(self, text: str, budget_tokens: int) -> str:
+        """Whole paragraphs of unstructured text within the budget"""
+        parts, used = [], 0
+        for paragraph in re.split(r"(?<=\n\n)", text):
+            tokens = self.count(paragraph)
+            if used + tokens > budget_tokens:
+                break
+            parts.append(paragraph)
+            used += tokens
+        return "".join(parts)
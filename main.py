@@ -1,130 +1,297 @@
-import pika
 import json
+import os
+import signal
 import time
+import functools
+import uuid
+import tempfile
 import threading
-import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from agents.refiner_core import CoreRefinerState
-from agents.agent_setup import setup_refiner_framework
+# pika, LangGraph and the Anthropic SDK are imported where they are first needed (main(),
+# get_framework()), so tools importing this module for its helpers start fast
+from agents.bian_core import CoreBianState
+from internal.worker_pool import BoundedWorkerPool
+from internal.single_flight import SingleFlight
+from internal.run_manifest import fingerprint_text
+from internal.streaming_output import DEFAULT_FILE_MODE
+
+if TYPE_CHECKING:
+    from internal.amqp_consumer import AmqpConsumer, AmqpDelivery
 
 
 # --- Connection Details ---
 RABBIT_HOST = 'localhost'
 RABBIT_USER = 'guest'
 RABBIT_PASS = 'guest'
-CREDENTIALS = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
+
+# --- Connection Tuning ---
+# Heartbeats are answered by the I/O loop even while runs take minutes
+AMQP_HEARTBEAT = int(os.getenv('AMQP_HEARTBEAT', '60'))
+# Seconds to wait while the broker blocks publishing (resource alarm) before dropping the connection
+AMQP_BLOCKED_TIMEOUT = float(os.getenv('AMQP_BLOCKED_TIMEOUT', '300'))
+# Results are published in batches of up to this many, at least every AMQP_CONFIRM_FLUSH_SECONDS
+AMQP_CONFIRM_BATCH_SIZE = int(os.getenv('AMQP_CONFIRM_BATCH_SIZE', '50'))
+AMQP_CONFIRM_FLUSH_SECONDS = float(os.getenv('AMQP_CONFIRM_FLUSH_SECONDS', '0.2'))
+# Upper bound of the exponential backoff between reconnection attempts
+AMQP_MAX_RECONNECT_DELAY = float(os.getenv('AMQP_MAX_RECONNECT_DELAY', '30'))
 
 # --- Queue Names ---
 INPUT_QUEUE_NAME = 'bian_queue'
 OUTPUT_QUEUE_NAME = 'generator_queue'
 
+# --- Worker Pool ---
+# Number of concurrent pipeline runs; also drives the broker prefetch count
+WORKER_POOL_SIZE = int(os.getenv('WORKER_POOL_SIZE', '4'))
+# 'thread' or 'process'
+WORKER_POOL_KIND = os.getenv('WORKER_POOL_KIND', 'thread')
+# Deliveries allowed to wait for a free worker on top of WORKER_POOL_SIZE
+WORKER_POOL_BACKLOG = int(os.getenv('WORKER_POOL_BACKLOG', '0'))
+# Seconds to wait for in-flight runs on shutdown before giving up
+WORKER_DRAIN_TIMEOUT = float(os.getenv('WORKER_DRAIN_TIMEOUT', '600'))
+# Deliveries of a contract whose identical run is already in flight wait for its result
+COALESCE_DUPLICATE_RUNS = os.getenv('COALESCE_DUPLICATE_RUNS', 'true').lower() not in ('0', 'false', 'no')
+
+# --- Output ---
+# Documents are written to output/, shared by every run. With OUTPUT_PER_MESSAGE=true each run writes
+# to its message's own "output" folder instead, so concurrent runs never overwrite each other's files
+OUTPUT_PER_MESSAGE = os.getenv('OUTPUT_PER_MESSAGE', 'false').lower() in ('1', 'true', 'yes')
+
 def save_requirements(requirements: str, output_dir: str = "output", file_name: str = "api_requirements.md"):
-    """Save the generated requirements to a markdown file."""
+    """Save the generated requirements to a markdown file (temp file + rename, never half-written)."""
     os.makedirs(output_dir, exist_ok=True)
     output_path = Path(output_dir) / file_name
     
-    with open(output_path, 'w', encoding='utf-8') as f:
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f".{file_name}.")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
         f.write(requirements)
+    # Readable like a file written in place (mkstemp creates it 0600)
+    os.chmod(tmp_path, DEFAULT_FILE_MODE)
+    os.replace(tmp_path, output_path)
     
     print(f"\n✅ Requirements saved to: {output_path.absolute()}")
 
-def do_work(channel, delivery_tag, body):
+def save_contract_requirements(contract_requirements: dict, output_dir: str = "output"):
+    """With several contracts, save each contract's document next to the merged index."""
+    if len(contract_requirements or {}) > 1:
+        for name, requirements in contract_requirements.items():
+            save_requirements(requirements, output_dir=output_dir, file_name=f"api_requirements_{name}.md")
+
+# Long-lived framework shared by every run in this process (one per worker process)
+_framework = None
+_framework_lock = threading.Lock()
+
+def get_framework():
     """
-    This function runs in a separate thread and performs the slow task.
+    Build the agent framework (LLM client, file reader, modules, compiled graph) once per process.
+    The framework holds no per-run state, so concurrent worker threads can share it.
     """
-    message = json.loads(body.decode())
-    print(f"    [Thread] Starting long-running task for message: {message}")
+    global _framework
+    with _framework_lock:
+        if _framework is None:
+            print("🔧 Setting up agent framework...")
+            from agents.agent_setup import setup_agent_framework
+            from agents.module_registry import get_module_registry
+            _framework = setup_agent_framework(None, api_key=os.getenv('ANTHROPIC_API_KEY'))
+            print(get_module_registry().format_import_report())
+        return _framework
+
+class PipelineFailed(Exception):
+    """A run finished with module errors and its delivery is requeued to resume from its checkpoint"""
+
+
+def get_run_id(properties) -> str:
+    """
+    Id of a delivery's run, used to checkpoint it so a redelivery resumes it.
+    Only the producer's message_id is stable across redeliveries; without one every delivery
+    gets its own id (identical bodies must not share a checkpoint thread) and cannot resume.
+    """
+    if has_stable_run_id(properties):
+        return str(properties.message_id)
+    return uuid.uuid4().hex
+
+def has_stable_run_id(properties) -> bool:
+    return properties is not None and bool(properties.message_id)
+
+def get_contract_fingerprint(body: bytes) -> Optional[str]:
+    """
+    Key of a message's pipeline inputs, for coalescing duplicate deliveries.
+    Covers the contract and output folders and the name, size and mtime of every input file
+    (stat only: this runs on the connection's I/O thread). None when the body is not a contract message.
+    """
+    try:
+        message = json.loads(body.decode())
+        bian_dir = Path(message['bianContract']) / 'output'
+        endpoints_dir = Path(message['output']) / 'reqs'
+    except (ValueError, KeyError, TypeError):
+        return None
 
-    initial_state = CoreBianState(
+    entries = [f"contract:{message['bianContract']}", f"output:{message['output']}"]
+    for directory, pattern in ((bian_dir, '*.json'), (endpoints_dir, '*')):
+        for path in sorted(directory.glob(pattern)):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+    return fingerprint_text("\n".join(entries))
+
+def build_initial_state(message: dict, run_id: str = None, output_dir: Optional[str] = None) -> CoreBianState:
+    """
+    Pipeline input for one queue message ({"bianContract": ..., "output": ...}).
+    Documents go to `output_dir`, else the message's output folder with OUTPUT_PER_MESSAGE, else output/.
+    """
+    if output_dir is None:
+        output_dir = message['output'] if OUTPUT_PER_MESSAGE else "output"
+    return CoreBianState(
         errors=[],
         module_results={},
         target_architecture="multimodule_dinners",
         bian_dir=message['bianContract']+'/output', 
-        endpoints_dir=message['output']+'/reqs'
+        endpoints_dir=message['output']+'/reqs',
+        output_dir=output_dir,
+        run_id=run_id
     )
 
-    # Setup and run the framework
+def run_pipeline(body: bytes, run_id: str = None, received_at: float = None,
+                 resume_on_failure: bool = False) -> dict:
+    """
+    Runs the full agent pipeline for one message inside a pool worker.
+    Must stay a module-level function so it can be pickled for the process pool.
+
+    With `resume_on_failure` (a first delivery with a stable run id), a run ending with module
+    errors raises PipelineFailed: the delivery is requeued and its redelivery resumes at the
+    failed module. Otherwise the run is acked with its errors and its checkpoint is cleared.
+    """
+    message = json.loads(body.decode())
+    # Time the delivery spent waiting for a free worker
+    queue_wait = time.time() - received_at if received_at else 0.0
+    print(f"    [Worker] Starting long-running task for message: {message} (waited {queue_wait:.2f}s)")
+
+    initial_state = build_initial_state(message, run_id)
+    initial_state["module_results"] = {"consumer": {"metrics": {"queue_wait_seconds": round(queue_wait, 4)}}}
+
+    # Run the shared framework
     print("🚀 Starting analysis...")
-    framework = setup_agent_framework(initial_state, api_key=os.getenv('ANTHROPIC_API_KEY'))
-    final_state = framework.start_analysis(initial_state)
+    framework = get_framework()
+    final_state = framework.start_analysis(initial_state, run_id=run_id)
 
     # Print summary
     print("\n📊 Analysis Complete!")
     print(f"🔍 Detected Language: {final_state.get('target_language', 'Unknown')}")
     print(f"🛠️  Detected Framework: {final_state.get('target_framework', 'Unknown')}")
     
-    # Save requirements if they were generated
+    # Save requirements if they were generated (modules streaming their output already wrote them)
     if 'updated_requirements' in final_state:
-        save_requirements(final_state['updated_requirements'], file_name="updated_requirements.md")
-        save_requirements(final_state['generated_requirements'], file_name="api_requirements.md")
+        module_results = final_state.get('module_results', {})
+        output_dir = initial_state['output_dir']
+        if not module_results.get('project_structure', {}).get('output_file'):
+            save_requirements(final_state['updated_requirements'], output_dir=output_dir,
+                              file_name="updated_requirements.md")
+        if not module_results.get('requirement_generator', {}).get('output_file'):
+            save_requirements(final_state['generated_requirements'], output_dir=output_dir,
+                              file_name="api_requirements.md")
+            save_contract_requirements(final_state.get('contract_requirements'), output_dir=output_dir)
     
     # Print any errors that occurred
     if final_state.get('errors'):
         print("\n❌ Errors encountered:")
         for error in final_state['errors']:
             print(f"- {error}")
+        if resume_on_failure:
+            # The checkpoint is kept for the requeued delivery
+            raise PipelineFailed(f"Run {run_id} failed: {'; '.join(final_state['errors'])}")
+        # Acked with errors: nothing will resume this run
+        framework.clear_checkpoint(run_id)
 
-    print(f"    [Thread] Task finished. Scheduling {len(messages_to_publish)} result(s) to be published.")
-
-    def publish_result():
-        channel.basic_publish(
-            exchange='',
-            routing_key=OUTPUT_QUEUE_NAME,
-            body=json.dumps(message)
-        )
-        print(f"[*] Sent result message to queue '{OUTPUT_QUEUE_NAME}'.\n")
-        # Acknowledge the message only after the work is done and published
-        channel.basic_ack(delivery_tag=delivery_tag)
+    print("    [Worker] Task finished. Scheduling result to be published.")
+    return message
 
-    # Ask the main I/O loop to run the publish_result function
-    channel.connection.add_callback_threadsafe(publish_result)
 
-
-def process_message(channel, method, properties, body):
+def process_message(consumer: "AmqpConsumer", delivery: "AmqpDelivery", pool: BoundedWorkerPool,
+                    single_flight: Optional[SingleFlight] = None):
     """
-    This callback is now very fast. It just starts a new thread.
+    Runs on the connection's I/O loop and returns right away. It hands the delivery to the
+    bounded worker pool, or, with `single_flight`, attaches it to an identical run already in flight.
     """
-    print(f"[*] Received message. Offloading to a worker thread.")
-
-    # Create and start a new thread to do the actual work
-    worker_thread = threading.Thread(
-        target=do_work,
-        args=(channel, method.delivery_tag, body)
+    body = delivery.body
+    key = get_contract_fingerprint(body) if single_flight is not None else None
+    # A failed first delivery is requeued once (see AmqpConsumer.settle_when_done); it can resume
+    # from its checkpoint only when its run id survives the redelivery
+    resume_on_failure = has_stable_run_id(delivery.properties) and not delivery.redelivered
+    submit = functools.partial(
+        pool.try_submit, run_pipeline, body, get_run_id(delivery.properties), time.time(), resume_on_failure
     )
-    worker_thread.start()
+    future, shared = single_flight.run(key, submit) if single_flight is not None else (submit(), False)
+    if future is None:
+        # Only reachable if the broker delivers beyond our prefetch window or we are draining
+        print(f"[!] Worker pool saturated ({pool.in_flight} in flight). Requeueing delivery.")
+        consumer.reject(delivery, requeue=True)
+        return
+
+    result = None
+    if shared:
+        # Answer with this delivery's own message once the shared run completes
+        result = json.loads(body.decode())
+        print(f"[*] Received duplicate of an in-flight run ({key[:12]}). Waiting for its result "
+              f"({single_flight.coalesced} coalesced so far).")
+    else:
+        print(f"[*] Received message. Offloaded to worker pool "
+              f"({pool.in_flight}/{pool.capacity} in flight, {pool.queue_depth} waiting).")
+
+    # The consumer publishes the result once the run completes and acks after the broker confirms it
+    consumer.settle_when_done(delivery, future, result)
 
 
 def main():
     """Main function to set up the connection and start consuming."""
-    connection = pika.BlockingConnection(
+    import pika
+    from internal.amqp_consumer import AmqpConsumer
+
+    pool = BoundedWorkerPool(
+        max_workers=WORKER_POOL_SIZE,
+        kind=WORKER_POOL_KIND,
+        max_backlog=WORKER_POOL_BACKLOG
+    )
+
+    # Duplicate deliveries do not take a worker, but they still count against the prefetch window
+    single_flight = SingleFlight() if COALESCE_DUPLICATE_RUNS else None
+    consumer = AmqpConsumer(
         pika.ConnectionParameters(
             host=RABBIT_HOST,
-            credentials=CREDENTIALS
-        )
+            credentials=pika.PlainCredentials(RABBIT_USER, RABBIT_PASS),
+            heartbeat=AMQP_HEARTBEAT,
+            blocked_connection_timeout=AMQP_BLOCKED_TIMEOUT
+        ),
+        input_queue=INPUT_QUEUE_NAME,
+        output_queue=OUTPUT_QUEUE_NAME,
+        on_message=functools.partial(process_message, pool=pool, single_flight=single_flight),
+        prefetch_count=pool.prefetch_count,
+        confirm_batch_size=AMQP_CONFIRM_BATCH_SIZE,
+        confirm_flush_interval=AMQP_CONFIRM_FLUSH_SECONDS,
+        max_reconnect_delay=AMQP_MAX_RECONNECT_DELAY
     )
-    channel = connection.channel()
 
-    channel.queue_declare(queue=INPUT_QUEUE_NAME, durable=True)
-    channel.queue_declare(queue=OUTPUT_QUEUE_NAME, durable=True)
+    # Thread workers share this process's framework: build it while the connection opens
+    # instead of on the first delivery (process workers build their own)
+    if pool.kind == "thread":
+        threading.Thread(target=get_framework, name="framework-setup", daemon=True).start()
 
-    # Prevents the consumer from grabbing all messages at once if they are busy
-    channel.basic_qos(prefetch_count=1)
+    # Treat SIGTERM (e.g. container stop) like CTRL+C so in-flight runs can drain
+    signal.signal(signal.SIGTERM, lambda signum, frame: consumer.stop())
 
-    channel.basic_consume(
-        queue=INPUT_QUEUE_NAME,
-        on_message_callback=process_message
-    )
+    print(f"[*] Consuming '{INPUT_QUEUE_NAME}' with {pool.max_workers} {pool.kind} worker(s). To exit press CTRL+C")
+    # The I/O loop keeps running while in-flight runs drain, so their results are still published
+    consumer.run(drain_check=lambda: pool.in_flight == 0, drain_timeout=WORKER_DRAIN_TIMEOUT)
 
-    print(f"[*] Waiting for messages on queue '{INPUT_QUEUE_NAME}'. To exit press CTRL+C")
-    try:
-        channel.start_consuming()
-    except KeyboardInterrupt:
-        print("[-] Stopping consumer.")
-        connection.close()
+    print(f"[-] Consumer stopped. Shutting down the worker pool ({pool.in_flight} run(s) still in flight)...")
+    if not pool.drain(timeout=0):
+        print("[!] Runs cancelled. Their deliveries will be redelivered by the broker.")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory with the persistent LLM response cache turned off"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    return tmp_path
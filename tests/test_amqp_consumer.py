@@ -0,0 +1,174 @@
+import json
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+import pytest
+from pika.spec import Basic
+
+from internal.amqp_consumer import AmqpConsumer
+
+
+class Record:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeIOLoop:
+    """Runs callbacks and timers when the test says so"""
+
+    def __init__(self):
+        self.callbacks: List[Callable[[], None]] = []
+        self.timers: List[list] = []
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+    def call_later(self, delay: float, callback):
+        timer = [delay, callback]
+        self.timers.append(timer)
+        return timer
+
+    def remove_timeout(self, timer):
+        if timer in self.timers:
+            self.timers.remove(timer)
+
+    def run_callbacks(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+    def fire_timers(self):
+        timers, self.timers = self.timers, []
+        for _, callback in timers:
+            callback()
+
+
+class FakeChannel:
+    """Records publishes, acks and nacks; confirms are sent by the test"""
+
+    def __init__(self):
+        self.is_open = True
+        self.published: List[Any] = []
+        self.acks: List[tuple] = []
+        self.nacks: List[tuple] = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append(json.loads(body))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.nacks.append((delivery_tag, requeue))
+
+
+@pytest.fixture
+def consumer():
+    received = []
+    consumer = AmqpConsumer(None, "in", "out", on_message=lambda _consumer, delivery: received.append(delivery),
+                            confirm_batch_size=3, confirm_flush_interval=0.2)
+    consumer.ioloop = FakeIOLoop()
+    consumer.channel = FakeChannel()
+    consumer.received = received
+    consumer._connection = Record(ioloop=consumer.ioloop, is_closed=False, is_closing=False)
+    consumer._channel = consumer.channel
+    consumer._generation = 1
+    return consumer
+
+
+def deliver(consumer, tag: int, redelivered: bool = False):
+    consumer._on_delivery(consumer.channel, Record(delivery_tag=tag, redelivered=redelivered),
+                          Record(message_id=f"msg-{tag}"), b"{}")
+    return consumer.received[-1]
+
+
+def finish(consumer, delivery, result=None, error=None):
+    future = Future()
+    consumer.settle_when_done(delivery, future)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    consumer.ioloop.run_callbacks()
+
+
+def confirm(consumer, seq: int, multiple: bool = False, ack: bool = True):
+    method = Basic.Ack(delivery_tag=seq, multiple=multiple) if ack else Basic.Nack(delivery_tag=seq, multiple=multiple)
+    consumer._on_confirm(Record(method=method))
+
+
+def test_delivery_is_acked_only_after_the_result_is_confirmed(consumer):
+    delivery = deliver(consumer, 1)
+    finish(consumer, delivery, {"status": "ok"})
+    assert consumer.channel.published == []
+
+    consumer.ioloop.fire_timers()
+    assert consumer.channel.published == [{"status": "ok"}]
+    assert consumer.channel.acks == []
+
+    confirm(consumer, 1)
+    assert consumer.channel.acks == [(1, False)]
+    assert not consumer._outstanding and not consumer._unconfirmed
+
+
+def test_results_are_published_in_batches(consumer):
+    for tag in (1, 2, 3):
+        finish(consumer, deliver(consumer, tag), {"tag": tag})
+    # The third result fills the batch: published without waiting for the timer
+    assert [result["tag"] for result in consumer.channel.published] == [1, 2, 3]
+    assert consumer.ioloop.timers == []
+
+
+def test_multiple_confirm_acks_the_prefix_with_one_frame(consumer):
+    for tag in (1, 2, 3):
+        finish(consumer, deliver(consumer, tag), {"tag": tag})
+    confirm(consumer, 3, multiple=True)
+    assert consumer.channel.acks == [(3, True)]
+    assert not consumer._outstanding
+
+
+def test_running_delivery_blocks_the_multiple_ack(consumer):
+    running = deliver(consumer, 1)
+    for tag in (2, 3):
+        finish(consumer, deliver(consumer, tag), {"tag": tag})
+    consumer.ioloop.fire_timers()
+    confirm(consumer, 2, multiple=True)
+
+    # A multiple ack of 3 would also ack delivery 1, which has no result yet
+    assert consumer.channel.acks == [(2, False), (3, False)]
+    assert consumer._outstanding == {running.delivery_tag}
+
+
+def test_rejected_publish_requeues_its_delivery(consumer):
+    finish(consumer, deliver(consumer, 1), {"tag": 1})
+    consumer.ioloop.fire_timers()
+    confirm(consumer, 1, ack=False)
+    assert consumer.channel.nacks == [(1, True)]
+    assert consumer.channel.acks == []
+
+
+def test_failed_run_is_requeued_once(consumer):
+    finish(consumer, deliver(consumer, 1), error=RuntimeError("boom"))
+    finish(consumer, deliver(consumer, 2, redelivered=True), error=RuntimeError("boom"))
+    assert consumer.channel.nacks == [(1, True), (2, False)]
+    assert consumer.channel.published == []
+
+
+def test_deliveries_of_a_closed_channel_are_dropped(consumer):
+    delivery = deliver(consumer, 1)
+    # Reconnected: the old delivery tag means nothing on the new channel
+    consumer._generation = 2
+    consumer._outstanding = set()
+    finish(consumer, delivery, {"tag": 1})
+    consumer.ioloop.fire_timers()
+    assert consumer.channel.published == []
+    assert consumer.channel.acks == [] and consumer.channel.nacks == []
+
+
+def test_explicit_result_replaces_the_future_value(consumer):
+    delivery = deliver(consumer, 1)
+    future = Future()
+    consumer.settle_when_done(delivery, future, result={"status": "duplicate"})
+    future.set_result({"status": "ok"})
+    consumer.ioloop.run_callbacks()
+    consumer.ioloop.fire_timers()
+    assert consumer.channel.published == [{"status": "duplicate"}]
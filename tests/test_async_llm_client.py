@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from llm.async_anthropic_llm_client import AsyncAnthropicLLMClient
+from llm.rate_limiter import RateLimiter
+
+
+class FakeAsyncStream:
+    """Async iterator over the fake client's stream events, like the SDK's AsyncStream"""
+
+    def __init__(self, events):
+        self._events = iter(events)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._events)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncMessages:
+    def __init__(self, response: str):
+        self.events = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, chunk_tokens=2)
+        self.response = response
+        self.streams = []
+        self.requests = []
+
+    async def create(self, **params):
+        self.requests.append(params)
+        stream = FakeAsyncStream(self.events._events(self.response, input_tokens=10))
+        self.streams.append(stream)
+        return stream
+
+
+def make_client(response: str = "first chunk, second chunk", **kwargs) -> AsyncAnthropicLLMClient:
+    client = AsyncAnthropicLLMClient(api_key="test", **kwargs)
+    client.client.messages = FakeAsyncMessages(response)
+    return client
+
+
+def test_generate_joins_the_streamed_text_and_usage():
+    client = make_client()
+    response, usage_info = asyncio.run(client.generate("system", "user", max_tokens=100))
+    assert response == "first chunk, second chunk"
+    assert usage_info["input_tokens"] == 10
+    assert usage_info["output_tokens"] > 1
+    assert usage_info["time_to_first_token_seconds"] is not None
+    request = client.client.messages.requests[0]
+    assert request["max_tokens"] == 100 and request["stream"] is True
+
+
+def test_generate_stream_yields_every_chunk():
+    client = make_client()
+
+    async def run():
+        return [chunk async for chunk in client.generate_stream("system", "user")]
+
+    chunks = asyncio.run(run())
+    assert len(chunks) > 1
+    assert "".join(chunks) == "first chunk, second chunk"
+
+
+def test_stream_stopped_early_is_closed_and_settled():
+    limiter = RateLimiter(input_tokens_per_minute=1000, output_tokens_per_minute=1000)
+    client = make_client("x" * 400, rate_limiter=limiter)
+
+    async def run():
+        stream = client.generate_stream("system", "user", max_tokens=500)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run())
+    assert client.client.messages.streams[0].closed
+    # Only the couple of tokens received are charged, the rest of max_tokens is given back
+    assert limiter.output_tokens.level > 990
+
+
+def test_callback_may_be_async():
+    client = make_client()
+    seen = []
+
+    async def callback(chunk):
+        seen.append(chunk)
+
+    assert asyncio.run(client.generate_with_callback("system", "user", callback)) == "".join(seen)
+
+
+def test_api_key_is_required(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    with pytest.raises(ValueError):
+        AsyncAnthropicLLMClient()
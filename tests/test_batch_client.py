@@ -0,0 +1,97 @@
+import pytest
+
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from benchmarks.workload import build_workspace
+from internal.metrics import collect_module_metrics
+from llm.batch_client import BatchCollectingLLMClient, BatchPending, FakeMessageBatches, MessageBatchRunner
+from llm.prompt_blocks import to_text
+
+
+def fake_answer(params) -> str:
+    """Answer batch requests with the fake client's canned response for the kind of call"""
+    fake = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=3)
+    return fake.responses[FakeAnthropicLLMClient.call_kind(to_text(params["system"]))]
+
+
+def call(client: BatchCollectingLLMClient, module_name: str, user_prompt: str):
+    with collect_module_metrics(module_name):
+        return client.generate(system_prompt="system", user_prompt=user_prompt, max_tokens=100, temperature=0.0)
+
+
+def test_unanswered_call_is_queued_and_answered_next_round():
+    client = BatchCollectingLLMClient(prompt_caching=False)
+    client.begin_run()
+    with pytest.raises(BatchPending):
+        call(client, "framework_detector", "question")
+    assert client.run_pending
+
+    pending = client.take_pending()
+    assert len(pending) == 1
+    custom_id, params = next(iter(pending.items()))
+    assert params["max_tokens"] == 100 and params["messages"][0]["role"] == "user"
+
+    client.add_results({custom_id: ("answer", {"output_tokens": 1})})
+    client.begin_run()
+    assert call(client, "framework_detector", "question") == ("answer", {"output_tokens": 1})
+    assert not client.run_pending
+    assert client.take_pending() == {}
+
+
+def test_calls_after_a_pending_module_are_not_queued():
+    client = BatchCollectingLLMClient(prompt_caching=False)
+    client.begin_run()
+    with pytest.raises(BatchPending):
+        call(client, "framework_detector", "first")
+    # A downstream module's prompt would be built from missing output
+    with pytest.raises(BatchPending):
+        call(client, "requirement_generator", "second")
+    assert len(client.take_pending()) == 1
+
+
+def test_failed_batch_request_raises():
+    client = BatchCollectingLLMClient(prompt_caching=False)
+    client.begin_run()
+    with pytest.raises(BatchPending):
+        call(client, "framework_detector", "question")
+    custom_id = next(iter(client.take_pending()))
+    client.add_results({custom_id: "errored: overloaded"})
+    with pytest.raises(RuntimeError, match="overloaded"):
+        call(client, "framework_detector", "question")
+
+
+def test_runner_splits_requests_into_batches():
+    batches = FakeMessageBatches(respond=lambda params: "text", latency_polls=2)
+    runner = MessageBatchRunner(batches, poll_interval=0, max_requests_per_batch=2)
+    requests = {f"id-{index}": {"messages": [{"role": "user", "content": str(index)}]} for index in range(5)}
+
+    results = runner.run(requests)
+    assert len(batches._batches) == 3
+    assert set(results) == set(requests)
+    text, usage_info = results["id-0"]
+    assert text == "text"
+    assert usage_info["batch_id"] == "msgbatch_fake_1"
+    assert usage_info["total_tokens"] == usage_info["input_tokens"] + usage_info["output_tokens"]
+
+
+def test_rounds_complete_every_pipeline(workdir):
+    from batch_main import run_batch
+
+    messages = [build_workspace(str(workdir), 2, name=f"service_{index}") for index in range(2)]
+    final_states, incomplete = run_batch(messages, FakeMessageBatches(respond=fake_answer, latency_polls=0),
+                                         poll_interval=0, max_rounds=6)
+
+    assert incomplete == set()
+    for state in final_states.values():
+        assert state["errors"] == []
+        assert state["target_language"].lower() == "java"
+        assert "## Proposed Project Structure" in state["updated_requirements"]
+
+
+def test_pipelines_still_pending_after_the_last_round_are_incomplete(workdir):
+    from batch_main import run_batch
+
+    messages = [build_workspace(str(workdir), 2)]
+    final_states, incomplete = run_batch(messages, FakeMessageBatches(respond=fake_answer, latency_polls=0),
+                                         poll_interval=0, max_rounds=1)
+    assert incomplete == {0}
+    assert final_states[0]["errors"]
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, Tuple
+
+import pytest
+
+import main
+from agents.modular_agent_framework import ModularAgentFramework
+from internal.checkpoints import create_sqlite_checkpointer
+
+
+class StepModule:
+    """Module with one node; `failures` errors or `crashes` exceptions come before it succeeds"""
+
+    def __init__(self, name: str, dependencies=(), failures: int = 0, crashes: int = 0):
+        self.module_name = name
+        self.dependencies = list(dependencies)
+        self.failures = failures
+        self.crashes = crashes
+        self.runs = 0
+
+    def node(self, state) -> Dict:
+        self.runs += 1
+        if self.crashes:
+            self.crashes -= 1
+            raise RuntimeError("worker killed")
+        if self.failures:
+            self.failures -= 1
+            return {"errors": [f"{self.module_name}: LLM timeout"]}
+        return {"module_results": {self.module_name: {"done": True}}}
+
+    def add_nodes_to_graph(self, graph) -> Tuple[str, str]:
+        graph.add_node(f"{self.module_name}_node", self.node)
+        return f"{self.module_name}_node", f"{self.module_name}_node"
+
+    def log_loading(self):
+        pass
+
+
+def make_framework(tmp_path, **failing) -> Tuple[ModularAgentFramework, StepModule, StepModule]:
+    framework = ModularAgentFramework(checkpointer=create_sqlite_checkpointer(str(tmp_path / "checkpoints.sqlite3")))
+    first = StepModule("requirements")
+    second = StepModule("structure", ["requirements"], **failing)
+    framework.register_module(first)
+    framework.register_module(second)
+    return framework, first, second
+
+
+def initial_state() -> Dict:
+    return {"errors": [], "module_results": {}}
+
+
+def has_checkpoint(framework: ModularAgentFramework, run_id: str) -> bool:
+    return bool(framework.get_compiled_graph().get_state(framework._run_config(run_id)).values)
+
+
+def test_failed_module_is_retried_without_rerunning_its_predecessors(tmp_path):
+    framework, first, second = make_framework(tmp_path, failures=1)
+
+    failed = framework.start_analysis(initial_state(), run_id="delivery-1")
+    assert failed["errors"] == ["structure: LLM timeout"]
+    assert has_checkpoint(framework, "delivery-1")
+
+    resumed = framework.start_analysis(initial_state(), run_id="delivery-1")
+    assert resumed["errors"] == []
+    assert set(resumed["module_results"]) == {"requirements", "structure"}
+    assert (first.runs, second.runs) == (1, 2)
+    assert not has_checkpoint(framework, "delivery-1")
+
+
+def test_crashed_run_continues_after_the_last_completed_node(tmp_path):
+    framework, first, second = make_framework(tmp_path, crashes=1)
+
+    with pytest.raises(RuntimeError):
+        framework.start_analysis(initial_state(), run_id="delivery-2")
+    resumed = framework.start_analysis(initial_state(), run_id="delivery-2")
+    assert resumed["errors"] == []
+    assert (first.runs, second.runs) == (1, 2)
+
+
+def test_async_runs_resume_too(tmp_path):
+    framework, first, second = make_framework(tmp_path, failures=1)
+
+    async def run_twice():
+        await framework.astart_analysis(initial_state(), run_id="delivery-3")
+        return await framework.astart_analysis(initial_state(), run_id="delivery-3")
+
+    assert asyncio.run(run_twice())["errors"] == []
+    assert (first.runs, second.runs) == (1, 2)
+
+
+def test_runs_without_an_id_leave_no_checkpoint(tmp_path):
+    framework, first, second = make_framework(tmp_path, failures=1)
+    framework.start_analysis(initial_state())
+    framework.start_analysis(initial_state())
+    assert (first.runs, second.runs) == (2, 2)
+
+
+def test_plan_resume_starts_fresh_runs_and_stale_threads_over(tmp_path):
+    framework, _, _ = make_framework(tmp_path)
+    assert framework._plan_resume("run", SimpleNamespace(values={}, next=()), []) == (None, False)
+    # Completed cleanly but its checkpoint was never cleared
+    finished = SimpleNamespace(values={"errors": []}, next=())
+    assert framework._plan_resume("run", finished, []) == (None, True)
+
+
+def test_only_producer_message_ids_are_stable_run_ids():
+    assert main.get_run_id(SimpleNamespace(message_id="msg-1")) == "msg-1"
+    assert main.has_stable_run_id(SimpleNamespace(message_id="msg-1"))
+
+    anonymous = SimpleNamespace(message_id=None)
+    assert not main.has_stable_run_id(anonymous) and not main.has_stable_run_id(None)
+    assert main.get_run_id(anonymous) != main.get_run_id(anonymous)
@@ -0,0 +1,73 @@
+import codecs
+import os
+
+from internal.file_system_reader import FileSystemReader
+
+
+def test_contents_are_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "endpoint.md"
+    path.write_text("first")
+    reader = FileSystemReader()
+    assert reader.read_file(str(path)) == "first"
+    assert reader.read_file(str(path)) == "first"
+    assert reader.cache_info()["hits"] == 1
+
+    path.write_text("second version")
+    assert reader.read_file(str(path)) == "second version"
+    info = reader.cache_info()
+    assert info["misses"] == 2
+    # The stale version was dropped
+    assert info["entries"] == 1 and info["bytes"] == len("second version")
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    reader = FileSystemReader(cache_max_bytes=10)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_text(name * 4)
+        reader.read_file(str(tmp_path / name))
+    assert reader.cache_info() == {"entries": 2, "bytes": 8, "hits": 0, "misses": 3}
+
+    reader.read_file(str(tmp_path / "a"))
+    assert reader.cache_info()["misses"] == 4
+
+
+def test_large_files_are_decoded_from_a_memory_map(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_bytes(codecs.BOM_UTF8 + "café ".encode("utf-8") * 100)
+    reader = FileSystemReader(mmap_threshold=64)
+    assert reader.read_file(str(path)) == "café " * 100
+
+
+def test_encodings_are_detected(tmp_path):
+    reader = FileSystemReader()
+    samples = {
+        "utf16.md": "ñandú".encode("utf-16"),
+        "latin1.md": "ñandú".encode("latin-1"),
+        "utf8.md": "ñandú".encode("utf-8"),
+    }
+    for name, data in samples.items():
+        (tmp_path / name).write_bytes(data)
+        assert reader.read_file(str(tmp_path / name)) == "ñandú"
+
+
+def test_read_many_keeps_the_order(tmp_path):
+    paths = []
+    for index in range(20):
+        path = tmp_path / f"endpoint_{index}.md"
+        path.write_text(f"endpoint {index}")
+        paths.append(path)
+    reader = FileSystemReader(max_workers=4)
+    assert reader.read_many(paths) == [f"endpoint {index}" for index in range(20)]
+    assert reader.read_many(paths[:1]) == ["endpoint 0"]
+
+
+def test_missing_files_read_as_empty(tmp_path):
+    assert FileSystemReader().read_file(str(tmp_path / "missing.md")) == ""
+
+
+def test_paths_are_relative_to_the_base_path(tmp_path):
+    os.makedirs(tmp_path / "reqs")
+    (tmp_path / "reqs" / "a.md").write_text("a")
+    reader = FileSystemReader(base_path=str(tmp_path))
+    assert reader.read_file("reqs/a.md") == "a"
+    assert reader.list_directory_contents("reqs") == ["a.md"]
@@ -0,0 +1,87 @@
+from internal.markdown_sections import (
+    PROJECT_STRUCTURE_TITLES, insert_section, parse_sections, remove_sections, replace_section_body, shift_headings,
+)
+
+DOCUMENT = """# API Requirements
+
+Intro.
+
+## Endpoints
+
+### GET /items
+
+Returns items.
+
+## Proposed Project Structure
+
+```
+# not a heading
+src/
+```
+
+## Error Handling
+
+Errors.
+"""
+
+
+def test_parse_builds_the_heading_tree():
+    root = parse_sections(DOCUMENT)
+    assert root.outline() == [
+        "# API Requirements",
+        "  ## Endpoints",
+        "    ### GET /items",
+        "  ## Proposed Project Structure",
+        "  ## Error Handling",
+    ]
+    endpoints = root.find(["endpoints"])
+    assert DOCUMENT[endpoints.start:endpoints.end].startswith("## Endpoints")
+    assert "### GET /items" in DOCUMENT[endpoints.body_start:endpoints.end]
+    assert "## Proposed" not in DOCUMENT[endpoints.start:endpoints.end]
+
+
+def test_headings_inside_fenced_code_are_ignored():
+    titles = [section.title for section in parse_sections(DOCUMENT).walk()]
+    assert "not a heading" not in titles
+
+
+def test_replace_section_body_keeps_the_rest():
+    root = parse_sections(DOCUMENT)
+    section = root.find(PROJECT_STRUCTURE_TITLES)
+    updated = replace_section_body(DOCUMENT, section, "New layout.")
+
+    assert "## Proposed Project Structure\n\nNew layout.\n\n## Error Handling" in updated
+    assert "src/" not in updated
+    assert updated.startswith(DOCUMENT[:section.start])
+    assert updated.endswith("## Error Handling\n\nErrors.\n")
+
+
+def test_replace_last_section():
+    root = parse_sections(DOCUMENT)
+    updated = replace_section_body(DOCUMENT, root.find(["Error Handling"]), "Only 4xx and 5xx.")
+    assert updated.endswith("## Error Handling\n\nOnly 4xx and 5xx.\n")
+
+
+def test_insert_section_before_the_first_of_its_level():
+    text = "# Title\n\n## First\n\nBody.\n"
+    updated = insert_section(text, parse_sections(text), "Structure", "Layout.")
+    assert updated == "# Title\n\n## Structure\n\nLayout.\n\n## First\n\nBody.\n"
+
+
+def test_insert_section_at_the_end_without_siblings():
+    text = "# Title\n\nBody.\n"
+    assert insert_section(text, parse_sections(text), "Structure", "Layout.") == (
+        "# Title\n\nBody.\n\n## Structure\n\nLayout.\n"
+    )
+
+
+def test_remove_sections_drops_subsections_too():
+    updated = remove_sections(DOCUMENT, ["endpoints", "Proposed Project Structure"])
+    assert "GET /items" not in updated and "src/" not in updated
+    assert parse_sections(updated).outline() == ["# API Requirements", "  ## Error Handling"]
+
+
+def test_shift_headings_clamps_and_skips_code():
+    text = "# A\n###### B\n```\n# code\n```\n"
+    assert shift_headings(text, 2) == "### A\n###### B\n```\n# code\n```\n"
+    assert shift_headings("## A\n", -3) == "# A\n"
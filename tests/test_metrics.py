@@ -0,0 +1,97 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from agents.agent_setup import setup_agent_framework
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from benchmarks.workload import build_workspace
+from internal.metrics import (
+    MetricsRecorder, ModuleMetrics, collect_module_metrics, record_llm_call, submit_in_context, track_module_metrics,
+)
+
+USAGE = {"latency_seconds": 0.5, "time_to_first_token_seconds": 0.1, "input_tokens": 100, "output_tokens": 20,
+         "cache_read_input_tokens": 80, "retries": 1}
+
+
+class Module:
+    module_name = "module"
+
+    @track_module_metrics
+    def node(self, state):
+        record_llm_call(USAGE)
+        return {"module_results": {"module": {"status": "ok"}}}
+
+    @track_module_metrics
+    async def anode(self, state):
+        record_llm_call(USAGE)
+        record_llm_call({"cache_hit": True})
+        return None
+
+
+def test_node_metrics_are_added_to_its_results():
+    result = Module().node({})["module_results"]["module"]
+    assert result["status"] == "ok"
+    metrics = result["metrics"]
+    assert metrics["llm_calls"] == 1
+    assert (metrics["input_tokens"], metrics["output_tokens"], metrics["cache_read_input_tokens"]) == (100, 20, 80)
+    assert metrics["time_to_first_token_seconds"] == 0.1
+    assert metrics["retries"] == 1
+
+
+def test_async_node_metrics():
+    metrics = asyncio.run(Module().anode({}))["module_results"]["module"]["metrics"]
+    assert metrics["llm_calls"] == 2 and metrics["cache_hits"] == 1
+
+
+def test_calls_in_executor_threads_reach_the_collector_of_their_context():
+    record_llm_call(USAGE)
+    with collect_module_metrics("module") as metrics:
+        with ThreadPoolExecutor(2) as executor:
+            for future in [submit_in_context(executor, record_llm_call, USAGE) for _ in range(3)]:
+                future.result()
+    assert metrics.llm_calls == 3
+
+
+def test_merge_keeps_the_first_time_to_first_token():
+    node, ahead = ModuleMetrics("module"), ModuleMetrics("module")
+    ahead.record_llm_call(USAGE)
+    node.record_llm_call({**USAGE, "time_to_first_token_seconds": 0.3})
+    node.merge(ahead)
+    assert node.llm_calls == 2 and node.input_tokens == 200
+    assert node.time_to_first_token_seconds == 0.3
+
+
+def test_recorder_writes_the_trace_and_prometheus_totals(tmp_path):
+    recorder = MetricsRecorder(trace_path=str(tmp_path / "trace.jsonl"), prometheus_path=str(tmp_path / "metrics.prom"))
+    state = {"errors": [], "module_results": {"module": {"metrics": {"llm_calls": 2, "input_tokens": 10}}}}
+    recorder.observe_run("run-1", state, 1.5)
+    recorder.observe_run("run-2", {**state, "errors": ["module: failed"]}, 0.5)
+
+    trace = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    assert [record["run_id"] for record in trace] == ["run-1", "run-2"]
+    assert trace[1]["errors"] == 1 and trace[0]["modules"]["module"]["llm_calls"] == 2
+
+    text = (tmp_path / "metrics.prom").read_text()
+    assert "bian_pipeline_runs_total 2" in text
+    assert "bian_pipeline_failed_runs_total 1" in text
+    assert 'bian_module_llm_calls_total{module="module"} 4' in text
+    assert text == recorder.to_prometheus()
+
+
+def test_pipeline_runs_report_every_module(workdir):
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=3)
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False)
+    framework.metrics = MetricsRecorder(trace_path=str(workdir / "trace.jsonl"))
+
+    state = main.build_initial_state(build_workspace(str(workdir), 2))
+    state["module_results"] = {"consumer": {"metrics": {"queue_wait_seconds": 0.25}}}
+    final = framework.start_analysis(state)
+
+    results = final["module_results"]
+    assert results["consumer"]["metrics"]["queue_wait_seconds"] == 0.25
+    assert results["requirement_generator"]["metrics"]["llm_calls"] >= 1
+    assert results["requirement_generator"]["metrics"]["output_tokens"] > 0
+    assert all(results[name]["metrics"]["wall_time_seconds"] > 0 for name in framework.execution_order)
+    record = json.loads((workdir / "trace.jsonl").read_text())
+    assert set(record["modules"]) == {"consumer", *framework.execution_order}
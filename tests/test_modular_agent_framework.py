@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from typing import Dict, List, Tuple
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph
+
+from agents.modular_agent_framework import ModularAgentFramework
+
+
+class StubModule:
+    """Module with one node that records the runs it took part in"""
+
+    def __init__(self, name: str, dependencies: List[str] = (), calls: List[Tuple[str, str]] = None):
+        self.module_name = name
+        self.dependencies = list(dependencies)
+        self.calls = calls if calls is not None else []
+
+    def node(self, state) -> Dict:
+        self.calls.append((self.module_name, "sync"))
+        return {"module_results": {self.module_name: {"ran": "sync"}}}
+
+    async def anode(self, state) -> Dict:
+        self.calls.append((self.module_name, "async"))
+        return {"module_results": {self.module_name: {"ran": "async"}}}
+
+    def add_nodes_to_graph(self, graph: StateGraph) -> Tuple[str, str]:
+        node_name = f"{self.module_name}_node"
+        graph.add_node(node_name, RunnableLambda(self.node, afunc=self.anode))
+        return node_name, node_name
+
+    def log_loading(self):
+        pass
+
+
+def make_framework(*modules, **kwargs) -> ModularAgentFramework:
+    framework = ModularAgentFramework(**kwargs)
+    for module in modules:
+        framework.register_module(module)
+    return framework
+
+
+def initial_state() -> Dict:
+    return {"errors": [], "module_results": {}}
+
+
+def test_sync_and_async_runs_use_the_matching_node_implementation():
+    calls = []
+    framework = make_framework(StubModule("first", calls=calls), StubModule("second", ["first"], calls=calls))
+
+    final = framework.start_analysis(initial_state())
+    assert calls == [("first", "sync"), ("second", "sync")]
+    assert final["migration_complete"]
+
+    calls.clear()
+    final = asyncio.run(framework.astart_analysis(initial_state()))
+    assert calls == [("first", "async"), ("second", "async")]
+    assert final["module_results"]["second"] == {"ran": "async"}
+
+
+def test_async_runs_share_one_event_loop():
+    framework = make_framework(StubModule("only"))
+
+    async def run_many():
+        return await asyncio.gather(*[framework.astart_analysis(initial_state()) for _ in range(20)])
+
+    finals = asyncio.run(run_many())
+    assert all(final["module_results"]["only"] == {"ran": "async"} for final in finals)
+
+
+class BarrierModule(StubModule):
+    """Waits for the other modules of its layer: only passes if they run at the same time"""
+
+    def __init__(self, name: str, barrier: threading.Barrier, dependencies: List[str] = ()):
+        super().__init__(name, dependencies)
+        self.barrier = barrier
+
+    def node(self, state) -> Dict:
+        self.barrier.wait()
+        return {"errors": [f"{self.module_name}: reported"], "module_results": {self.module_name: {"ran": "sync"}}}
+
+
+def test_modules_are_layered_by_dependency():
+    framework = make_framework(
+        StubModule("detect"), StubModule("specs"), StubModule("requirements", ["detect", "specs"]),
+        StubModule("structure", ["requirements"]), StubModule("docs", ["requirements"]),
+    )
+    assert framework.execution_layers == [["detect", "specs"], ["requirements"], ["structure", "docs"]]
+    assert framework.execution_order == ["detect", "specs", "requirements", "structure", "docs"]
+
+
+def test_unknown_and_circular_dependencies_are_rejected():
+    with pytest.raises(ValueError, match="unregistered"):
+        make_framework(StubModule("a", ["missing"]))
+
+    framework = make_framework(StubModule("a"))
+    framework.modules["a"].dependencies = ["b"]
+    with pytest.raises(ValueError, match="Circular"):
+        framework.register_module(StubModule("b", ["a"]))
+
+
+def test_independent_modules_run_concurrently_and_their_updates_merge():
+    barrier = threading.Barrier(2, timeout=5)
+    framework = make_framework(BarrierModule("left", barrier), BarrierModule("right", barrier),
+                               StubModule("join", ["left", "right"]))
+
+    final = framework.start_analysis(initial_state())
+    assert sorted(final["errors"]) == ["left: reported", "right: reported"]
+    assert set(final["module_results"]) == {"left", "right", "join"}
+
+
+def test_compiled_graph_is_reused_until_modules_change():
+    framework = make_framework(StubModule("first"))
+    graph = framework.get_compiled_graph()
+    framework.start_analysis(initial_state())
+    framework.start_analysis(initial_state())
+    assert framework.get_compiled_graph() is graph
+
+    framework.register_module(StubModule("second", ["first"]))
+    rebuilt = framework.get_compiled_graph()
+    assert rebuilt is not graph
+    assert set(framework.start_analysis(initial_state())["module_results"]) == {"first", "second"}
+
+    framework.invalidate_graph()
+    assert framework.get_compiled_graph() is not rebuilt
+
+
+def test_worker_runs_share_one_framework(monkeypatch):
+    import main
+    from agents import agent_setup
+
+    built = []
+    monkeypatch.setattr(main, "_framework", None)
+    monkeypatch.setattr(agent_setup, "setup_agent_framework", lambda *args, **kwargs: built.append(1) or object())
+
+    threads = [threading.Thread(target=main.get_framework) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert main.get_framework() is main._framework
+    assert len(built) == 1
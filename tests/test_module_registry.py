@@ -0,0 +1,99 @@
+import textwrap
+
+import pytest
+
+from agents import module_registry as module_registry_module
+from agents.module_registry import BUILTIN_MODULES, ModuleRegistry
+
+PLUGIN = '''
+class EchoModule:
+    """Plugin module copying the detected language into module_results"""
+
+    module_name = "echo"
+    dependencies = ["framework_detector"]
+
+    def __init__(self, file_reader, llm_client):
+        self.llm_client = llm_client
+
+    def node(self, state):
+        return {"module_results": {"echo": {"language": state.get("target_language")}}}
+
+    def add_nodes_to_graph(self, graph):
+        graph.add_node("echo_node", self.node)
+        return "echo_node", "echo_node"
+
+    def log_loading(self):
+        pass
+'''
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    """An importable echo_plugin module, and no installed entry points"""
+    (tmp_path / "echo_plugin.py").write_text(textwrap.dedent(PLUGIN))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(module_registry_module, "discover_entry_points", lambda: {})
+    monkeypatch.delenv("AGENT_MODULES", raising=False)
+    return "echo_plugin:EchoModule"
+
+
+def test_builtins_are_registered_and_imported_lazily(plugin):
+    registry = ModuleRegistry.from_env()
+    assert registry.names() == list(BUILTIN_MODULES)
+    assert all(entry["source"] == "builtin" for entry in registry.import_report())
+
+    registry.load("framework_detector")
+    loaded = {entry["name"]: entry["loaded"] for entry in registry.import_report()}
+    assert loaded == {"framework_detector": True, "requirement_generator": False, "project_structure": False}
+    assert "lazy" in registry.format_import_report()
+
+
+def test_entry_points_add_plugins(plugin, monkeypatch):
+    monkeypatch.setattr(module_registry_module, "discover_entry_points", lambda: {"echo": plugin})
+    registry = ModuleRegistry.from_env()
+    assert registry.names() == [*BUILTIN_MODULES, "echo"]
+    assert registry.spec("echo").source == "entry_point"
+
+
+def test_agent_modules_selects_and_declares_modules(plugin, monkeypatch):
+    monkeypatch.setenv("AGENT_MODULES", f"framework_detector, echo={plugin}")
+    registry = ModuleRegistry.from_env()
+    assert registry.names() == ["framework_detector", "echo"]
+    assert registry.spec("echo").source == "config"
+    assert registry.load("echo").__name__ == "EchoModule"
+
+
+def test_unknown_or_malformed_modules_are_rejected(plugin, monkeypatch):
+    monkeypatch.setenv("AGENT_MODULES", "framework_detector,missing")
+    with pytest.raises(ValueError, match="missing"):
+        ModuleRegistry.from_env()
+    with pytest.raises(ValueError, match="package.module:ClassName"):
+        ModuleRegistry().register("bad", "no_colon")
+    with pytest.raises(KeyError, match="Unknown agent module"):
+        ModuleRegistry().spec("missing")
+
+
+def test_failed_imports_are_reported(plugin):
+    registry = ModuleRegistry()
+    registry.register("broken", "no_such_package.module:Module")
+    with pytest.raises(ImportError, match="broken"):
+        registry.load("broken")
+    assert registry.import_report()[0]["error"].startswith("ModuleNotFoundError")
+    assert "failed" in registry.format_import_report()
+
+
+def test_plugin_modules_run_in_the_pipeline(plugin, monkeypatch, workdir):
+    import main
+    from agents.agent_setup import setup_agent_framework
+    from benchmarks.fake_llm import FakeAnthropicLLMClient
+    from benchmarks.workload import build_workspace
+
+    monkeypatch.setenv("AGENT_MODULES", f"framework_detector,echo={plugin}")
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0)
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False,
+                                      module_registry=ModuleRegistry.from_env())
+    assert framework.execution_order == ["framework_detector", "echo"]
+    assert framework.modules["echo"].llm_client is client
+
+    final = framework.start_analysis(main.build_initial_state(build_workspace(str(workdir), 2)))
+    assert final["module_results"]["echo"] == {"language": "java"}
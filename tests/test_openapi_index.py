@@ -0,0 +1,77 @@
+import json
+
+from internal.openapi_index import OpenAPIIndex, load_openapi_index
+from llm.token_budget import estimate_tokens
+
+SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "Orders", "version": "1"},
+    "security": [{"bearer": []}],
+    "tags": [{"name": "orders", "description": "Orders"}, {"name": "unused"}],
+    "paths": {
+        "/orders/{id}": {
+            "parameters": [{"$ref": "#/components/parameters/Id"}],
+            "get": {
+                "tags": ["orders"],
+                "responses": {"200": {"content": {"application/json": {
+                    "schema": {"$ref": "#/components/schemas/Order"}}}}},
+            },
+        },
+        "/health": {"get": {"security": [{"apiKey": []}], "responses": {"200": {"description": "ok"}}}},
+    },
+    "components": {
+        "parameters": {"Id": {"name": "id", "in": "path", "schema": {"type": "string"}}},
+        "schemas": {
+            "Order": {"properties": {"line": {"$ref": "#/components/schemas/Line"}}},
+            "Line": {"properties": {"order": {"$ref": "#/components/schemas/Order"}}},
+            "Unused": {"type": "object"},
+        },
+        "securitySchemes": {
+            "bearer": {"type": "http", "scheme": "bearer"},
+            "apiKey": {"type": "apiKey", "in": "header", "name": "x-api-key"},
+        },
+    },
+}
+
+
+def test_reachable_refs_follow_cycles_and_path_parameters():
+    index = OpenAPIIndex(SPEC)
+    assert index.reachable_refs("/orders/{id}", "GET") == {
+        "#/components/parameters/Id", "#/components/schemas/Order", "#/components/schemas/Line",
+    }
+
+
+def test_reachable_spec_drops_unused_components_but_keeps_security_and_tags():
+    spec = OpenAPIIndex(SPEC).reachable_spec()
+    assert "Unused" not in spec["components"]["schemas"]
+    assert spec["security"] == SPEC["security"]
+    assert set(spec["components"]["securitySchemes"]) == {"bearer", "apiKey"}
+    assert spec["tags"] == [{"name": "orders", "description": "Orders"}]
+
+
+def test_fragment_keeps_only_the_schemes_it_uses():
+    fragment = OpenAPIIndex(SPEC)._fragment([("/orders/{id}", "get")])
+    assert list(fragment["paths"]) == ["/orders/{id}"]
+    assert set(fragment["components"]["securitySchemes"]) == {"bearer"}
+
+
+def test_compact_spec_within_budget_is_the_whole_spec():
+    index = OpenAPIIndex(SPEC)
+    assert index.compact_spec_within(10 ** 6, estimate_tokens) == index.compact_spec()
+
+
+def test_compact_spec_over_budget_lists_the_operations_left_out():
+    index = OpenAPIIndex(SPEC)
+    one_operation = index.to_compact_json(index._fragment([("/orders/{id}", "get")]))
+    budget = estimate_tokens(one_operation)
+    assert budget < estimate_tokens(index.compact_spec())
+
+    bounded = index.compact_spec_within(budget, estimate_tokens)
+    fragment, _, listing = bounded.partition("\n")
+    assert json.loads(fragment) == json.loads(one_operation)
+    assert listing.splitlines()[1:] == ["GET /health"]
+
+
+def test_indexes_are_reused_for_the_same_content():
+    content = json.dumps(SPEC)
+    assert load_openapi_index(content) is load_openapi_index(content)
@@ -0,0 +1,76 @@
+from agents.modules.project_structure import ProjectStructureModule
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+
+REQUIREMENTS = """# API Requirements
+
+## Endpoints
+
+GET /items
+
+## Proposed Project Structure
+
+Old layout.
+
+## Error Handling
+
+Errors.
+"""
+
+SECTION_WITH_SUBSECTIONS = """Hexagonal layout.
+
+### Domain
+
+Entities and ports.
+
+### Infrastructure
+
+Adapters.
+"""
+
+
+def make_module() -> ProjectStructureModule:
+    return ProjectStructureModule(None, FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0))
+
+
+def test_section_is_complete_once_another_top_section_starts():
+    complete = ProjectStructureModule._section_complete
+    assert not complete(SECTION_WITH_SUBSECTIONS)
+    assert not complete("## Proposed Project Structure\n\n" + SECTION_WITH_SUBSECTIONS)
+    assert complete(SECTION_WITH_SUBSECTIONS + "\n## Error Handling\n\nMore.")
+
+
+def test_body_keeps_subsections_when_the_answer_has_no_heading_first():
+    extract = ProjectStructureModule._extract_section_body
+    assert extract(SECTION_WITH_SUBSECTIONS) == SECTION_WITH_SUBSECTIONS.strip()
+    # Anything after the section, from the next level <= 2 heading on, is dropped
+    assert extract(SECTION_WITH_SUBSECTIONS + "\n## Error Handling\n\nMore.") == SECTION_WITH_SUBSECTIONS.strip()
+
+
+def test_body_drops_a_repeated_heading():
+    extract = ProjectStructureModule._extract_section_body
+    response = "## Proposed Project Structure\n\n" + SECTION_WITH_SUBSECTIONS + "\n## Error Handling\n\nMore."
+    assert extract(response) == SECTION_WITH_SUBSECTIONS.strip()
+
+
+def test_merge_replaces_only_the_structure_section():
+    updated = make_module()._merge_structure(REQUIREMENTS, SECTION_WITH_SUBSECTIONS)
+    assert "Old layout." not in updated
+    assert "## Proposed Project Structure\n\nHexagonal layout." in updated
+    assert "### Infrastructure\n\nAdapters.\n\n## Error Handling\n\nErrors." in updated
+    assert updated.startswith("# API Requirements\n\n## Endpoints\n\nGET /items")
+
+
+def test_merge_inserts_a_missing_section():
+    requirements = "# API Requirements\n\n## Endpoints\n\nGET /items\n"
+    updated = make_module()._merge_structure(requirements, "New layout.")
+    assert updated.startswith("# API Requirements\n\n## Proposed Project Structure\n\nNew layout.\n\n## Endpoints")
+
+
+def test_stream_stops_once_the_model_runs_past_the_section():
+    module = make_module()
+    module.llm_client.responses["structure"] = (
+        SECTION_WITH_SUBSECTIONS + "\n## Error Handling\n\n" + "Not requested. " * 500
+    )
+    response = module._stream_section("Proposed Project Structure", "prompt", 1000)
+    assert len(response) < len(module.llm_client.responses["structure"])
+    assert module._extract_section_body(response) == SECTION_WITH_SUBSECTIONS.strip()
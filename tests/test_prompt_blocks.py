@@ -0,0 +1,43 @@
+from llm.prompt_blocks import (
+    MAX_CACHE_BREAKPOINTS, prepare_cached_prompts, strip_cache_control, text_block, to_blocks, to_text,
+)
+
+
+def breakpoints(*prompts) -> list:
+    return [block["text"] for prompt in prompts if isinstance(prompt, list)
+            for block in prompt if "cache_control" in block]
+
+
+def test_plain_system_prompt_gets_its_own_breakpoint():
+    system, user = prepare_cached_prompts("system", "question")
+    assert system == [{"type": "text", "text": "system", "cache_control": {"type": "ephemeral"}}]
+    assert user == "question"
+
+
+def test_only_the_last_four_breakpoints_are_kept():
+    user = [text_block(f"block {index}", cache=True) for index in range(5)] + [text_block("question")]
+    system, content = prepare_cached_prompts("system", user)
+    assert breakpoints(system, content) == [f"block {index}" for index in range(1, 5)]
+    assert len(breakpoints(system, content)) == MAX_CACHE_BREAKPOINTS
+    # The caller's blocks are left as they were
+    assert all("cache_control" in block for block in user[:5])
+
+
+def test_block_system_prompts_keep_their_own_breakpoints():
+    system = [text_block("rules"), text_block("template", cache=True)]
+    prepared, _ = prepare_cached_prompts(system, [text_block("spec", cache=True), text_block("question")])
+    assert breakpoints(prepared) == ["template"]
+
+
+def test_caching_off_strips_every_marker():
+    system, user = prepare_cached_prompts([text_block("system", cache=True)], [text_block("spec", cache=True)],
+                                          prompt_caching=False)
+    assert breakpoints(system, user) == []
+    assert strip_cache_control("text") == "text"
+
+
+def test_text_helpers():
+    blocks = [text_block("a"), text_block("b", cache=True)]
+    assert to_text(blocks) == "a\nb" and to_text("a") == "a"
+    assert to_blocks("a", cache=True) == [text_block("a", cache=True)]
+    assert to_blocks(blocks) == blocks and to_blocks(blocks)[0] is not blocks[0]
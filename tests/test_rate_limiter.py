@@ -0,0 +1,214 @@
+import asyncio
+import threading
+import time
+
+import anthropic
+import httpx
+import pytest
+
+from llm import rate_limiter as rate_limiter_module
+from llm.rate_limiter import RateLimiter, retry_after_seconds
+
+
+def connection_error() -> anthropic.APIConnectionError:
+    return anthropic.APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+
+
+def empty_limiter(tokens_per_minute: float = 6000, **kwargs) -> RateLimiter:
+    limiter = RateLimiter(requests_per_minute=60000, input_tokens_per_minute=tokens_per_minute, **kwargs)
+    limiter.input_tokens.level = 0
+    return limiter
+
+
+def count_checks(limiter: RateLimiter) -> list:
+    checks = [0]
+    try_acquire = limiter._try_acquire
+
+    def counted(*args):
+        checks[0] += 1
+        return try_acquire(*args)
+
+    limiter._try_acquire = counted
+    return checks
+
+
+def test_acquire_takes_from_every_bucket():
+    limiter = RateLimiter(requests_per_minute=10, input_tokens_per_minute=1000, output_tokens_per_minute=500)
+    assert limiter.acquire(100, output_tokens=200) < 0.1
+    assert limiter.requests.level == pytest.approx(9, abs=0.01)
+    assert limiter.input_tokens.level == pytest.approx(900, abs=1)
+    assert limiter.output_tokens.level == pytest.approx(300, abs=1)
+
+
+def test_settle_corrects_each_bucket_with_its_own_usage():
+    limiter = RateLimiter(input_tokens_per_minute=1000, output_tokens_per_minute=1000)
+    limiter.acquire(100, output_tokens=400)
+    limiter.settle(100, {"input_tokens": 150, "cache_creation_input_tokens": 50,
+                         "cache_read_input_tokens": 5000, "output_tokens": 50}, 400)
+    assert limiter.input_tokens.level == pytest.approx(800, abs=1)
+    assert limiter.output_tokens.level == pytest.approx(950, abs=1)
+
+
+def test_large_generations_do_not_drain_the_input_budget():
+    limiter = RateLimiter(input_tokens_per_minute=40000, output_tokens_per_minute=8000)
+    # max_tokens above the bucket size reserves the whole bucket, the real output is charged after
+    assert limiter.acquire(1000, output_tokens=64000) < 0.1
+    assert limiter.output_tokens.level == pytest.approx(0, abs=10)
+    limiter.settle(1000, {"input_tokens": 1000, "output_tokens": 2000}, 64000)
+    assert limiter.input_tokens.level == pytest.approx(39000, abs=10)
+    assert limiter.output_tokens.level == pytest.approx(6000, abs=10)
+
+
+def test_unlimited_buckets_never_wait():
+    limiter = RateLimiter()
+    assert limiter.requests is None and limiter.input_tokens is None and limiter.output_tokens is None
+    for _ in range(100):
+        assert limiter.acquire(10 ** 6, output_tokens=10 ** 6) < 0.1
+    limiter.settle(10 ** 6, {"input_tokens": 10 ** 6, "output_tokens": 10 ** 6}, 10 ** 6)
+
+
+def test_smaller_calls_are_served_first(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(input_tokens_per_minute=60)  # refills 1 token per second
+    large = limiter._enqueue(10)
+    small = limiter._enqueue(1)
+    assert limiter._waiting[0] == small
+    assert small < large
+
+
+def test_large_calls_age_ahead_of_newer_small_ones(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(input_tokens_per_minute=60)
+    large = limiter._enqueue(10)
+    now[0] += 11
+    small = limiter._enqueue(1)
+    assert limiter._waiting[0] == large
+    assert large < small
+
+
+def test_waiters_sleep_until_the_line_moves():
+    limiter = empty_limiter()  # 100 tokens per second
+    checks = count_checks(limiter)
+    threads = [threading.Thread(target=limiter.acquire, args=(20,)) for _ in range(10)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    # ~2 s of waiting: polling every 50 ms would take hundreds of checks
+    assert time.monotonic() - started == pytest.approx(2.0, abs=0.5)
+    assert checks[0] < 100
+    assert not limiter._waiting
+
+
+def test_async_waiters_sleep_until_the_line_moves():
+    limiter = empty_limiter()
+    checks = count_checks(limiter)
+
+    async def run():
+        await asyncio.gather(*[limiter.aacquire(20) for _ in range(10)])
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started == pytest.approx(2.0, abs=0.5)
+    assert checks[0] < 100
+    assert not limiter._waiting and not limiter._async_waiters
+
+
+def test_cancelled_async_waiter_leaves_the_line():
+    limiter = empty_limiter(tokens_per_minute=60)
+
+    async def run():
+        task = asyncio.ensure_future(limiter.aacquire(30))
+        await asyncio.sleep(0.05)
+        assert len(limiter._waiting) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not limiter._waiting and not limiter._async_waiters
+
+
+def test_failed_attempts_are_refunded_before_the_retry():
+    limiter = RateLimiter(input_tokens_per_minute=1000, base_delay=0.001)
+    levels = []
+
+    def flaky():
+        levels.append(limiter.input_tokens.level)
+        if len(levels) < 3:
+            raise connection_error()
+        return "ok"
+
+    usage_info = {}
+    assert limiter.call(flaky, 400, usage_info=usage_info) == "ok"
+    assert usage_info["retries"] == 2
+    assert levels == pytest.approx([600, 600, 600], abs=1)
+
+
+def test_non_retryable_errors_are_raised_and_refunded():
+    limiter = RateLimiter(input_tokens_per_minute=1000)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(fail, 400)
+    assert len(calls) == 1
+    assert limiter.input_tokens.level == pytest.approx(1000, abs=1)
+
+
+def test_async_call_retries_and_refunds():
+    limiter = RateLimiter(input_tokens_per_minute=1000, base_delay=0.001)
+    attempts = []
+
+    async def flaky():
+        attempts.append(limiter.input_tokens.level)
+        if len(attempts) < 2:
+            raise connection_error()
+        return "ok"
+
+    assert asyncio.run(limiter.acall(flaky, 400)) == "ok"
+    assert attempts == pytest.approx([600, 600], abs=1)
+
+
+def test_gives_up_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=0.001)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise connection_error()
+
+    with pytest.raises(anthropic.APIConnectionError):
+        limiter.call(fail, 10)
+    assert len(calls) == 3
+
+
+def test_retry_after_headers():
+    class Error:
+        def __init__(self, headers):
+            self.response = type("Response", (), {"headers": headers})()
+
+    assert retry_after_seconds(Error({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(Error({"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(Error({})) is None
+
+
+def test_from_env_is_opt_in(monkeypatch):
+    for variable in ("LLM_REQUESTS_PER_MINUTE", "LLM_INPUT_TOKENS_PER_MINUTE", "LLM_OUTPUT_TOKENS_PER_MINUTE"):
+        monkeypatch.delenv(variable, raising=False)
+    assert RateLimiter.from_env() is None
+
+    monkeypatch.setenv("LLM_INPUT_TOKENS_PER_MINUTE", "1234")
+    limiter = RateLimiter.from_env()
+    assert limiter.input_tokens.capacity == 1234
+    assert limiter.requests is None and limiter.output_tokens is None
+
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    assert RateLimiter.from_env() is None
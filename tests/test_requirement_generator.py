@@ -0,0 +1,124 @@
+import asyncio
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+import main
+from agents.modules.requirement_generator import RequirementGeneratorModule
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from benchmarks.workload import build_workspace
+from internal.file_system_reader import FileSystemReader
+from internal.openapi_index import OpenAPIIndex
+
+
+def make_module(**kwargs) -> RequirementGeneratorModule:
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0)
+    return RequirementGeneratorModule(FileSystemReader(), client, **kwargs)
+
+
+def test_endpoint_files_come_from_the_run_state(workdir):
+    state = main.build_initial_state(build_workspace(str(workdir), 3))
+    files = make_module()._list_endpoint_files(state)
+    assert len(files) == 3
+    assert all(path.parent == workdir / "service" / "service" / "reqs" for path in files)
+
+
+def test_missing_endpoints_dir_fails(workdir):
+    with pytest.raises(FileNotFoundError):
+        make_module()._list_endpoint_files({"endpoints_dir": str(workdir / "missing")})
+
+
+def test_summaries_are_condensed_until_they_fit(workdir):
+    state = main.build_initial_state(build_workspace(str(workdir), 4))
+    module = make_module(map_reduce=True, max_reduce_chars=500)
+    summaries = module._summarize_endpoints(state)
+    assert sum(len(summary) for summary in summaries) <= 500
+
+
+def test_single_oversized_summary_is_truncated_on_whole_lines():
+    module = make_module(map_reduce=True, max_reduce_chars=100)
+    assert module._needs_condensing(["x" * 200])
+    assert not module._needs_condensing(["x" * 200], previous_size=200)
+
+    summary = "\n".join(f"- line {index}" for index in range(40))
+    truncated = module._truncate_summaries([summary])
+    assert len(truncated[0]) <= 100
+    kept = truncated[0].splitlines()
+    assert kept and kept == summary.splitlines()[:len(kept)]
+
+
+def test_document_max_tokens_follow_the_contract_size():
+    module = make_module()
+    small = OpenAPIIndex({"openapi": "3.0.0", "paths": {"/a": {"get": {"responses": {}}}}})
+    paths = {f"/resource{index}": {"get": {"responses": {}}, "post": {"responses": {}}} for index in range(30)}
+    large = OpenAPIIndex({"openapi": "3.0.0", "paths": paths})
+
+    assert module._expected_document_tokens(small) == module._min_document_tokens
+    assert module._expected_document_tokens(large) == module._llm_config["max_tokens"]
+    config = module._document_llm_config(small, "system", "user")
+    assert config["max_tokens"] == module._min_document_tokens
+
+
+def test_reduce_prompt_bounds_the_spec(workdir):
+    module = make_module(map_reduce=True, max_spec_tokens=50)
+    paths = {f"/resource{index}": {"get": {"responses": {}}} for index in range(30)}
+    spec = OpenAPIIndex({"openapi": "3.0.0", "paths": paths})
+    prompt = module._build_reduce_prompt({}, ["### a.md\nsummary"], spec)
+    spec_block = prompt[1]["text"]
+    assert json.dumps(paths, separators=(",", ":")) not in spec_block
+    assert "GET /resource29" in spec_block
+
+
+def add_contract(state, name: str):
+    """Copy the workspace's contract under another name"""
+    bian_dir = Path(state["bian_dir"])
+    spec = next(bian_dir.glob("*.json"))
+    shutil.copyfile(spec, bian_dir / f"{name}.json")
+
+
+def test_merged_index_lists_every_contract_and_drops_their_structure_sections():
+    module = make_module()
+    small = OpenAPIIndex({"openapi": "3.0.0", "paths": {"/a": {"get": {"responses": {}}}}})
+    documents = {
+        "Orders": "# Orders API\n\n## Endpoints\n\nGET /a\n\n## Proposed Project Structure\n\ntree\n",
+        "Payments": "# Payments API\n\n## Endpoints\n\nGET /a\n",
+    }
+    merged = module._merge_contracts([("Orders", small), ("Payments", small)], documents)
+
+    assert "| Orders | 1 | api_requirements_Orders.md |" in merged
+    assert "## Contract: Orders\n\n### Orders API" in merged
+    assert "#### Endpoints" in merged
+    assert "Proposed Project Structure" not in merged and "tree" not in merged
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_every_contract_gets_its_own_document(workdir, use_async):
+    state = main.build_initial_state(build_workspace(str(workdir), 2))
+    add_contract(state, "Second_contract")
+    module = make_module()
+
+    update = (asyncio.run(module.agenerate_requirements(state)) if use_async
+              else module.generate_requirements(state))
+
+    documents = update["contract_requirements"]
+    assert len(documents) == 2 and "Second_contract" in documents
+    assert update["module_results"]["requirement_generator"]["contracts"] == list(documents)
+    assert update["module_results"]["requirement_generator"]["metrics"]["llm_calls"] == 2
+    assert update["generated_requirements"].startswith("# Requirements Index")
+    for name in documents:
+        assert f"## Contract: {name}" in update["generated_requirements"]
+
+
+def test_several_contracts_end_with_a_single_structure_section(workdir):
+    from agents.agent_setup import setup_agent_framework
+
+    state = main.build_initial_state(build_workspace(str(workdir), 2))
+    add_contract(state, "Second_contract")
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=2)
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False)
+
+    final = framework.start_analysis(state)
+    assert final["errors"] == []
+    assert final["updated_requirements"].count("Proposed Project Structure") == 1
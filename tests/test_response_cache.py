@@ -0,0 +1,79 @@
+import time
+
+from llm.response_cache import LLMResponseCache
+
+
+def make_cache(tmp_path, **kwargs) -> LLMResponseCache:
+    return LLMResponseCache(db_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_key_depends_on_every_input():
+    key = LLMResponseCache.make_key("model", "system", "user", max_tokens=10)
+    assert key == LLMResponseCache.make_key("model", "system", "user", max_tokens=10)
+    assert key != LLMResponseCache.make_key("model", "system", "user", max_tokens=11)
+    assert key != LLMResponseCache.make_key("other", "system", "user", max_tokens=10)
+    assert key != LLMResponseCache.make_key("model", "system", "other", max_tokens=10)
+
+
+def test_put_get_and_stats(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("missing") is None
+    cache.put("key", "response", {"output_tokens": 3})
+    assert cache.get("key") == ("response", {"output_tokens": 3})
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == len("response")
+    cache.close()
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("key", "response")
+    cache._conn.execute("UPDATE responses SET created_at = ?", (time.time() - 120,))
+    assert cache.get("key") is None
+    assert cache.evictions == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    assert cache.get("a") is not None
+    time.sleep(0.01)
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.close()
+
+
+def test_size_limit_evicts_until_it_fits(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    cache.put("a", "x" * 6)
+    time.sleep(0.01)
+    cache.put("b", "y" * 6)
+    assert cache.get("a") is None
+    assert cache.get("b") == ("y" * 6, {})
+    cache.close()
+
+
+def test_entries_persist_across_instances(tmp_path):
+    make_cache(tmp_path).put("key", "response")
+    assert make_cache(tmp_path).get("key") == ("response", {})
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    assert LLMResponseCache.from_env() is None
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "env.sqlite3"))
+    monkeypatch.setenv("LLM_CACHE_MAX_ENTRIES", "5")
+    cache = LLMResponseCache.from_env()
+    assert cache.max_entries == 5
+    assert (tmp_path / "env.sqlite3").exists()
+    cache.close()
@@ -0,0 +1,122 @@
+from typing import Dict, Tuple
+
+import main
+from agents.agent_setup import setup_agent_framework
+from agents.modular_agent_framework import ModularAgentFramework
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from benchmarks.workload import build_workspace
+from internal.run_manifest import RunManifest, fingerprint_file, fingerprint_files
+
+
+class CountingClient(FakeAnthropicLLMClient):
+    calls = 0
+
+    def _create_stream(self, *args, **kwargs):
+        self.calls += 1
+        return super()._create_stream(*args, **kwargs)
+
+
+class FingerprintedModule:
+    """Module whose only input is state["bian_dir"]; fails when it is "bad" """
+
+    module_name = "copy"
+    dependencies = []
+    output_keys = ["generated_requirements"]
+
+    def __init__(self):
+        self.runs = 0
+
+    def input_fingerprint(self, state) -> Dict[str, str]:
+        return {"source": state["bian_dir"]}
+
+    def node(self, state) -> Dict:
+        self.runs += 1
+        if state["bian_dir"] == "bad":
+            return {"generated_requirements": "partial", "errors": ["copy: failed"]}
+        return {"generated_requirements": state["bian_dir"].upper()}
+
+    def add_nodes_to_graph(self, graph) -> Tuple[str, str]:
+        graph.add_node("copy_node", self.node)
+        return "copy_node", "copy_node"
+
+    def log_loading(self):
+        pass
+
+
+def test_file_fingerprints_ignore_order_but_not_names(tmp_path):
+    (tmp_path / "a.md").write_text("one")
+    (tmp_path / "b.md").write_text("two")
+    paths = [tmp_path / "a.md", tmp_path / "b.md"]
+    assert fingerprint_files(paths) == fingerprint_files(reversed(paths))
+
+    (tmp_path / "b.md").rename(tmp_path / "c.md")
+    assert fingerprint_files([tmp_path / "a.md", tmp_path / "c.md"]) != fingerprint_files(paths)
+    assert fingerprint_file(tmp_path / "b.md") == "missing"
+
+
+def test_record_lookup_and_forget(tmp_path):
+    manifest = RunManifest(str(tmp_path / "manifest.sqlite3"))
+    fingerprint = RunManifest.combine({"b": "2", "a": "1"})
+    assert fingerprint == RunManifest.combine({"a": "1", "b": "2"})
+    assert manifest.lookup("module", fingerprint) is None
+
+    manifest.record("module", fingerprint, {"a": "1", "b": "2"}, {"out": [1, 2]})
+    assert manifest.lookup("module", fingerprint) == {"out": [1, 2]}
+    assert manifest.lookup("other", fingerprint) is None
+
+    manifest.forget("module")
+    assert manifest.lookup("module", fingerprint) is None
+
+
+def test_unchanged_inputs_replay_the_stored_outputs(tmp_path):
+    module = FingerprintedModule()
+    framework = ModularAgentFramework(manifest=RunManifest(str(tmp_path / "manifest.sqlite3")))
+    framework.register_module(module)
+
+    def run(source):
+        return framework.start_analysis({"errors": [], "module_results": {}, "bian_dir": source})
+
+    assert run("text")["module_results"]["copy"]["incremental"] == "miss"
+    final = run("text")
+    assert final["module_results"]["copy"]["incremental"] == "hit"
+    assert final["generated_requirements"] == "TEXT"
+    assert module.runs == 1
+
+    assert run("other")["generated_requirements"] == "OTHER"
+    assert module.runs == 2
+
+
+def test_failed_runs_are_not_recorded(tmp_path):
+    module = FingerprintedModule()
+    framework = ModularAgentFramework(manifest=RunManifest(str(tmp_path / "manifest.sqlite3")))
+    framework.register_module(module)
+
+    for _ in range(2):
+        final = framework.start_analysis({"errors": [], "module_results": {}, "bian_dir": "bad"})
+        assert final["module_results"]["copy"]["incremental"] == "miss"
+    assert module.runs == 2
+
+
+def test_only_modules_with_changed_inputs_call_the_llm_again(workdir):
+    message = build_workspace(str(workdir), 3)
+    client = CountingClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=3)
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False)
+    framework.manifest = RunManifest(str(workdir / "manifest.sqlite3"))
+    framework.invalidate_graph()
+
+    first = framework.start_analysis(main.build_initial_state(message))
+    assert first["errors"] == [] and client.calls > 0
+
+    client.calls = 0
+    second = framework.start_analysis(main.build_initial_state(message))
+    assert client.calls == 0
+    assert second["updated_requirements"] == first["updated_requirements"]
+    assert {result["incremental"] for result in second["module_results"].values()} == {"hit"}
+
+    endpoint = next((workdir / "service" / "service" / "reqs").glob("*.md"))
+    endpoint.write_text(endpoint.read_text() + "\nChanged.\n")
+    third = framework.start_analysis(main.build_initial_state(message))
+    # The requirements come out the same, so the structure is not generated again
+    assert third["module_results"]["requirement_generator"]["incremental"] == "miss"
+    assert third["module_results"]["project_structure"]["incremental"] == "hit"
+    assert client.calls > 0
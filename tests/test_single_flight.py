@@ -0,0 +1,54 @@
+from concurrent.futures import Future
+
+from internal.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_the_in_flight_future():
+    flight = SingleFlight()
+    submitted = []
+
+    def submit():
+        future = Future()
+        submitted.append(future)
+        return future
+
+    first, shared = flight.run("key", submit)
+    assert not shared
+    second, shared = flight.run("key", submit)
+    assert shared and second is first
+    assert len(submitted) == 1
+    assert flight.coalesced == 1
+    assert flight.in_flight == 1
+
+
+def test_key_is_forgotten_once_done():
+    flight = SingleFlight()
+    first, _ = flight.run("key", Future)
+    first.set_result("done")
+    assert flight.in_flight == 0
+
+    second, shared = flight.run("key", Future)
+    assert not shared and second is not first
+
+
+def test_failed_jobs_are_forgotten_too():
+    flight = SingleFlight()
+    first, _ = flight.run("key", Future)
+    first.set_exception(RuntimeError("boom"))
+    second, shared = flight.run("key", Future)
+    assert not shared and second is not first
+
+
+def test_none_key_always_submits():
+    flight = SingleFlight()
+    first, _ = flight.run(None, Future)
+    second, shared = flight.run(None, Future)
+    assert not shared and first is not second
+    assert flight.in_flight == 0
+
+
+def test_declined_submit_is_not_remembered():
+    flight = SingleFlight()
+    assert flight.run("key", lambda: None) == (None, False)
+    future, shared = flight.run("key", Future)
+    assert future is not None and not shared
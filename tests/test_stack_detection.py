@@ -0,0 +1,91 @@
+from agents.modules.framework_detector import FrameworkDetectorModule
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from internal.file_system_reader import FileSystemReader
+from internal.stack_detection import detect_stack, score_file
+
+SPRING = """# GET /orders/{id}
+
+**Language**: Java 21
+**Framework**: Spring Boot 3.2
+
+```java
+@RestController
+public class OrderController {
+    @GetMapping("/orders/{id}")
+    public Order get(@PathVariable String id) { ... }
+}
+```
+See OrderController.java.
+"""
+
+FASTAPI = """# GET /orders/{id}
+
+```python
+from fastapi import FastAPI
+app = FastAPI()
+```
+"""
+
+NEUTRAL = """# GET /orders/{id}
+
+```json
+{"id": "1"}
+```
+"""
+
+
+def test_declarations_are_normalized():
+    languages, frameworks = score_file("- Language: `Java 21`\n- Framework: **Spring Boot** (v3.2)\n")
+    assert set(languages) == {"java"}
+    assert set(frameworks) == {"spring boot"}
+
+
+def test_framework_signatures_imply_the_language():
+    languages, frameworks = score_file(FASTAPI)
+    assert max(languages, key=languages.get) == "python"
+    assert set(frameworks) == {"fastapi"}
+
+
+def test_repeated_evidence_is_capped():
+    fences = "\n".join(["```java"] * 10)
+    assert score_file(fences)[0]["java"] == score_file("\n".join(["```java"] * 3))[0]["java"]
+
+
+def test_every_file_casts_one_vote():
+    detection = detect_stack([SPRING, SPRING, FASTAPI])
+    assert (detection["language"], detection["framework"]) == ("java", "spring boot")
+    assert detection["files"] == 3
+    assert 0.5 < detection["confidence"] < 0.8
+
+
+def test_files_without_evidence_lower_the_confidence():
+    confident = detect_stack([SPRING])["confidence"]
+    diluted = detect_stack([SPRING, NEUTRAL, NEUTRAL, NEUTRAL])
+    assert diluted["language"] == "java"
+    assert diluted["confidence"] < confident / 2
+
+
+def test_nothing_to_go_on():
+    detection = detect_stack([NEUTRAL])
+    assert detection["language"] is None and detection["confidence"] == 0.0
+    assert detect_stack([])["files"] == 0
+
+
+def test_grpc_only_wins_without_another_framework():
+    assert detect_stack(["Calls go over gRPC.\n```protobuf\n```"])["framework"] == "grpc"
+    assert detect_stack([SPRING + "\nCalls go over gRPC."])["framework"] == "spring boot"
+
+
+def test_confident_detection_skips_the_llm(tmp_path):
+    for index in range(3):
+        (tmp_path / f"endpoint_{index}.md").write_text(SPRING)
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, responses={"framework": "Language: Go"})
+    state = {"endpoints_dir": str(tmp_path)}
+
+    update = FrameworkDetectorModule(FileSystemReader(), client).detect_framework_and_language(state)
+    assert update["target_language"] == "java"
+    assert update["module_results"]["framework_detector"]["detection"] == "heuristic"
+
+    update = FrameworkDetectorModule(FileSystemReader(), client, heuristic_threshold=None) \
+        .detect_framework_and_language(state)
+    assert update["target_language"] == "go"
@@ -0,0 +1,64 @@
+import stat
+
+import pytest
+
+import main
+from internal.streaming_output import DEFAULT_FILE_MODE, DocumentStream, StreamingOutput
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, run_id, document, seq, text, final=False):
+        self.messages.append((run_id, document, seq, text, final))
+
+
+def file_mode(path) -> int:
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+def test_closed_document_is_moved_into_place_with_the_default_mode(tmp_path):
+    stream = StreamingOutput(str(tmp_path)).open("doc.md")
+    stream.write("# Title\n")
+    assert not (tmp_path / "doc.md").exists()
+    assert stream.close() == "# Title\n"
+    assert (tmp_path / "doc.md").read_text() == "# Title\n"
+    assert file_mode(tmp_path / "doc.md") == DEFAULT_FILE_MODE
+
+
+def test_aborted_document_leaves_the_previous_file(tmp_path):
+    (tmp_path / "doc.md").write_text("previous")
+    stream = DocumentStream(tmp_path / "doc.md")
+    stream.write("partial")
+    stream.abort()
+    assert (tmp_path / "doc.md").read_text() == "previous"
+    assert [path.name for path in tmp_path.iterdir()] == ["doc.md"]
+
+
+def test_progress_is_published_per_section(tmp_path):
+    publisher = RecordingPublisher()
+    stream = DocumentStream(tmp_path / "doc.md", run_id="run-1", publisher=publisher)
+    stream.write("## One\ntext\n")
+    stream.write("## Two\nmore\n")
+    stream.close()
+    assert publisher.messages == [
+        ("run-1", "doc.md", 0, "## One\ntext\n", False),
+        ("run-1", "doc.md", 1, "## Two\nmore\n", True),
+    ]
+
+
+def test_saved_requirements_have_the_default_mode(tmp_path):
+    main.save_requirements("text", output_dir=str(tmp_path), file_name="api_requirements.md")
+    assert (tmp_path / "api_requirements.md").read_text() == "text"
+    assert file_mode(tmp_path / "api_requirements.md") == DEFAULT_FILE_MODE
+
+
+@pytest.mark.parametrize("per_message, expected", [(False, "output"), (True, "service/out")])
+def test_output_dir_is_shared_unless_per_message_output_is_on(monkeypatch, per_message, expected):
+    monkeypatch.setattr(main, "OUTPUT_PER_MESSAGE", per_message)
+    state = main.build_initial_state({"bianContract": "contract", "output": "service/out"})
+    assert state["output_dir"] == expected
+    assert state["endpoints_dir"] == "service/out/reqs"
+    assert main.build_initial_state({"bianContract": "contract", "output": "service/out"},
+                                    output_dir="elsewhere")["output_dir"] == "elsewhere"
@@ -0,0 +1,69 @@
+import os
+
+from internal.template_registry import TemplateRegistry
+
+
+def write_template(root, language: str, architecture: str, text: str):
+    path = root / language / f"{architecture}.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_templates_are_indexed_by_language_and_architecture(tmp_path):
+    write_template(tmp_path, "java", "multimodule", "java multimodule")
+    write_template(tmp_path, "python", "basic", "python basic")
+    registry = TemplateRegistry(str(tmp_path))
+
+    template = registry.get("Java", "multimodule")
+    assert template.text == "java multimodule"
+    assert template.token_estimate == 4
+    assert registry.languages() == {"java": ["multimodule"], "python": ["basic"]}
+
+
+def test_aliases_resolve_to_the_canonical_names(tmp_path):
+    write_template(tmp_path, "python", "multimodule", "python multimodule")
+    write_template(tmp_path, "go", "basic", "go basic")
+    registry = TemplateRegistry(str(tmp_path))
+
+    assert registry.get("py", "multi-module").text == "python multimodule"
+    assert registry.get("python3", "Multi Module").text == "python multimodule"
+    assert registry.get("golang", "default").text == "go basic"
+
+
+def test_unknown_architectures_fall_back_to_the_closest_one(tmp_path):
+    write_template(tmp_path, "java", "multimodule", "java multimodule")
+    registry = TemplateRegistry(str(tmp_path))
+
+    assert registry.get("java", "multimodule_dinners").architecture == "multimodule"
+    assert registry.get("java", "hexagonal") is None
+    assert registry.get("rust", "multimodule") is None
+
+
+def test_changed_trees_are_reindexed_after_the_poll_interval(tmp_path):
+    path = write_template(tmp_path, "java", "basic", "first")
+    registry = TemplateRegistry(str(tmp_path), poll_interval=0)
+    assert registry.get("java", "hexagonal") is None
+
+    path.write_text("second version")
+    write_template(tmp_path, "java", "hexagonal", "hexagonal")
+    assert registry.get("java", "basic").text == "second version"
+    # The remembered fallback miss was dropped by the reload
+    assert registry.get("java", "hexagonal").text == "hexagonal"
+
+    os.remove(path)
+    assert registry.get("java", "basic") is None
+
+
+def test_tree_is_not_rescanned_within_the_poll_interval(tmp_path):
+    write_template(tmp_path, "java", "basic", "first")
+    registry = TemplateRegistry(str(tmp_path), poll_interval=3600)
+    registry.get("java", "basic")
+    write_template(tmp_path, "java", "hexagonal", "hexagonal")
+    assert registry.get("java", "hexagonal") is None
+
+
+def test_missing_root_has_no_templates(tmp_path):
+    registry = TemplateRegistry(str(tmp_path / "missing"))
+    assert registry.languages() == {}
+    assert registry.get("java", "basic") is None
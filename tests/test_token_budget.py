@@ -0,0 +1,63 @@
+import pytest
+
+from llm.token_budget import BudgetPlanner, TokenCounter, estimate_tokens
+
+
+def test_estimate_counts_word_pieces_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("word") == 1
+    assert estimate_tokens("internationalization") == 5
+    assert estimate_tokens("a, b.") == 4
+
+
+def test_planner_knows_the_model_limits():
+    planner = BudgetPlanner(model="claude-sonnet-4-20250514")
+    assert (planner.context_window, planner.max_output_tokens) == (200000, 64000)
+    assert BudgetPlanner(model="unknown").max_output_tokens == 8192
+
+
+def test_max_tokens_is_capped_by_the_output_limit_and_the_context_window():
+    planner = BudgetPlanner(model="claude-sonnet-4", context_window=1000, safety_margin=0)
+    assert planner.max_tokens("", "x", 300) == 300
+    assert planner.max_tokens("", "x", 100) == 256
+    assert planner.max_tokens("", "x", 100000, minimum=10) == 999
+    assert planner.max_tokens("", "x", 1, minimum=50) == 50
+
+
+def test_prompt_without_room_for_the_answer_fails():
+    planner = BudgetPlanner(context_window=1000, safety_margin=0)
+    with pytest.raises(ValueError, match="context window"):
+        planner.max_tokens("", "word " * 990, 100, minimum=50)
+
+
+def test_exact_counts_are_memoized_and_fall_back_to_the_estimate():
+    calls = []
+
+    def count(system_prompt, user_prompt):
+        calls.append(user_prompt)
+        if user_prompt == "broken":
+            raise RuntimeError("count_tokens failed")
+        return 42
+
+    counter = TokenCounter(count_fn=count)
+    assert counter.count_prompt("system", "user") == 42
+    assert counter.count_prompt("system", "user") == 42
+    assert calls == ["user"]
+    assert counter.count_prompt("system", "broken") == estimate_tokens("system") + estimate_tokens("broken")
+
+
+def test_fit_sections_keeps_headings_of_sections_that_do_not_fit():
+    planner = BudgetPlanner()
+    text = "# Doc\n\n## Small\n\nshort\n\n## Large\n\n" + "word " * 500 + "\n\n## Structure\n\nlayout\n"
+    fitted = planner.fit_sections(text, 40, exclude_titles=("Structure",))
+    assert "## Small\n\nshort" in fitted
+    assert "## Large" in fitted and "word word" not in fitted
+    assert "Structure" not in fitted
+
+
+def test_fit_text_cuts_on_whole_lines():
+    planner = BudgetPlanner()
+    text = "".join(f"line {index}\n" for index in range(100))
+    fitted = planner.fit_text(text, 20)
+    assert fitted and text.startswith(fitted) and fitted.endswith("\n")
+    assert sum(estimate_tokens(line) for line in fitted.splitlines(keepends=True)) <= 20
@@ -0,0 +1,196 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from benchmarks.fake_llm import FakeAnthropicLLMClient
+from internal.token_streams import TokenStream, TokenStreamHub, bind_hub, current_hub, open_token_stream
+
+
+def after_marker(text: str, closed: bool):
+    """Hands over everything up to the marker line once it has streamed in"""
+    index = text.find("MARK\n")
+    return text[:index] if index >= 0 else None
+
+
+def test_prefix_is_handed_over_once_the_trigger_streams_in():
+    stream = TokenStream("doc")
+    future = stream.when(after_marker, trigger="\n")
+    stream.write("intro ")
+    assert not future.done()
+    stream.write("text\nMA")
+    assert not future.done()
+    stream.write("RK\nrest")
+    assert future.result(timeout=1) == "intro text\n"
+
+
+def test_predicate_only_runs_on_chunks_with_the_trigger():
+    stream = TokenStream("doc")
+    seen = []
+    stream.when(lambda text, closed: seen.append(text), trigger="#")
+    stream.write("a")
+    stream.write("b#")
+    assert seen == ["", "ab#"]
+
+
+def test_late_subscriber_sees_the_text_so_far():
+    stream = TokenStream("doc")
+    stream.write("head\nMARK\n")
+    assert stream.when(after_marker).result(timeout=1) == "head\n"
+
+
+def test_stream_closed_before_the_prefix_fails_the_future():
+    stream = TokenStream("doc")
+    future = stream.when(after_marker)
+    stream.write("no marker")
+    stream.close()
+    assert stream.closed and stream.text == "no marker"
+    with pytest.raises(EOFError):
+        future.result(timeout=1)
+
+
+def test_predicate_gets_a_last_look_on_close():
+    stream = TokenStream("doc")
+    future = stream.when(lambda text, closed: text if closed else None)
+    stream.write("whole document")
+    stream.close()
+    assert future.result(timeout=1) == "whole document"
+
+
+def test_abort_fails_waiting_and_later_subscribers():
+    stream = TokenStream("doc")
+    future = stream.when(after_marker)
+    stream.abort(RuntimeError("stream dropped"))
+    with pytest.raises(RuntimeError, match="dropped"):
+        future.result(timeout=1)
+    with pytest.raises(RuntimeError, match="dropped"):
+        stream.when(after_marker).result(timeout=1)
+
+
+def test_failing_predicate_fails_the_future():
+    stream = TokenStream("doc")
+
+    def broken(text, closed):
+        raise ValueError("bad prefix")
+
+    future = stream.when(broken)
+    with pytest.raises(ValueError):
+        future.result(timeout=1)
+
+
+def test_hub_opens_streams_only_for_subscribed_names():
+    hub = TokenStreamHub()
+    opened = []
+    hub.subscribe("generated_requirements", lambda stream, state: opened.append((stream.name, state["run_id"])))
+
+    assert hub.open("other", {}) is None
+    stream = hub.open("generated_requirements", {"run_id": "run-1"})
+    assert stream is not None
+    assert opened == [("generated_requirements", "run-1")]
+
+
+def test_subscriber_that_fails_to_start_does_not_break_the_producer():
+    hub = TokenStreamHub()
+
+    def broken(stream, state):
+        raise RuntimeError("cannot start")
+
+    hub.subscribe("doc", broken)
+    assert hub.open("doc", {}) is not None
+
+
+def test_results_are_taken_once():
+    hub = TokenStreamHub()
+    future = Future()
+    hub.put_result("structure", future)
+    assert hub.take_result("structure") is future
+    assert hub.take_result("structure") is None
+
+
+def test_bound_hub_is_current_for_the_run_only():
+    hub = TokenStreamHub()
+    hub.subscribe("doc", lambda stream, state: None)
+    assert current_hub() is None and open_token_stream("doc", {}) is None
+    with bind_hub(hub):
+        assert current_hub() is hub
+        assert open_token_stream("doc", {}) is not None
+    assert current_hub() is None
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_pipelined_run_matches_the_sequential_one(workdir, use_async):
+    import asyncio
+
+    import main
+    from agents.agent_setup import setup_agent_framework
+    from benchmarks.workload import build_workspace
+
+    message = build_workspace(str(workdir), 2)
+    client = FakeAnthropicLLMClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=5)
+    results = {}
+    for pipelined in (False, True):
+        framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False,
+                                          pipelined=pipelined)
+        state = main.build_initial_state(message)
+        final = asyncio.run(framework.astart_analysis(state)) if use_async else framework.start_analysis(state)
+        assert final["errors"] == []
+        assert final["module_results"]["project_structure"]["metrics"]["llm_calls"] == 1
+        results[pipelined] = final["updated_requirements"]
+
+    assert results[True] == results[False]
+    assert "multimodule layout" in results[True]
+
+
+class SlowStructureClient(FakeAnthropicLLMClient):
+    """Fake client whose structure answers stream slowly once `structure_delay` is set"""
+
+    structure_delay = 0.0
+    structure_chunks = 0
+
+    def _events(self, response, input_tokens):
+        for event in super()._events(response, input_tokens):
+            if response == self.responses["structure"] and event.type == "content_block_delta":
+                self.structure_chunks += 1
+                time.sleep(self.structure_delay)
+            yield event
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_call_started_ahead_is_cancelled_when_the_node_is_skipped(workdir, use_async):
+    import asyncio
+
+    import main
+    from agents.agent_setup import setup_agent_framework
+    from benchmarks.workload import build_workspace
+    from internal.run_manifest import RunManifest
+
+    message = build_workspace(str(workdir), 2)
+    client = SlowStructureClient(time_to_first_token=0, tokens_per_second=0, requirements_sections=5,
+                                 responses={"structure": "Layered modules.\n" * 400})
+    framework = setup_agent_framework(None, api_key=None, llm_client=client, durable_runs=False, pipelined=True)
+    framework.manifest = RunManifest(str(workdir / "manifest.sqlite3"))
+    framework.invalidate_graph()
+
+    def run():
+        state = main.build_initial_state(message)
+        return asyncio.run(framework.astart_analysis(state)) if use_async else framework.start_analysis(state)
+
+    first = run()
+    total_chunks = client.structure_chunks
+
+    # New endpoint content reruns the requirements, which come out the same: the structure node is skipped
+    endpoint = next((workdir / "service" / "service" / "reqs").glob("*.md"))
+    endpoint.write_text(endpoint.read_text() + "\nChanged.\n")
+    client.structure_chunks = 0
+    client.structure_delay = 0.01
+    second = run()
+    time.sleep(0.2)
+    streamed = client.structure_chunks
+    time.sleep(0.2)
+
+    assert second["errors"] == []
+    assert second["module_results"]["requirement_generator"]["incremental"] == "miss"
+    assert second["module_results"]["project_structure"]["incremental"] == "hit"
+    assert second["updated_requirements"] == first["updated_requirements"]
+    # The call started ahead stopped streaming instead of running to the end
+    assert client.structure_chunks == streamed < total_chunks
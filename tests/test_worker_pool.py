@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from internal.worker_pool import BoundedWorkerPool
+
+
+def test_rejects_jobs_beyond_capacity():
+    pool = BoundedWorkerPool(max_workers=1, max_backlog=1)
+    release = threading.Event()
+    try:
+        first = pool.try_submit(release.wait)
+        second = pool.try_submit(release.wait)
+        assert first is not None and second is not None
+        assert pool.try_submit(release.wait) is None
+        assert pool.in_flight == 2
+        assert pool.queue_depth == 1
+        assert pool.prefetch_count == 2
+    finally:
+        release.set()
+        assert pool.drain(timeout=5)
+
+
+def test_capacity_is_released_when_a_job_finishes():
+    pool = BoundedWorkerPool(max_workers=1)
+    assert pool.try_submit(lambda: 1).result(timeout=5) == 1
+    future = pool.try_submit(lambda x: x * 2, 21)
+    assert future is not None and future.result(timeout=5) == 42
+    assert pool.drain(timeout=5)
+    assert pool.in_flight == 0
+
+
+def test_failed_jobs_release_capacity():
+    pool = BoundedWorkerPool(max_workers=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    future = pool.try_submit(fail)
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+    assert pool.try_submit(lambda: "ok").result(timeout=5) == "ok"
+    assert pool.drain(timeout=5)
+
+
+def test_drain_stops_accepting_and_waits_for_running_jobs():
+    pool = BoundedWorkerPool(max_workers=2)
+    release = threading.Event()
+    future = pool.try_submit(release.wait, 5)
+    polls = []
+
+    def poll():
+        polls.append(1)
+        release.set()
+
+    assert pool.drain(timeout=5, poll=poll)
+    assert future.result() is True
+    assert polls
+    assert pool.try_submit(lambda: None) is None
+
+
+def test_drain_times_out_with_jobs_still_running():
+    pool = BoundedWorkerPool(max_workers=1)
+    release = threading.Event()
+    pool.try_submit(release.wait, 5)
+    try:
+        assert pool.drain(timeout=0.1) is False
+    finally:
+        release.set()
+
+
+@pytest.mark.parametrize("kwargs", [{"max_workers": 0}, {"max_backlog": -1}, {"kind": "fiber"}])
+def test_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        BoundedWorkerPool(**kwargs)